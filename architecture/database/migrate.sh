@@ -0,0 +1,22 @@
+# Connects to the database and applies any migrations not yet recorded in schema_migrations.
+# Each migration runs in its own transaction together with its schema_migrations row.
+set -e
+cd "$(dirname "$0")"
+source .env
+export PGPASSWORD=$DB_PASSWORD
+PSQL="psql -h $DB_HOST -U $DB_USER -d $DB_NAME -p $DB_PORT -X -q -v ON_ERROR_STOP=1"
+
+$PSQL -c "CREATE TABLE IF NOT EXISTS schema_migrations (
+              version VARCHAR(100) NOT NULL,
+              applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+              PRIMARY KEY (version));"
+
+for migration in migrations/*.sql; do
+    version=$(basename "$migration" .sql)
+    applied=$($PSQL -t -A -c "SELECT 1 FROM schema_migrations WHERE version = '$version';")
+    if [ -n "$applied" ]; then
+        continue
+    fi
+    echo "Applying $version"
+    $PSQL -1 -f "$migration" -c "INSERT INTO schema_migrations (version) VALUES ('$version');"
+done
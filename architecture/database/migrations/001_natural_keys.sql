@@ -0,0 +1,92 @@
+-- Adds unique constraints on each table's natural key, so the loaders can
+-- upsert with ON CONFLICT, and indexes for the date-bounded dashboard and
+-- report queries. Rows duplicated by earlier concurrent loads are merged
+-- first: references move to the oldest station and route, and the newest
+-- cancellation and incident version are kept. Run through migrate.sh, which
+-- applies the whole file in one transaction.
+
+-- Stations, keyed by CRS code.
+CREATE TEMPORARY TABLE station_merge AS
+SELECT station_id, keep_id
+FROM (
+    SELECT station_id, MIN(station_id) OVER (PARTITION BY station_crs) AS keep_id
+    FROM station
+) AS ranked
+WHERE station_id <> keep_id;
+
+UPDATE route SET origin_station_id = m.keep_id
+FROM station_merge AS m WHERE route.origin_station_id = m.station_id;
+UPDATE route SET destination_station_id = m.keep_id
+FROM station_merge AS m WHERE route.destination_station_id = m.station_id;
+UPDATE train_stop SET station_id = m.keep_id
+FROM station_merge AS m WHERE train_stop.station_id = m.station_id;
+DELETE FROM station USING station_merge AS m WHERE station.station_id = m.station_id;
+DROP TABLE station_merge;
+
+ALTER TABLE station ADD CONSTRAINT station_crs_key UNIQUE (station_crs);
+
+-- Routes, keyed by origin, destination and operator.
+CREATE TEMPORARY TABLE route_merge AS
+SELECT route_id, keep_id
+FROM (
+    SELECT route_id,
+           MIN(route_id) OVER (
+               PARTITION BY origin_station_id, destination_station_id, operator_id
+           ) AS keep_id
+    FROM route
+) AS ranked
+WHERE route_id <> keep_id;
+
+UPDATE train_service SET route_id = m.keep_id
+FROM route_merge AS m WHERE train_service.route_id = m.route_id;
+UPDATE incident SET route_id = m.keep_id
+FROM route_merge AS m WHERE incident.route_id = m.route_id;
+DELETE FROM route USING route_merge AS m WHERE route.route_id = m.route_id;
+DROP TABLE route_merge;
+
+DROP INDEX IF EXISTS route_stations_operator_idx;
+ALTER TABLE route ADD CONSTRAINT route_natural_key
+    UNIQUE (origin_station_id, destination_station_id, operator_id);
+
+-- Cancellations, one per train stop.
+DELETE FROM cancellation AS older
+USING cancellation AS newer
+WHERE newer.train_stop_id = older.train_stop_id
+  AND newer.cancellation_id > older.cancellation_id;
+
+DROP INDEX IF EXISTS cancellation_train_stop_id_idx;
+ALTER TABLE cancellation ADD CONSTRAINT cancellation_train_stop_key UNIQUE (train_stop_id);
+
+-- Incidents, keyed by incident number.
+CREATE TEMPORARY TABLE incident_merge AS
+SELECT incident_id, keep_id
+FROM (
+    SELECT incident_id,
+           FIRST_VALUE(incident_id) OVER (
+               PARTITION BY incident_number
+               ORDER BY version_number DESC, incident_id DESC
+           ) AS keep_id
+    FROM incident
+) AS ranked
+WHERE incident_id <> keep_id;
+
+UPDATE operator_incident_assignment SET incident_id = m.keep_id
+FROM incident_merge AS m WHERE operator_incident_assignment.incident_id = m.incident_id;
+DELETE FROM incident USING incident_merge AS m WHERE incident.incident_id = m.incident_id;
+DROP TABLE incident_merge;
+
+ALTER TABLE incident ADD CONSTRAINT incident_number_key UNIQUE (incident_number);
+
+-- Operator assignments, one per incident and operator.
+DELETE FROM operator_incident_assignment AS later
+USING operator_incident_assignment AS earlier
+WHERE earlier.incident_id = later.incident_id
+  AND earlier.operator_id = later.operator_id
+  AND earlier.operator_incident_assignment_id < later.operator_incident_assignment_id;
+
+ALTER TABLE operator_incident_assignment ADD CONSTRAINT operator_incident_assignment_key
+    UNIQUE (incident_id, operator_id);
+
+-- Date-bounded reads from the dashboard and the daily reports.
+CREATE INDEX IF NOT EXISTS train_service_service_date_idx ON train_service (service_date);
+CREATE INDEX IF NOT EXISTS train_stop_station_id_idx ON train_stop (station_id);
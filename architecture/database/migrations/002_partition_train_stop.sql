@@ -0,0 +1,116 @@
+-- Rebuilds train_stop as a table partitioned by month of service_date, copied
+-- from each stop's train service, and points cancellation at the new table
+-- through (train_stop_id, service_date). Existing ids are kept. Every stop is
+-- copied while train_stop is locked, so run this between loads.
+
+DROP VIEW IF EXISTS train_info_view;
+ALTER TABLE cancellation DROP CONSTRAINT cancellation_train_stop_id_fkey;
+
+ALTER TABLE train_stop RENAME TO train_stop_unpartitioned;
+ALTER TABLE train_stop_unpartitioned RENAME CONSTRAINT train_stop_pkey
+    TO train_stop_unpartitioned_pkey;
+ALTER TABLE train_stop_unpartitioned RENAME CONSTRAINT train_stop_train_service_id_station_id_key
+    TO train_stop_unpartitioned_key;
+ALTER INDEX train_stop_station_id_idx RENAME TO train_stop_unpartitioned_station_id_idx;
+
+CREATE TABLE train_stop (
+    train_stop_id BIGINT GENERATED ALWAYS AS IDENTITY,
+    train_service_id INT NOT NULL,
+    service_date DATE NOT NULL,
+    station_id SMALLINT NOT NULL,
+    scheduled_arr_time TIME,
+    actual_arr_time TIME,
+    scheduled_dep_time TIME,
+    actual_dep_time TIME,
+    platform VARCHAR(3) NOT NULL,
+    platform_changed BOOLEAN NOT NULL,
+    PRIMARY KEY (train_stop_id, service_date),
+    FOREIGN KEY (station_id) REFERENCES station(station_id),
+    FOREIGN KEY (train_service_id) REFERENCES train_service(train_service_id),
+    UNIQUE (train_service_id, station_id, service_date)
+) PARTITION BY RANGE (service_date);
+
+CREATE INDEX train_stop_station_id_idx ON train_stop (station_id);
+
+CREATE FUNCTION ensure_train_stop_partition(day DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::date;
+    partition_name TEXT := format('train_stop_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF train_stop FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, month_start, (month_start + INTERVAL '1 month')::date);
+    END IF;
+    RETURN partition_name;
+EXCEPTION WHEN duplicate_table THEN
+    RETURN partition_name;
+END;
+$$;
+
+SELECT ensure_train_stop_partition(month::date)
+FROM generate_series(
+    (SELECT date_trunc('month', MIN(service_date)) FROM train_service),
+    (SELECT date_trunc('month', MAX(service_date)) FROM train_service),
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO train_stop (
+    train_stop_id, train_service_id, service_date, station_id,
+    scheduled_arr_time, actual_arr_time, scheduled_dep_time, actual_dep_time,
+    platform, platform_changed
+)
+OVERRIDING SYSTEM VALUE
+SELECT stop.train_stop_id, stop.train_service_id, ts.service_date, stop.station_id,
+       stop.scheduled_arr_time, stop.actual_arr_time,
+       stop.scheduled_dep_time, stop.actual_dep_time,
+       stop.platform, stop.platform_changed
+FROM train_stop_unpartitioned AS stop
+JOIN train_service AS ts USING (train_service_id);
+
+SELECT setval(pg_get_serial_sequence('train_stop', 'train_stop_id'),
+              COALESCE(MAX(train_stop_id), 0) + 1, false)
+FROM train_stop;
+
+ALTER TABLE cancellation
+    ALTER COLUMN train_stop_id TYPE BIGINT,
+    ADD COLUMN service_date DATE;
+
+UPDATE cancellation SET service_date = stop.service_date
+FROM train_stop AS stop
+WHERE stop.train_stop_id = cancellation.train_stop_id;
+
+ALTER TABLE cancellation
+    ALTER COLUMN service_date SET NOT NULL,
+    ADD CONSTRAINT cancellation_train_stop_fkey FOREIGN KEY (train_stop_id, service_date)
+        REFERENCES train_stop(train_stop_id, service_date);
+
+DROP TABLE train_stop_unpartitioned;
+
+CREATE VIEW train_info_view AS
+SELECT ts.service_uid,
+       ts.train_identity,
+       stop.service_date,
+       station.station_name,
+       station.station_crs,
+       origin.station_name AS origin_name,
+       destination.station_name AS destination_name,
+       operator.operator_name,
+       stop.scheduled_arr_time,
+       stop.actual_arr_time,
+       stop.scheduled_dep_time,
+       stop.actual_dep_time,
+       stop.platform,
+       stop.platform_changed,
+       cancellation.cancellation_id IS NOT NULL AS cancelled,
+       cancellation.reason AS cancel_reason
+FROM train_stop AS stop
+JOIN train_service AS ts ON ts.train_service_id = stop.train_service_id
+                        AND ts.service_date = stop.service_date
+JOIN station ON station.station_id = stop.station_id
+JOIN route ON route.route_id = ts.route_id
+JOIN station AS origin ON origin.station_id = route.origin_station_id
+JOIN station AS destination ON destination.station_id = route.destination_station_id
+JOIN operator ON operator.operator_id = route.operator_id
+LEFT JOIN cancellation ON cancellation.train_stop_id = stop.train_stop_id
+                      AND cancellation.service_date = stop.service_date;
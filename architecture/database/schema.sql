@@ -1,4 +1,7 @@
--- Drop tables in dependency order
+-- Drop views, functions and tables in dependency order
+DROP VIEW IF EXISTS train_info_view;
+DROP FUNCTION IF EXISTS ensure_train_stop_partition;
+DROP TABLE IF EXISTS schema_migrations;
 DROP TABLE IF EXISTS operator_incident_assignment;
 DROP TABLE IF EXISTS incident;
 DROP TABLE IF EXISTS cancellation;
@@ -12,7 +15,8 @@ CREATE TABLE station (
     station_id SMALLINT GENERATED ALWAYS AS IDENTITY,
     station_name VARCHAR(50) NOT NULL,
     station_crs VARCHAR(3) NOT NULL,
-    PRIMARY KEY (station_id)
+    PRIMARY KEY (station_id),
+    CONSTRAINT station_crs_key UNIQUE (station_crs)
 );
 
 CREATE TABLE operator (
@@ -29,7 +33,8 @@ CREATE TABLE route (
     PRIMARY KEY (route_id),
     FOREIGN KEY (operator_id) REFERENCES operator(operator_id),
     FOREIGN KEY (origin_station_id) REFERENCES station(station_id),
-    FOREIGN KEY (destination_station_id) REFERENCES station(station_id)
+    FOREIGN KEY (destination_station_id) REFERENCES station(station_id),
+    CONSTRAINT route_natural_key UNIQUE (origin_station_id, destination_station_id, operator_id)
 );
 
 CREATE TABLE train_service (
@@ -43,9 +48,14 @@ CREATE TABLE train_service (
     UNIQUE (service_uid, service_date)
 );
 
+CREATE INDEX train_service_service_date_idx ON train_service (service_date);
+
+-- Partitioned by month of service_date, which is copied from the stop's train
+-- service, so date-bounded queries only scan the months they need.
 CREATE TABLE train_stop (
     train_stop_id BIGINT GENERATED ALWAYS AS IDENTITY,
     train_service_id INT NOT NULL,
+    service_date DATE NOT NULL,
     station_id SMALLINT NOT NULL,
     scheduled_arr_time TIME,
     actual_arr_time TIME,
@@ -53,20 +63,75 @@ CREATE TABLE train_stop (
     actual_dep_time TIME,
     platform VARCHAR(3) NOT NULL,
     platform_changed BOOLEAN NOT NULL,
-    PRIMARY KEY (train_stop_id),
+    PRIMARY KEY (train_stop_id, service_date),
     FOREIGN KEY (station_id) REFERENCES station(station_id),
     FOREIGN KEY (train_service_id) REFERENCES train_service(train_service_id),
-    UNIQUE (train_service_id, station_id)
-);
+    UNIQUE (train_service_id, station_id, service_date)
+) PARTITION BY RANGE (service_date);
+
+CREATE INDEX train_stop_station_id_idx ON train_stop (station_id);
+
+-- Creates the train_stop partition for the month of the given date, named
+-- train_stop_YYYY_MM, unless it already exists. The loaders call this before
+-- writing stops for a new month.
+CREATE FUNCTION ensure_train_stop_partition(day DATE) RETURNS TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', day)::date;
+    partition_name TEXT := format('train_stop_%s', to_char(month_start, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF train_stop FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, month_start, (month_start + INTERVAL '1 month')::date);
+    END IF;
+    RETURN partition_name;
+EXCEPTION WHEN duplicate_table THEN
+    -- Another load created it first.
+    RETURN partition_name;
+END;
+$$;
 
 CREATE TABLE cancellation (
     cancellation_id INT GENERATED ALWAYS AS IDENTITY,
-    train_stop_id INT NOT NULL,
+    train_stop_id BIGINT NOT NULL,
+    service_date DATE NOT NULL,
     reason VARCHAR(255) NOT NULL,
     PRIMARY KEY (cancellation_id),
-    FOREIGN KEY (train_stop_id) REFERENCES train_stop(train_stop_id)
+    CONSTRAINT cancellation_train_stop_fkey FOREIGN KEY (train_stop_id, service_date)
+        REFERENCES train_stop(train_stop_id, service_date),
+    CONSTRAINT cancellation_train_stop_key UNIQUE (train_stop_id)
 );
 
+-- One row per train stop with its service, route and cancellation, as read by
+-- the dashboard. Filtering on service_date limits the train_stop partitions read.
+CREATE VIEW train_info_view AS
+SELECT ts.service_uid,
+       ts.train_identity,
+       stop.service_date,
+       station.station_name,
+       station.station_crs,
+       origin.station_name AS origin_name,
+       destination.station_name AS destination_name,
+       operator.operator_name,
+       stop.scheduled_arr_time,
+       stop.actual_arr_time,
+       stop.scheduled_dep_time,
+       stop.actual_dep_time,
+       stop.platform,
+       stop.platform_changed,
+       cancellation.cancellation_id IS NOT NULL AS cancelled,
+       cancellation.reason AS cancel_reason
+FROM train_stop AS stop
+JOIN train_service AS ts ON ts.train_service_id = stop.train_service_id
+                        AND ts.service_date = stop.service_date
+JOIN station ON station.station_id = stop.station_id
+JOIN route ON route.route_id = ts.route_id
+JOIN station AS origin ON origin.station_id = route.origin_station_id
+JOIN station AS destination ON destination.station_id = route.destination_station_id
+JOIN operator ON operator.operator_id = route.operator_id
+LEFT JOIN cancellation ON cancellation.train_stop_id = stop.train_stop_id
+                      AND cancellation.service_date = stop.service_date;
+
 CREATE TABLE incident (
     incident_id INT GENERATED ALWAYS AS IDENTITY,
     route_id INT NOT NULL,
@@ -79,7 +144,8 @@ CREATE TABLE incident (
     info_link VARCHAR(255) NOT NULL,
     summary VARCHAR(255) NOT NULL,
     PRIMARY KEY (incident_id),
-    FOREIGN KEY (route_id) REFERENCES route(route_id)
+    FOREIGN KEY (route_id) REFERENCES route(route_id),
+    CONSTRAINT incident_number_key UNIQUE (incident_number)
 );
 
 CREATE TABLE operator_incident_assignment (
@@ -88,5 +154,18 @@ CREATE TABLE operator_incident_assignment (
     operator_id SMALLINT NOT NULL,
     PRIMARY KEY (operator_incident_assignment_id),
     FOREIGN KEY (incident_id) REFERENCES incident(incident_id),
-    FOREIGN KEY (operator_id) REFERENCES operator(operator_id)
+    FOREIGN KEY (operator_id) REFERENCES operator(operator_id),
+    CONSTRAINT operator_incident_assignment_key UNIQUE (incident_id, operator_id)
 );
+
+-- Migrations applied by migrate.sh. This file already includes every
+-- migration in migrations/, so they are all recorded as applied.
+CREATE TABLE schema_migrations (
+    version VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (version)
+);
+
+INSERT INTO schema_migrations (version) VALUES
+    ('001_natural_keys'),
+    ('002_partition_train_stop');
@@ -1,16 +1,18 @@
 # pylint: skip-file
 # pylint: disable=invalid-name, non-ascii-file-name, import-error, F0001
 """Dashboard for historical data."""
+from datetime import timedelta
 from os import environ as ENV
 from dotenv import load_dotenv
 import streamlit as st
+import pandas as pd
 import psycopg2
 
 
 from utils.live_data_dataframes import convert_times_to_datetime, add_status_column, add_delay_time, get_delays, get_cancelled_data_per_operator
 from utils.live_data_visualisations import make_operator_cancellations_pie
 from utils.historical_data_visualisations import make_stations_cancellations_pie, make_delay_per_station_bar, make_cancellations_per_station_bar, make_delays_area_chart, make_delay_heatmap
-from utils.historical_data_dataframes import get_cancellation_data_per_station, get_avg_delay_per_station,fetch_data
+from utils.historical_data_dataframes import get_cancellation_data_per_station, get_avg_delay_per_station,fetch_data, fetch_archived_data
 
 st.title("💾 Historical Data:")
 window_filter = st.sidebar.radio("Filter Date Window:", ["On", "Before", "After"], horizontal=True)
@@ -21,16 +23,19 @@ conn = psycopg2.connect(host=ENV['DB_HOST'],
                             dbname=ENV['DB_NAME'],
                             user=ENV['DB_USER'],
                             password=ENV['DB_PASSWORD'])
-data = fetch_data(conn)
-convert_times_to_datetime(data)
-add_status_column(data)
-
 if window_filter == "On":
-    data = data[data["service_date"] == filter_date]
+    window = (filter_date, filter_date + timedelta(days=1))
 elif window_filter == "Before":
-    data = data[data["service_date"] < filter_date]
-elif window_filter == "After":
-    data = data[data["service_date"] > filter_date]
+    window = (None, filter_date)
+else:
+    window = (filter_date + timedelta(days=1), None)
+data = fetch_data(conn, *window)
+conn.close()
+if ENV.get("ARCHIVE_LOCATION"):
+    archived_data = fetch_archived_data(ENV["ARCHIVE_LOCATION"], *window)
+    data = pd.concat([archived_data, data], ignore_index=True)
+convert_times_to_datetime(data)
+add_status_column(data)
 
 delays=get_delays(data)
 delays = add_delay_time(delays)
@@ -11,7 +11,8 @@ if __name__ == '__main__':
     load_dotenv()
     QUERY = """SELECT *
                FROM train_info_view 
-               WHERE (service_date + scheduled_dep_time) >= (NOW() - INTERVAL '1 minute');"""
+               WHERE service_date >= CURRENT_DATE - 1
+               AND (service_date + scheduled_dep_time) >= (NOW() - INTERVAL '1 minute');"""
     conn = get_connection()
     data = fetch_data(QUERY, conn)
     if not data.empty:
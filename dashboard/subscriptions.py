@@ -19,6 +19,7 @@ conn = psycopg2.connect(host=ENV['DB_HOST'],
                             user=ENV['DB_USER'],
                             password=ENV['DB_PASSWORD'])
 data = fetch_data(conn)
+conn.close()
 
 email = st.text_input(label="Email address")
 st.subheader("📲 Subscriptions: ")
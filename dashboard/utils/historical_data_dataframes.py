@@ -1,15 +1,60 @@
 """Data manipulation functions for the Historical Data page."""
+from datetime import date
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import streamlit as st
 
-@st.cache_resource
-def fetch_data(_connection)-> pd.DataFrame:
-    """Fetches all service data from the RDS"""
-    query = """SELECT *
-               FROM train_info_view;"""
-    data = pd.read_sql_query(query, _connection)
-    _connection.close()
-    return data
+from shared.archive_schema import ARCHIVE_SCHEMA, MONTH_PARTITION_SCHEMA
+
+@st.cache_data
+def fetch_data(_connection, start: date | None = None,
+               end: date | None = None) -> pd.DataFrame:
+    """Fetches service data from the RDS, cached for each date window.
+
+    start and end bound the service dates read, end excluded. Bounding
+    service_date in SQL lets Postgres skip the train_stop partitions outside
+    the window."""
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("service_date >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("service_date < %s")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""SELECT *
+               FROM train_info_view
+               {where};"""
+    return pd.read_sql_query(query, _connection, params=params or None)
+
+@st.cache_data
+def fetch_archived_data(location: str, start: date | None = None,
+                        end: date | None = None) -> pd.DataFrame:
+    """Fetches archived service data from the Parquet archive, local or in S3.
+
+    start and end bound the service dates read, end excluded. Only the
+    matching month directories and row groups are read. The archive's schema
+    is given rather than inferred, so an archive with no files yet, or a
+    location that does not exist, reads as an empty frame."""
+    schema = pa.unify_schemas([ARCHIVE_SCHEMA, MONTH_PARTITION_SCHEMA])
+    try:
+        archive = ds.dataset(location, schema=schema, format="parquet",
+                             partitioning=ds.partitioning(MONTH_PARTITION_SCHEMA, flavor="hive"))
+    except FileNotFoundError:
+        archive = ds.dataset([], schema=schema, format="parquet")
+    service_date = ds.field("service_date")
+    months = ds.field("service_month")
+    condition = None
+    if start is not None:
+        condition = (service_date >= start) & (months >= f"{start:%Y-%m}")
+    if end is not None:
+        before_end = (service_date < end) & (months <= f"{end:%Y-%m}")
+        condition = before_end if condition is None else condition & before_end
+    data = archive.to_table(filter=condition).to_pandas()
+    return data.drop(columns=["train_stop_id", "service_month"])
 
 def station_to_crs(station_name: str) -> str:
     """Converts a full station name to its CRS"""
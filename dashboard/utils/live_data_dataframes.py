@@ -7,6 +7,8 @@ import psycopg2
 from dotenv import load_dotenv
 import pytz
 
+from shared.delays import delay_seconds, delay_minutes
+
 def get_connection():
     """Returns a psycopg2 connection to the RDS database."""
     load_dotenv()
@@ -40,7 +42,7 @@ def convert_times_to_datetime(df) -> None:
 def add_status_column(df) -> None:
     """Adds a column containing service status based on scheduled and actual times."""
     conditions = [(df['cancelled'] == True),
-                (df['scheduled_dep_time'] < df['actual_dep_time'])]
+                (delay_seconds(df['scheduled_dep_time'], df['actual_dep_time']) > 0)]
     choices = ['Cancelled', 'Delayed']
     df['Status'] = np.select(conditions, choices, default="On Time")
 
@@ -77,10 +79,8 @@ def get_delays(df: pd.DataFrame) -> pd.DataFrame:
 def add_delay_time(df: pd.DataFrame) -> None:
     """Adds a delay time column containing the delay in minutes."""
     data = df.copy()
-    data["delay_time"] = data["actual_dep_time"] - data["scheduled_dep_time"]
-    data = data[data["delay_time"] >= pd.Timedelta(0)]
-    data = data.dropna(subset=["delay_time"])
-    data["delay_time"] = data["delay_time"].dt.total_seconds() // 60
+    data["delay_time"] = delay_minutes(data["scheduled_dep_time"], data["actual_dep_time"])
+    data = data[data["delay_time"] >= 0]
     return data
 
 @st.cache_data
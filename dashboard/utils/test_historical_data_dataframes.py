@@ -0,0 +1,43 @@
+"""Unit testing for the archive reader in historical_data_dataframes.py."""
+# pylint: skip-file
+
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from historical_data_dataframes import fetch_archived_data
+from shared.archive_schema import ARCHIVE_SCHEMA
+
+
+def make_row(train_stop_id, service_date):
+    row = {name: None for name in ARCHIVE_SCHEMA.names}
+    row.update({"train_stop_id": train_stop_id, "service_uid": "A1", "service_date": service_date,
+                "station_name": "London Paddington", "cancelled": False})
+    return row
+
+
+def test_fetch_archived_data_reads_an_empty_archive(tmp_path):
+    data = fetch_archived_data(str(tmp_path), date(2025, 6, 1), date(2025, 6, 2))
+
+    assert data.empty
+    assert "service_date" in data.columns
+    assert "train_stop_id" not in data.columns
+
+
+def test_fetch_archived_data_reads_a_missing_location(tmp_path):
+    data = fetch_archived_data(str(tmp_path / "train_stop"), None, date(2025, 6, 2))
+
+    assert data.empty
+    assert "station_name" in data.columns
+
+
+def test_fetch_archived_data_keeps_only_the_window(tmp_path):
+    (tmp_path / "service_month=2025-06").mkdir()
+    pq.write_table(pa.Table.from_pylist([make_row(1, date(2025, 6, 14)),
+                                         make_row(2, date(2025, 6, 15))], schema=ARCHIVE_SCHEMA),
+                   tmp_path / "service_month=2025-06" / "train_stop_1.parquet")
+
+    data = fetch_archived_data(str(tmp_path), date(2025, 6, 15), date(2025, 6, 16))
+
+    assert data["service_date"].tolist() == [date(2025, 6, 15)]
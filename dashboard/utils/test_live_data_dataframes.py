@@ -0,0 +1,30 @@
+"""Unit testing for the delay functions in live_data_dataframes.py."""
+# pylint: skip-file
+
+import pandas as pd
+
+from live_data_dataframes import add_status_column, add_delay_time
+
+
+def make_services():
+    return pd.DataFrame({
+        "cancelled": [False, False, False, True],
+        "scheduled_dep_time": pd.to_datetime(["2025-06-14 12:00", "2025-06-14 23:58",
+                                              "2025-06-14 12:00", "2025-06-14 12:00"]),
+        "actual_dep_time": pd.to_datetime(["2025-06-14 12:00", "2025-06-14 00:04",
+                                           "2025-06-14 12:07", None])
+    })
+
+
+def test_add_status_column_counts_trains_past_midnight_as_delayed():
+    services = make_services()
+
+    add_status_column(services)
+
+    assert services["Status"].tolist() == ["On Time", "Delayed", "Delayed", "Cancelled"]
+
+
+def test_add_delay_time_keeps_on_time_and_late_trains():
+    delays = add_delay_time(make_services())
+
+    assert delays["delay_time"].tolist() == [0.0, 6.0, 7.0]
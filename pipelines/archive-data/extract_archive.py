@@ -0,0 +1,122 @@
+"""Script for finding closed train_stop partitions and reading their rows for archiving."""
+
+from datetime import date, datetime, timedelta
+from os import environ as ENV
+import logging
+
+from psycopg2 import connect, OperationalError
+from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import connection as Connection
+
+from shared.metrics import counting_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 50000
+PARTITION_NAME_FORMAT = "train_stop_%Y_%m"
+
+
+def get_db_connection() -> Connection:
+    """Gets a connection to the trains database."""
+    try:
+        conn = connect(
+            user=ENV["DB_USER"],
+            password=ENV["DB_PASSWORD"],
+            host=ENV["DB_HOST"],
+            port=ENV["DB_PORT"],
+            database=ENV["DB_NAME"],
+            cursor_factory=counting_cursor(RealDictCursor)
+        )
+        logger.info("Successfully retrieved database connection.")
+    except OperationalError:
+        logger.error("Failed to get database connection.")
+        raise
+
+    return conn
+
+
+def get_next_month(month: date) -> date:
+    """Returns the first day of the month after the given month."""
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def get_retention_cutoff(today: date | None = None) -> date:
+    """Returns the earliest service date kept in the database.
+
+    Stops from months ending on or before this date are archived."""
+    today = today or date.today()
+    return today - timedelta(days=int(ENV.get("ARCHIVE_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)))
+
+
+def get_partition_months(conn: Connection) -> list[date]:
+    """Returns the first day of the month of each train_stop partition, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute("""SELECT child.relname AS partition_name
+                       FROM pg_inherits
+                       JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+                       WHERE pg_inherits.inhparent = 'train_stop'::regclass;""")
+        names = [row["partition_name"] for row in cur.fetchall()]
+    return sorted(datetime.strptime(name, PARTITION_NAME_FORMAT).date() for name in names)
+
+
+def get_closed_months(conn: Connection, cutoff: date) -> list[date]:
+    """Returns the partition months that ended on or before the cutoff."""
+    return [month for month in get_partition_months(conn) if get_next_month(month) <= cutoff]
+
+
+def count_month_rows(conn: Connection, month: date) -> int:
+    """Returns the number of train stops in a month's partition."""
+    with conn.cursor() as cur:
+        cur.execute("""SELECT COUNT(*) AS row_count
+                       FROM train_stop
+                       WHERE service_date >= %s AND service_date < %s;""",
+                    (month, get_next_month(month)))
+        return cur.fetchone()["row_count"]
+
+
+def iter_month_batches(conn: Connection, month: date, batch_size: int | None = None):
+    """Yields a month's train stops in batches of row dicts, with their service,
+    route and cancellation joined in.
+
+    Rows are streamed through a server-side cursor, so only one batch is held
+    in memory however large the month is."""
+    batch_size = batch_size or int(ENV.get("ARCHIVE_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+    with conn.cursor(name=f"archive_{month:%Y_%m}") as cur:
+        cur.execute("""SELECT stop.train_stop_id,
+                              ts.service_uid,
+                              ts.train_identity,
+                              stop.service_date,
+                              station.station_name,
+                              station.station_crs,
+                              origin.station_name AS origin_name,
+                              destination.station_name AS destination_name,
+                              operator.operator_name,
+                              stop.scheduled_arr_time,
+                              stop.actual_arr_time,
+                              stop.scheduled_dep_time,
+                              stop.actual_dep_time,
+                              stop.platform,
+                              stop.platform_changed,
+                              cancellation.cancellation_id IS NOT NULL AS cancelled,
+                              cancellation.reason AS cancel_reason
+                       FROM train_stop AS stop
+                       JOIN train_service AS ts ON ts.train_service_id = stop.train_service_id
+                                               AND ts.service_date = stop.service_date
+                       JOIN station ON station.station_id = stop.station_id
+                       JOIN route ON route.route_id = ts.route_id
+                       JOIN station AS origin ON origin.station_id = route.origin_station_id
+                       JOIN station AS destination
+                           ON destination.station_id = route.destination_station_id
+                       JOIN operator ON operator.operator_id = route.operator_id
+                       LEFT JOIN cancellation
+                           ON cancellation.train_stop_id = stop.train_stop_id
+                          AND cancellation.service_date = stop.service_date
+                       WHERE stop.service_date >= %s AND stop.service_date < %s
+                       ORDER BY stop.train_stop_id;""",
+                    (month, get_next_month(month)))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
@@ -0,0 +1,66 @@
+"""Script for writing archived train stops to Parquet files, locally or in S3.
+
+Each month is written under `{location}/service_month=YYYY-MM/`, the Hive
+layout pyarrow datasets read back with the month as a column. The location is
+either a local directory or an `s3://bucket/prefix` location."""
+
+from datetime import date
+from itertools import chain
+from os import environ as ENV
+from pathlib import Path
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from shared.archive_schema import ARCHIVE_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESSION = "zstd"
+
+
+def get_filesystem(location: str) -> tuple[fs.FileSystem, str]:
+    """Returns the filesystem of an archive location and the location's path on it."""
+    if location.startswith("s3://"):
+        return fs.FileSystem.from_uri(location)
+    return fs.LocalFileSystem(), Path(location).resolve().as_posix()
+
+
+def get_month_path(root: str, month: date, first_train_stop_id: int) -> str:
+    """Returns the path of a month's archive file, named after its first train stop."""
+    return f"{root}/service_month={month:%Y-%m}/train_stop_{first_train_stop_id}.parquet"
+
+
+def write_month(batches, location: str, month: date) -> tuple[str | None, int]:
+    """Writes batches of train stop rows to one Parquet file and returns its path and row count.
+
+    Each batch becomes a row group, so the file is written without holding the
+    whole month. The file is named after the month's first train_stop_id, so
+    exporting the same rows again overwrites it, while stops loaded into the
+    month after it was archived go to a new file. Returns no path if there
+    were no rows."""
+    batches = iter(batches)
+    first_batch = next(batches, None)
+    if not first_batch:
+        return None, 0
+
+    filesystem, root = get_filesystem(location)
+    path = get_month_path(root, month, first_batch[0]["train_stop_id"])
+    filesystem.create_dir(path.rpartition("/")[0], recursive=True)
+
+    rows = 0
+    with pq.ParquetWriter(path, ARCHIVE_SCHEMA, filesystem=filesystem,
+                          compression=ENV.get("ARCHIVE_COMPRESSION", DEFAULT_COMPRESSION)) as writer:
+        for batch in chain([first_batch], batches):
+            writer.write_table(pa.Table.from_pylist(batch, schema=ARCHIVE_SCHEMA))
+            rows += len(batch)
+    logger.info("Wrote %s rows for %s to %s.", rows, f"{month:%Y-%m}", path)
+    return path, rows
+
+
+def count_archived_rows(location: str, path: str) -> int:
+    """Returns the row count of an archive file, read back from its Parquet footer."""
+    filesystem, _ = get_filesystem(location)
+    return pq.read_metadata(path, filesystem=filesystem).num_rows
@@ -0,0 +1,79 @@
+"""Main file that contains the archive pipeline and lambda handler."""
+
+from datetime import date
+from os import environ as ENV
+import logging
+
+from dotenv import load_dotenv
+from psycopg2.extensions import connection as Connection
+
+from extract_archive import (get_db_connection, get_retention_cutoff, get_closed_months,
+                             count_month_rows, iter_month_batches)
+from load_archive import write_month, count_archived_rows
+from prune_archive import drop_month, ArchiveMismatchError
+from shared.metrics import stage, record_rows, reset_metrics, emit_metrics, configure_metrics
+
+logger = logging.getLogger()
+logger.setLevel("DEBUG")
+configure_metrics("archive")
+
+
+def archive_month(conn: Connection, month: date, location: str) -> int:
+    """Exports one month of train stops to the archive, checks it and removes it from the database.
+
+    The month is only removed if the database, the rows written and the file
+    read back from storage all agree on the row count. Returns the rows archived."""
+    with stage("extract"):
+        expected_rows = count_month_rows(conn, month)
+    with stage("load"):
+        path, written_rows = write_month(iter_month_batches(conn, month), location, month)
+        archived_rows = count_archived_rows(location, path) if path else 0
+        record_rows(archived_rows)
+    if written_rows != expected_rows or archived_rows != expected_rows:
+        conn.rollback()
+        raise ArchiveMismatchError(
+            f"{month:%Y-%m} has {expected_rows} rows, {written_rows} were written "
+            f"and {archived_rows} read back from {path}.")
+    with stage("prune"):
+        drop_month(conn, month, archived_rows)
+    return archived_rows
+
+
+def run_archive() -> dict[str, int]:
+    """Archives every train_stop month older than the retention period, oldest first.
+
+    Returns the rows archived per month."""
+    location = ENV["ARCHIVE_LOCATION"]
+    cutoff = get_retention_cutoff()
+    archived = {}
+    conn = get_db_connection()
+    try:
+        months = get_closed_months(conn, cutoff)
+        conn.rollback()
+        logger.info("Archiving %s months before %s.", len(months), cutoff)
+        for month in months:
+            archived[f"{month:%Y-%m}"] = archive_month(conn, month, location)
+    finally:
+        conn.close()
+    return archived
+
+
+def lambda_handler(event, context) -> dict:
+    """AWS Lambda handler that runs the archive pipeline."""
+    load_dotenv()
+    reset_metrics()
+    try:
+        logger.info("Lambda triggered, archiving old train stops.")
+        archived = run_archive()
+        return {
+            "statusCode": 200,
+            "body": f"Archived train stops: {archived}"
+        }
+    except Exception as e:
+        logger.error("Archive job failed: %s", e)
+        return {
+            "statusCode": 500,
+            "body": f"Archive failed: {str(e)}"
+        }
+    finally:
+        emit_metrics()
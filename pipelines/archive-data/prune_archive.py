@@ -0,0 +1,51 @@
+"""Script for removing archived months from the database."""
+
+from datetime import date
+from os import environ as ENV
+import logging
+
+from psycopg2 import sql
+from psycopg2.extensions import connection as Connection
+
+from extract_archive import get_next_month, PARTITION_NAME_FORMAT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_TIMEOUT = "5s"
+
+
+class ArchiveMismatchError(RuntimeError):
+    """Raised when the rows about to be removed differ from the rows archived."""
+
+
+def drop_month(conn: Connection, month: date, archived_rows: int) -> int:
+    """Removes a month's cancellations, train stops and train services in one transaction.
+
+    The train_stop partition is detached and dropped rather than deleted row by
+    row. Its rows are counted again once detached, so the transaction is rolled
+    back if stops were loaded into the month after it was archived. A short
+    lock timeout stops the detach from queueing the RTT loader behind it.
+    Returns the number of train stops removed."""
+    partition = sql.Identifier(month.strftime(PARTITION_NAME_FORMAT))
+    bounds = (month, get_next_month(month))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s;",
+                        (ENV.get("ARCHIVE_LOCK_TIMEOUT", DEFAULT_LOCK_TIMEOUT),))
+            cur.execute("""DELETE FROM cancellation
+                           WHERE service_date >= %s AND service_date < %s;""", bounds)
+            cur.execute(sql.SQL("ALTER TABLE train_stop DETACH PARTITION {};").format(partition))
+            cur.execute(sql.SQL("SELECT COUNT(*) AS row_count FROM {};").format(partition))
+            removed_rows = cur.fetchone()["row_count"]
+            if removed_rows != archived_rows:
+                raise ArchiveMismatchError(
+                    f"{partition.string} has {removed_rows} rows but {archived_rows} were archived.")
+            cur.execute(sql.SQL("DROP TABLE {};").format(partition))
+            cur.execute("""DELETE FROM train_service
+                           WHERE service_date >= %s AND service_date < %s;""", bounds)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Removed %s archived train stops from %s.", removed_rows, partition.string)
+    return removed_rows
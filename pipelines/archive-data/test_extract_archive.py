@@ -0,0 +1,56 @@
+"""Unit testing for the functions in extract_archive.py."""
+# pylint: skip-file
+
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+from extract_archive import (get_next_month, get_retention_cutoff, get_closed_months,
+                             count_month_rows, iter_month_batches)
+
+
+def make_mock_connection(cursor):
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    return conn
+
+
+def test_get_next_month_rolls_over_the_year():
+    assert get_next_month(date(2025, 1, 31)) == date(2025, 2, 1)
+    assert get_next_month(date(2025, 12, 1)) == date(2026, 1, 1)
+
+
+def test_get_retention_cutoff_uses_configured_days():
+    with patch.dict("os.environ", {"ARCHIVE_RETENTION_DAYS": "30"}):
+        assert get_retention_cutoff(date(2025, 7, 31)) == date(2025, 7, 1)
+
+
+def test_get_closed_months_only_returns_months_ended_by_cutoff():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [{"partition_name": "train_stop_2025_06"},
+                                    {"partition_name": "train_stop_2025_04"},
+                                    {"partition_name": "train_stop_2025_05"}]
+
+    months = get_closed_months(make_mock_connection(cursor), date(2025, 6, 1))
+
+    assert months == [date(2025, 4, 1), date(2025, 5, 1)]
+
+
+def test_count_month_rows_bounds_query_to_the_month():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = {"row_count": 12}
+
+    assert count_month_rows(make_mock_connection(cursor), date(2025, 6, 1)) == 12
+    assert cursor.execute.call_args.args[1] == (date(2025, 6, 1), date(2025, 7, 1))
+
+
+def test_iter_month_batches_streams_from_a_named_cursor():
+    cursor = MagicMock()
+    cursor.fetchmany.side_effect = [[{"train_stop_id": 1}, {"train_stop_id": 2}],
+                                    [{"train_stop_id": 3}], []]
+    conn = make_mock_connection(cursor)
+
+    batches = list(iter_month_batches(conn, date(2025, 6, 1), batch_size=2))
+
+    assert batches == [[{"train_stop_id": 1}, {"train_stop_id": 2}], [{"train_stop_id": 3}]]
+    assert conn.cursor.call_args.kwargs == {"name": "archive_2025_06"}
+    cursor.fetchmany.assert_called_with(2)
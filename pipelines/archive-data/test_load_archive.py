@@ -0,0 +1,49 @@
+"""Unit testing for the functions in load_archive.py."""
+# pylint: skip-file
+
+from datetime import date, time
+
+import pyarrow.parquet as pq
+
+from load_archive import get_month_path, write_month, count_archived_rows, ARCHIVE_SCHEMA
+
+
+def make_row(train_stop_id):
+    return {
+        "train_stop_id": train_stop_id, "service_uid": "A1", "train_identity": "1A01",
+        "service_date": date(2025, 6, 14), "station_name": "London Paddington",
+        "station_crs": "PAD", "origin_name": "London Paddington",
+        "destination_name": "Bristol Temple Meads", "operator_name": "GWR",
+        "scheduled_arr_time": None, "actual_arr_time": None,
+        "scheduled_dep_time": time(12, 0), "actual_dep_time": time(12, 5),
+        "platform": "1", "platform_changed": False, "cancelled": False, "cancel_reason": None
+    }
+
+
+def test_get_month_path_uses_hive_month_directory():
+    assert (get_month_path("/archive", date(2025, 6, 1), 42)
+            == "/archive/service_month=2025-06/train_stop_42.parquet")
+
+
+def test_write_month_writes_each_batch_as_a_row_group(tmp_path):
+    batches = [[make_row(1), make_row(2)], [make_row(3)]]
+
+    path, rows = write_month(batches, str(tmp_path), date(2025, 6, 1))
+
+    assert rows == 3
+    assert path == f"{tmp_path}/service_month=2025-06/train_stop_1.parquet"
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.schema_arrow == ARCHIVE_SCHEMA
+    assert parquet.read().column("actual_dep_time").to_pylist()[0] == time(12, 5)
+
+
+def test_write_month_skips_empty_months(tmp_path):
+    assert write_month(iter([]), str(tmp_path), date(2025, 6, 1)) == (None, 0)
+    assert not any(tmp_path.iterdir())
+
+
+def test_count_archived_rows_reads_the_file_footer(tmp_path):
+    path, _ = write_month([[make_row(1), make_row(2)]], str(tmp_path), date(2025, 6, 1))
+
+    assert count_archived_rows(str(tmp_path), path) == 2
@@ -0,0 +1,53 @@
+"""Unit testing for the functions in main_archive.py."""
+# pylint: skip-file
+
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from main_archive import archive_month, lambda_handler
+from prune_archive import ArchiveMismatchError
+
+
+def test_archive_month_drops_month_once_counts_agree():
+    conn = MagicMock()
+    with patch("main_archive.count_month_rows", return_value=2), \
+            patch("main_archive.write_month", return_value=("path", 2)), \
+            patch("main_archive.count_archived_rows", return_value=2), \
+            patch("main_archive.drop_month") as mock_drop:
+        assert archive_month(conn, date(2025, 6, 1), "/archive") == 2
+
+    mock_drop.assert_called_once_with(conn, date(2025, 6, 1), 2)
+
+
+def test_archive_month_keeps_month_if_file_is_short():
+    conn = MagicMock()
+    with patch("main_archive.count_month_rows", return_value=2), \
+            patch("main_archive.write_month", return_value=("path", 2)), \
+            patch("main_archive.count_archived_rows", return_value=1), \
+            patch("main_archive.drop_month") as mock_drop:
+        with pytest.raises(ArchiveMismatchError):
+            archive_month(conn, date(2025, 6, 1), "/archive")
+
+    mock_drop.assert_not_called()
+    conn.rollback.assert_called_once()
+
+
+def test_archive_month_drops_empty_month_without_a_file():
+    with patch("main_archive.count_month_rows", return_value=0), \
+            patch("main_archive.write_month", return_value=(None, 0)), \
+            patch("main_archive.count_archived_rows") as mock_count, \
+            patch("main_archive.drop_month") as mock_drop:
+        assert archive_month(MagicMock(), date(2025, 6, 1), "/archive") == 0
+
+    mock_count.assert_not_called()
+    mock_drop.assert_called_once()
+
+
+def test_lambda_handler_reports_failure():
+    with patch("main_archive.load_dotenv"), \
+            patch("main_archive.run_archive", side_effect=ArchiveMismatchError("short")):
+        response = lambda_handler({}, None)
+
+    assert response["statusCode"] == 500
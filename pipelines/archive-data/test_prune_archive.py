@@ -0,0 +1,44 @@
+"""Unit testing for the functions in prune_archive.py."""
+# pylint: skip-file
+
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from prune_archive import drop_month, ArchiveMismatchError
+
+
+def make_mock_connection(row_count):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = {"row_count": row_count}
+    return conn, cursor
+
+
+def get_statements(cursor):
+    return [str(call.args[0]) for call in cursor.execute.call_args_list]
+
+
+def test_drop_month_detaches_partition_after_deleting_cancellations():
+    conn, cursor = make_mock_connection(3)
+
+    assert drop_month(conn, date(2025, 6, 1), 3) == 3
+
+    statements = get_statements(cursor)
+    assert "DELETE FROM cancellation" in statements[1]
+    assert "DETACH PARTITION" in statements[2]
+    assert "DROP TABLE" in statements[4]
+    assert "DELETE FROM train_service" in statements[5]
+    conn.commit.assert_called_once()
+
+
+def test_drop_month_rolls_back_if_rows_were_added_after_archiving():
+    conn, cursor = make_mock_connection(4)
+
+    with pytest.raises(ArchiveMismatchError):
+        drop_month(conn, date(2025, 6, 1), 3)
+
+    assert not any("DROP TABLE" in statement for statement in get_statements(cursor))
+    conn.rollback.assert_called_once()
+    conn.commit.assert_not_called()
@@ -3,16 +3,8 @@
 from os import environ as ENV
 import logging
 
-from boto3 import client
-from botocore.exceptions import ClientError
 from pandas import Timestamp
 
-logging.basicConfig(
-    level="INFO",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
 logger = logging.getLogger(__name__)
 logging.getLogger('boto3').setLevel(logging.CRITICAL)
 logging.getLogger('botocore').setLevel(logging.CRITICAL)
@@ -21,7 +13,10 @@ logging.getLogger('urllib3').setLevel(logging.CRITICAL)
 
 
 def get_sns_client():
-    """Returns a boto3 SNS client."""
+    """Returns a boto3 SNS client.
+
+    boto3 is imported here so that runs without alerts never pay for loading it."""
+    from boto3 import client  # pylint: disable=import-outside-toplevel
     return client("sns",
                   aws_access_key_id=ENV["ACCESS_KEY"],
                   aws_secret_access_key=ENV["SECRET_KEY"],
@@ -66,6 +61,7 @@ def publish_incident_alert_to_topic(origin_crs: str, destination_crs: str, summa
                                     info_link: str, start_time: Timestamp, end_time: Timestamp,
                                     is_planned: bool, new: bool) -> None:
     """Publish a new or updated incident alert to a topic."""
+    from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
     sns = get_sns_client()
     topic_arn = get_sns_topic_arn(sns, origin_crs, destination_crs)
     start_time = start_time.tz_convert("Europe/London").tz_localize(None)
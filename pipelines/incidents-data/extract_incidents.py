@@ -11,12 +11,6 @@ import pandas as pd
 
 logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
 
 def get_incident_data() -> Response:
     """Fetches data from API."""
@@ -95,6 +89,11 @@ def extract() -> pd.DataFrame:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
 
     data = extract()
@@ -1,37 +1,18 @@
 """A script to load data from the National Rail Incidents API to the RDS."""
 
-from os import environ as ENV
 import logging
 
 from dotenv import load_dotenv
 from pandas import DataFrame
-from psycopg2 import connect
 from psycopg2.extras import execute_values
 from psycopg2.extensions import connection as Connection
 
-from extract_incidents import extract
-from transform_incidents import transform
 from alerts_incidents import publish_incident_alert_to_topic
+from shared.database import get_connection
+from shared.metrics import record_rows, stage
 
 logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
-
-def get_connection() -> Connection:
-    """Get a connection to the RDS."""
-    return connect(
-        host=ENV["DB_HOST"],
-        port=ENV["DB_PORT"],
-        dbname=ENV["DB_NAME"],
-        user=ENV["DB_USER"],
-        password=ENV["DB_PASSWORD"]
-    )
-
 
 def get_operator_id_map(conn: Connection) -> dict[str, int]:
     """Return a dict mapping operator names to operator IDs."""
@@ -83,16 +64,43 @@ def get_route_id(conn: Connection, origin: str, destination: str, operator: str,
     return route[0]
 
 
-def get_existing_incident_keys(conn: Connection) -> dict[str, str]:
-    """Return a dict of incident_number: version_number from the DB."""
-    with conn.cursor() as cur:
-        cur.execute("SELECT incident_number, version_number FROM incident")
-        return {row[0]: row[1] for row in cur.fetchall()}
+def upsert_incident(cur, route_id: int, row) -> tuple[int, bool] | None:
+    """Insert an incident, or update it if its version changed.
+
+    Returns the incident id and whether it was inserted, or None if the
+    stored incident already has this version."""
+    cur.execute("""
+        INSERT INTO incident (
+            route_id, start_time, end_time, description,
+            incident_number, version_number, is_planned,
+            info_link, summary
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (incident_number) DO UPDATE
+        SET route_id = EXCLUDED.route_id,
+            start_time = EXCLUDED.start_time,
+            end_time = EXCLUDED.end_time,
+            description = EXCLUDED.description,
+            version_number = EXCLUDED.version_number,
+            is_planned = EXCLUDED.is_planned,
+            info_link = EXCLUDED.info_link,
+            summary = EXCLUDED.summary
+        WHERE incident.version_number IS DISTINCT FROM EXCLUDED.version_number
+        RETURNING incident_id, (xmax = 0) AS inserted
+        ;
+        """, (route_id,
+              row["start_time"],
+              row["end_time"],
+              row["description"],
+              row["incident_number"],
+              row["version_number"],
+              row["is_planned"],
+              row["info_link"],
+              row["summary"]))
+    return cur.fetchone()
 
 
 def insert_incidents(conn: Connection, data: DataFrame) -> None:
     """Insert incident data if it's not already in the database."""
-    existing_versions = get_existing_incident_keys(conn)
     operator_id_map = get_operator_id_map(conn)
     station_id_map = get_station_id_map(conn)
 
@@ -140,94 +148,40 @@ def insert_incidents(conn: Connection, data: DataFrame) -> None:
                     "No valid route found for incident %s. Skipping.", key)
                 continue
 
-        incident_id = None
-
         with conn.cursor() as cur:
-            if incident_number not in existing_versions:
-                logger.debug("Inserting new incident.")
-
-                insert_query = """
-                INSERT INTO incident (
-                    route_id, start_time, end_time, description,
-                    incident_number, version_number, is_planned,
-                    info_link, summary
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING incident_id
-                ;
-                """
-
-                values = (route_id,
-                          row["start_time"],
-                          row["end_time"],
-                          row["description"],
-                          row["incident_number"],
-                          row["version_number"],
-                          row["is_planned"],
-                          row["info_link"],
-                          row["summary"])
-
-                cur.execute(insert_query, values)
-                incident_id = cur.fetchone()[0]
+            upserted = upsert_incident(cur, route_id, row)
+            if upserted is None:
+                skipped_count += 1
+                logger.info("Skipping unchanged incident %s.", incident_number)
+                continue
+
+            incident_id, new = upserted
+            if new:
                 inserted_count += 1
                 logger.info("Inserted new incident %s.", incident_number)
-                publish_incident_alert_to_topic("PAD", "BRI", row["summary"], row["info_link"],
-                                                row["start_time"], row["end_time"], row["is_planned"], True)
-
-            elif existing_versions[incident_number] != version_number:
-                logger.debug("Updating existing incident.")
-                update_query = """
-                UPDATE incident
-                SET route_id = %s,
-                    start_time = %s,
-                    end_time = %s,
-                    description = %s,
-                    version_number = %s,
-                    is_planned = %s,
-                    info_link = %s,
-                    summary = %s
-                WHERE incident_number = %s
-                RETURNING incident_id
-                ;
-                """
-
-                values = (
-                    route_id,
-                    row["start_time"],
-                    row["end_time"],
-                    row["description"],
-                    version_number,
-                    row["is_planned"],
-                    row["info_link"],
-                    row["summary"],
-                    incident_number
-                )
-
-                cur.execute(update_query, values)
-                incident_id = cur.fetchone()[0]
+            else:
                 updated_count += 1
                 logger.info("Updated incident %s to version %s.",
                             incident_number, version_number)
+            with stage("alerts"):
                 publish_incident_alert_to_topic("PAD", "BRI", row["summary"], row["info_link"],
-                                                row["start_time"], row["end_time"], row["is_planned"], False)
-
-            else:
-                skipped_count += 1
-                logger.info("Skipping unchanged incident %s.", incident_number)
-                continue
-
-            if incident_id:
-                assignment_values = [(incident_id, op_id)
-                                     for op_id in operator_ids]
-                assignment_query = """
-                INSERT INTO operator_incident_assignment
-                    (incident_id, operator_id)
-                VALUES %s
-                ON CONFLICT DO NOTHING
-                ;
-                """
-                execute_values(cur, assignment_query, assignment_values)
+                                                row["start_time"], row["end_time"],
+                                                row["is_planned"], new)
+                record_rows(1)
+
+            assignment_values = [(incident_id, op_id)
+                                 for op_id in operator_ids]
+            assignment_query = """
+            INSERT INTO operator_incident_assignment
+                (incident_id, operator_id)
+            VALUES %s
+            ON CONFLICT (incident_id, operator_id) DO NOTHING
+            ;
+            """
+            execute_values(cur, assignment_query, assignment_values)
 
     conn.commit()
+    record_rows(inserted_count + updated_count)
     logger.info("Inserted %s new incidents.", inserted_count)
     logger.info("Updated %s incidents.", updated_count)
     logger.info("Skipped %s duplicated incidents.", skipped_count)
@@ -240,6 +194,15 @@ def load(data: DataFrame) -> None:
 
 
 if __name__ == "__main__":
+    # pylint: disable=import-outside-toplevel
+    from extract_incidents import extract
+    from transform_incidents import transform
+
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
     extracted = extract()
     transformed = transform(extracted)
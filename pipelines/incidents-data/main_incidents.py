@@ -7,21 +7,29 @@ from dotenv import load_dotenv
 from extract_incidents import extract
 from transform_incidents import transform
 from load_incidents import load
+from shared.metrics import stage, record_rows, reset_metrics, emit_metrics, configure_metrics
 
 logger = logging.getLogger()
 logger.setLevel("DEBUG")
+configure_metrics("incidents")
 
 
 def run_etl() -> None:
     """Runs the incidents ETL Pipeline."""
-    data = extract()
-    transformed_data = transform(data)
-    load(transformed_data)
+    with stage("extract"):
+        data = extract()
+        record_rows(len(data))
+    with stage("transform"):
+        transformed_data = transform(data)
+        record_rows(len(transformed_data))
+    with stage("load"):
+        load(transformed_data)
 
 
 def lambda_handler(event, context) -> dict:
     """AWS Lambda handler that runs the ETL pipeline."""
     load_dotenv()
+    reset_metrics()
     try:
         logger.info("Lambda triggered, running ETL.")
         run_etl()
@@ -35,3 +43,5 @@ def lambda_handler(event, context) -> dict:
             "statusCode": 500,
             "body": f"ETL failed: {str(e)}"
         }
+    finally:
+        emit_metrics()
@@ -0,0 +1,19 @@
+"""Cold-start import checks for the incidents Lambda entry point."""
+# pylint: skip-file
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_main_incidents_import_does_not_load_boto3():
+    """Test that boto3 is only imported once an alert is published."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main_incidents"],
+                            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": str(Path(__file__).parents[2])})
+    imported = {line.split("|")[2].strip() for line in result.stderr.splitlines()
+                if line.startswith("import time:") and line.count("|") == 2}
+    assert "main_incidents" in imported
+    assert "boto3" not in imported
+    assert "botocore" not in imported
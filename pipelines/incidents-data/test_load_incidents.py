@@ -7,7 +7,8 @@ import pytest
 from load_incidents import (get_operator_id_map,
                             get_station_id_map,
                             get_route_id,
-                            insert_incidents)
+                            insert_incidents,
+                            upsert_incident)
 
 
 def test_get_operator_id_map(fake_conn):
@@ -68,16 +69,16 @@ def test_get_route_id_missing_operator_id(fake_conn):
 def test_route_caching(sample_extracted_data_pad_bri, fake_conn):
     """Test that get_route_id is only called if the route isn't cached."""
     with patch("load_incidents.get_route_id", return_value=1) as mock_get_route_id, \
-            patch("load_incidents.get_existing_incident_keys", return_value={}), \
             patch("load_incidents.get_operator_id_map",
                   return_value={"Great Western Railway": 1}), \
             patch("load_incidents.get_station_id_map", return_value={
                 "London Paddington": 1,
                 "Bristol Temple Meads": 2}), \
-            patch("load_incidents.publish_incident_alert_to_topic", return_value=None):
+            patch("load_incidents.publish_incident_alert_to_topic", return_value=None), \
+            patch("load_incidents.execute_values"):
 
         fake_cursor = fake_conn.cursor.return_value.__enter__.return_value
-        fake_cursor.fetchone.return_value = [None]
+        fake_cursor.fetchone.return_value = (1, True)
 
         insert_incidents(fake_conn, sample_extracted_data_pad_bri)
 
@@ -93,17 +94,44 @@ def test_route_caching(sample_extracted_data_pad_bri, fake_conn):
 
 def test_insert_incident_commits_once(fake_conn, sample_extracted_data_pad_bri):
     """Test that commit is called in insert incidents."""
-    with patch("load_incidents.get_existing_incident_keys", return_value={}), \
-            patch("load_incidents.get_operator_id_map",
-                  return_value={"Great Western Railway": 1}), \
+    with patch("load_incidents.get_operator_id_map",
+               return_value={"Great Western Railway": 1}), \
             patch("load_incidents.get_station_id_map", return_value={
                 "London Paddington": 1,
                 "Bristol Temple Meads": 2}), \
-            patch("load_incidents.publish_incident_alert_to_topic", return_value=None):
+            patch("load_incidents.publish_incident_alert_to_topic", return_value=None), \
+            patch("load_incidents.execute_values"):
 
         fake_cursor = fake_conn.cursor.return_value.__enter__.return_value
-        fake_cursor.fetchone.return_value = [None]
+        fake_cursor.fetchone.return_value = (1, True)
 
         insert_incidents(fake_conn, sample_extracted_data_pad_bri)
 
         fake_conn.commit.assert_called_once()
+
+
+def test_upsert_incident_updates_only_changed_versions(fake_conn, sample_extracted_data_pad_bri):
+    """Test that the upsert is keyed on incident_number and skips unchanged versions."""
+    cursor = fake_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (4, False)
+
+    assert upsert_incident(cursor, 1, sample_extracted_data_pad_bri.iloc[0]) == (4, False)
+    sql = cursor.execute.call_args.args[0]
+    assert "ON CONFLICT (incident_number) DO UPDATE" in sql
+    assert "IS DISTINCT FROM EXCLUDED.version_number" in sql
+
+
+def test_insert_incidents_alerts_per_upsert_outcome(fake_conn, sample_extracted_data_pad_bri):
+    """Test that inserts and updates alert as new and updated, and unchanged incidents are skipped."""
+    with patch("load_incidents.get_route_id", return_value=1), \
+            patch("load_incidents.get_operator_id_map",
+                  return_value={"Great Western Railway": 1}), \
+            patch("load_incidents.get_station_id_map", return_value={}), \
+            patch("load_incidents.upsert_incident", side_effect=[(1, True), None]), \
+            patch("load_incidents.execute_values") as mock_values, \
+            patch("load_incidents.publish_incident_alert_to_topic") as mock_publish:
+        insert_incidents(fake_conn, sample_extracted_data_pad_bri)
+
+    mock_publish.assert_called_once()
+    assert mock_publish.call_args.args[-1] is True
+    assert mock_values.call_args.args[2] == [(1, 1)]
@@ -6,14 +6,6 @@ import re
 from dotenv import load_dotenv
 import pandas as pd
 
-from extract_incidents import extract
-
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +40,13 @@ def transform(df: pd.DataFrame) -> pd.DataFrame:
 
 
 if __name__ == "__main__":
+    from extract_incidents import extract  # pylint: disable=import-outside-toplevel
+
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
     data = extract()
     transformed = transform(data)
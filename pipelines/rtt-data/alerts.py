@@ -1,17 +1,35 @@
-"""Modules/Functions required to push information to station topics."""
+"""Modules/Functions required to push information to station topics.
+
+Delay alerts found during a load are queued with queue_notification and only
+published once the load has committed, by flush_notifications, on a small
+thread pool with one task per topic. wait_for_notifications lets the Lambda
+handler wait for them before the invocation ends."""
 import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from functools import cache
+from os import environ as ENV
 
 from pandas import DataFrame
-import boto3
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALERT_WORKERS = 4
+DEFAULT_ALERT_WAIT_SECONDS = 10
+MAX_BATCH_ENTRIES = 10
 
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
+ROUTES = [
+    ("London Paddington", "Bristol Temple Meads")
+]
 
-logger = logging.getLogger(__name__)
+ROUTES_TO_CRS = {
+    "London Paddington": "PAD",
+    "Bristol Temple Meads": "BRI"
+}
+
+# Kept at module level so queued alerts wait for the commit, and so the pool
+# and topic ARNs survive warm Lambda invocations.
+_pending_alerts: list[dict] = []
+_in_flight: list[Future] = []
 
 
 def filter_by_route(delayed_train_data: DataFrame, origin: str, destination: str) -> DataFrame:
@@ -27,20 +45,35 @@ def filter_by_route(delayed_train_data: DataFrame, origin: str, destination: str
     return filtered_route
 
 
-def send_notification(delayed_train_data: DataFrame) -> None:
-    """Sends notification to specific route topics."""
-    sns_client = boto3.client("sns")
+@cache
+def get_sns_client():
+    """Returns an SNS client, importing boto3 only once an alert is actually sent.
+
+    boto3 adds around 100 ms to a cold start, and most runs send no alerts."""
+    import boto3  # pylint: disable=import-outside-toplevel
+    return boto3.client("sns")
 
-    routes = [
-        ("London Paddington", "Bristol Temple Meads")
-    ]
 
-    routes_to_crs = {
-        "London Paddington": "PAD",
-        "Bristol Temple Meads": "BRI"
-    }
+@cache
+def get_topic_arn(topic_name: str) -> str:
+    """Returns a topic's ARN, creating the topic on first use.
 
-    for origin, destination in routes:
+    create_topic returns the same ARN for an existing topic, so it is only
+    called once per topic per process."""
+    return get_sns_client().create_topic(Name=topic_name)["TopicArn"]
+
+
+@cache
+def get_alert_executor() -> ThreadPoolExecutor:
+    """Returns the thread pool alerts are published on."""
+    return ThreadPoolExecutor(max_workers=int(ENV.get("ALERT_WORKERS", DEFAULT_ALERT_WORKERS)),
+                              thread_name_prefix="alerts")
+
+
+def build_alerts(delayed_train_data: DataFrame) -> list[dict]:
+    """Returns one alert, with its topic name, subject and message, per route with delays."""
+    alerts = []
+    for origin, destination in ROUTES:
         logging.info("Filtering for %s -> %s", origin, destination)
         delayed_train_for_current_route = filter_by_route(
             delayed_train_data, origin, destination)
@@ -64,16 +97,107 @@ def send_notification(delayed_train_data: DataFrame) -> None:
 
                 message.append(station)
 
-            full_message = "\n\n".join(message)
+            alerts.append({
+                "topic_name": f"c17-trains-delays-{ROUTES_TO_CRS[origin]}-{ROUTES_TO_CRS[destination]}",
+                "subject": f"Delays: {origin} → {destination}",
+                "message": "\n\n".join(message)
+            })
+    return alerts
+
+
+def publish_alerts(topic_name: str, alerts: list[dict]) -> int:
+    """Publishes alerts to one topic, up to ten per publish_batch call.
+
+    Returns the number of alerts SNS accepted; rejected entries are logged."""
+    sns_client = get_sns_client()
+    topic_arn = get_topic_arn(topic_name)
+    published = 0
+    for start in range(0, len(alerts), MAX_BATCH_ENTRIES):
+        batch = alerts[start:start + MAX_BATCH_ENTRIES]
+        if len(batch) == 1:
+            sns_client.publish(TopicArn=topic_arn, Message=batch[0]["message"],
+                               Subject=batch[0]["subject"])
+            published += 1
+            continue
+        response = sns_client.publish_batch(
+            TopicArn=topic_arn,
+            PublishBatchRequestEntries=[
+                {"Id": str(entry_id), "Message": alert["message"], "Subject": alert["subject"]}
+                for entry_id, alert in enumerate(batch)
+            ])
+        published += len(response.get("Successful", []))
+        for failure in response.get("Failed", []):
+            logger.error("SNS rejected alert %s for %s: %s",
+                         failure["Id"], topic_arn, failure.get("Message"))
+    logging.info("Published %d delay alert(s) to SNS topic %s", published, topic_arn)
+    return published
+
+
+def group_by_topic(alerts: list[dict]) -> dict[str, list[dict]]:
+    """Returns the alerts grouped by topic name, in the order they were queued."""
+    topics = {}
+    for alert in alerts:
+        topics.setdefault(alert["topic_name"], []).append(alert)
+    return topics
 
-            topic_name = f"c17-trains-delays-{routes_to_crs[origin]}-{routes_to_crs[destination]}"
-            response = sns_client.create_topic(Name=topic_name)
-            topic_arn = response["TopicArn"]
 
-            sns_client.publish(
-                TopicArn=topic_arn,
-                Message=full_message,
-                Subject=f"Delays: {origin} → {destination}"
-            )
-
-            logging.info("Published delay alert to SNS topic %s", topic_arn)
+def send_notification(delayed_train_data: DataFrame) -> None:
+    """Sends notification to specific route topics, waiting for each publish."""
+    for topic_name, alerts in group_by_topic(build_alerts(delayed_train_data)).items():
+        publish_alerts(topic_name, alerts)
+
+
+def queue_notification(delayed_train_data: DataFrame) -> int:
+    """Queues the delay alerts for a batch until flush_notifications is called.
+
+    Returns the number of alerts queued."""
+    alerts = build_alerts(delayed_train_data)
+    _pending_alerts.extend(alerts)
+    return len(alerts)
+
+
+def discard_notifications() -> None:
+    """Drops the queued alerts, e.g. when the load that found them rolls back."""
+    if _pending_alerts:
+        logger.info("Discarding %d queued alert(s).", len(_pending_alerts))
+    _pending_alerts.clear()
+
+
+def flush_notifications() -> int:
+    """Publishes the queued alerts in the background, one task per topic.
+
+    The SNS client is created here rather than in the pool's threads, as
+    creating boto3 clients is not thread safe. Returns the number of alerts
+    handed to the pool."""
+    if not _pending_alerts:
+        return 0
+    get_sns_client()
+    executor = get_alert_executor()
+    for topic_name, alerts in group_by_topic(_pending_alerts).items():
+        _in_flight.append(executor.submit(publish_alerts, topic_name, alerts))
+    flushed = len(_pending_alerts)
+    _pending_alerts.clear()
+    return flushed
+
+
+def wait_for_notifications(timeout: float | None = None) -> int:
+    """Waits for the alerts being published and returns how many SNS accepted.
+
+    Lambda freezes background threads once the handler returns, so the
+    handler calls this last. Failures are logged rather than raised, so an
+    SNS problem never fails a load that has already committed."""
+    if not _in_flight:
+        return 0
+    timeout = timeout if timeout is not None else float(
+        ENV.get("ALERT_WAIT_SECONDS", DEFAULT_ALERT_WAIT_SECONDS))
+    done, not_done = wait(_in_flight, timeout=timeout)
+    published = 0
+    for future in done:
+        if future.exception() is not None:
+            logger.error("Failed to publish delay alerts: %s", future.exception())
+        else:
+            published += future.result()
+    if not_done:
+        logger.warning("%d alert publish(es) still running after %s s.", len(not_done), timeout)
+    _in_flight[:] = list(not_done)
+    return published
@@ -0,0 +1,113 @@
+"""Archives raw Realtime Trains API responses and reads them back for replay.
+
+Responses are stored gzipped under `{crs}/{fetched_at}.json.gz` in either a
+local directory or an `s3://bucket/prefix` location."""
+
+import gzip
+import json
+import logging
+from datetime import datetime, timezone
+from itertools import groupby
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+SUFFIX = ".json.gz"
+
+
+def split_s3_location(location: str) -> tuple[str, str]:
+    """Returns the bucket and key prefix of an s3:// location."""
+    bucket, _, prefix = location.removeprefix("s3://").partition("/")
+    return bucket, prefix.strip("/")
+
+
+def get_s3_client():
+    """Returns an S3 client, importing boto3 only when an S3 archive is used."""
+    import boto3  # pylint: disable=import-outside-toplevel
+    return boto3.client("s3")
+
+
+def get_archive_key(crs: str, fetched_at: datetime) -> str:
+    """Returns the archive key of a station's response fetched at the given time."""
+    return f"{crs}/{fetched_at.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)}{SUFFIX}"
+
+
+def parse_archive_key(key: str) -> tuple[str, datetime]:
+    """Returns the station CRS and fetch time an archive key was written for."""
+    crs, _, name = key.rpartition("/")
+    fetched_at = datetime.strptime(name.removesuffix(SUFFIX), TIMESTAMP_FORMAT)
+    return crs.rpartition("/")[2], fetched_at.replace(tzinfo=timezone.utc)
+
+
+def archive_response(location: str, crs: str, response: dict, fetched_at: datetime) -> str:
+    """Writes a compressed API response to the archive and returns its key."""
+    key = get_archive_key(crs, fetched_at)
+    body = gzip.compress(json.dumps(response).encode("utf-8"))
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        get_s3_client().put_object(Bucket=bucket, Key=f"{prefix}/{key}".lstrip("/"),
+                                   Body=body, ContentEncoding="gzip",
+                                   ContentType="application/json")
+    else:
+        path = Path(location) / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+    logger.debug("Archived %s response as %s.", crs, key)
+    return key
+
+
+def archive_responses(location: str, station_responses: list[tuple[str, dict]],
+                      fetched_at: datetime) -> None:
+    """Archives every (crs, response) pair, logging rather than raising on failure.
+
+    Archiving is best effort so a storage problem never costs a run its load."""
+    for crs, response in station_responses:
+        try:
+            archive_response(location, crs, response, fetched_at)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Failed to archive response for %s.", crs)
+
+
+def list_archive_keys(location: str) -> list[str]:
+    """Returns every key in the archive, relative to its location."""
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        paginator = get_s3_client().get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.extend(item["Key"].removeprefix(prefix).lstrip("/")
+                        for item in page.get("Contents", []))
+    else:
+        root = Path(location)
+        keys = [path.relative_to(root).as_posix() for path in root.glob(f"*/*{SUFFIX}")]
+    return [key for key in keys if key.endswith(SUFFIX)]
+
+
+def read_archived_response(location: str, key: str) -> dict:
+    """Returns a decompressed API response from the archive."""
+    if location.startswith("s3://"):
+        bucket, prefix = split_s3_location(location)
+        body = get_s3_client().get_object(
+            Bucket=bucket, Key=f"{prefix}/{key}".lstrip("/"))["Body"].read()
+    else:
+        body = (Path(location) / key).read_bytes()
+    return json.loads(gzip.decompress(body))
+
+
+def iter_archived_runs(location: str, start: datetime | None = None,
+                       end: datetime | None = None):
+    """Yields (minute, [(crs, response), ...]) for each fetch minute in the archive, oldest first.
+
+    Responses fetched within the same minute are grouped as one run, the same
+    way they would have been loaded live. start and end bound the fetch times."""
+    entries = []
+    for key in list_archive_keys(location):
+        crs, fetched_at = parse_archive_key(key)
+        if (start is None or fetched_at >= start) and (end is None or fetched_at < end):
+            entries.append((fetched_at.replace(second=0), crs, key))
+    entries.sort()
+
+    for minute, run_entries in groupby(entries, key=lambda entry: entry[0]):
+        yield minute, [(crs, read_archived_response(location, key))
+                       for _, crs, key in run_entries]
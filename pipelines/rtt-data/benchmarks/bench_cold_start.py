@@ -0,0 +1,83 @@
+"""Measures the cold-start import cost of the Lambda entry point.
+
+Run from the rtt-data directory with `python -m benchmarks.bench_cold_start`.
+Each run imports the module in a fresh interpreter with `python -X importtime`
+and reports the slowest top-level packages, averaged over the runs."""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+RTT_DIR = Path(__file__).resolve().parents[1]
+# The Lambda image puts shared/ beside the handler; locally it is at the repo root.
+REPO_ROOT = RTT_DIR.parents[1]
+
+# Packages that are only needed on some runs, so must not load with the handler.
+DEFERRED_MODULES = ("boto3", "botocore", "asyncio")
+
+
+def iter_import_lines(output: str):
+    """Yields (module, cumulative microseconds) for each line of `-X importtime` output."""
+    for line in output.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            yield name.strip(), int(cumulative)
+
+
+def parse_import_times(output: str) -> dict[str, int]:
+    """Returns the cumulative import time in microseconds of each top-level package.
+
+    A package's time includes the modules it imports, so the figures overlap,
+    for example extract includes pandas."""
+    times = {}
+    for name, cumulative in iter_import_lines(output):
+        if "." not in name:
+            times.setdefault(name, cumulative)
+    return times
+
+
+def get_imported_modules(output: str) -> set[str]:
+    """Returns every module named in `-X importtime` output."""
+    return {name for name, _ in iter_import_lines(output)}
+
+
+def run_importtime(module: str, cwd: Path = RTT_DIR) -> str:
+    """Imports module in a fresh interpreter and returns its `-X importtime` output."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": str(REPO_ROOT)})
+    return result.stderr
+
+
+def main() -> None:
+    """Imports the module several times and prints the averaged results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    totals: dict[str, int] = {}
+    imported = set()
+    for _ in range(args.runs):
+        output = run_importtime(args.module)
+        imported |= get_imported_modules(output)
+        for name, micros in parse_import_times(output).items():
+            totals[name] = totals.get(name, 0) + micros
+
+    print(f"import {args.module}: {totals.get(args.module, 0) / args.runs / 1000:.1f} ms "
+          f"(mean of {args.runs} cold imports)")
+    slowest = sorted(((micros, name) for name, micros in totals.items()
+                      if name != args.module), reverse=True)
+    for micros, name in slowest[:args.top]:
+        print(f"  {name:<30} {micros / args.runs / 1000:8.1f} ms")
+    loaded = [name for name in DEFERRED_MODULES if name in imported]
+    print(f"deferred modules loaded: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
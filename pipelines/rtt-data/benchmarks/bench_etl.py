@@ -0,0 +1,142 @@
+"""Times the extract, transform and load stages of the ETL on synthetic payloads.
+
+Run from the rtt-data directory with `python -m benchmarks.bench_etl`. Extract
+fetches from a local HTTP stub rather than the live API. The load stage only
+runs with --load, against the database in the DB_* environment variables,
+which should be a throwaway local Postgres: --reset-schema drops and recreates
+every table from architecture/database/schema.sql first."""
+
+import argparse
+import json
+import logging
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import environ as ENV
+from pathlib import Path
+from threading import Thread
+from time import perf_counter
+
+from benchmarks.synthetic import make_payloads
+from circuit_breaker import reset_circuits
+from extract import fetch_train_data, close_session
+from load import (get_connection, load_data_into_database, invalidate_dimension_cache,
+                  invalidate_partition_cache)
+from transform import transform_train_data
+
+SCHEMA_PATH = Path(__file__).resolve().parents[3] / "architecture" / "database" / "schema.sql"
+
+
+def start_stub_server(payloads: list[tuple[str, dict]]) -> ThreadingHTTPServer:
+    """Starts a local HTTP server answering /search/{crs} with the given payloads."""
+    bodies = {f"/search/{crs}": json.dumps(payload).encode("utf-8")
+              for crs, payload in payloads}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        """Serves the synthetic payloads."""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Responds with the payload for the requested station."""
+            body = bodies.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Keeps request logging out of the benchmark output."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(stage) -> tuple[object, float, int]:
+    """Runs a stage once, returning its result, wall time in seconds and peak traced bytes.
+
+    tracemalloc slows Python down, so the timing run is untraced and the
+    memory figure comes from a second, traced run."""
+    start = perf_counter()
+    result = stage()
+    seconds = perf_counter() - start
+
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def report(name: str, rows: int, seconds: float, peak: int | None) -> None:
+    """Prints one line of benchmark results."""
+    peak_text = f"{peak / 2 ** 20:9.1f} MiB" if peak is not None else f"{'-':>13}"
+    print(f"{name:<14} {rows:>8} rows {seconds * 1000:10.1f} ms "
+          f"{rows / seconds:12.0f} rows/s {peak_text}")
+
+
+def reset_schema() -> None:
+    """Drops and recreates the database tables from schema.sql."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text())
+    invalidate_dimension_cache()
+    invalidate_partition_cache()
+
+
+def main() -> None:
+    """Generates payloads, runs each stage and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=40)
+    parser.add_argument("--services", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load", action="store_true",
+                        help="also time the load against the DB_* database")
+    parser.add_argument("--reset-schema", action="store_true",
+                        help="drop and recreate every table before loading")
+    parser.add_argument("--server-side", action="store_true",
+                        help="let Postgres find new routes, services and cancellations")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    payloads = make_payloads(args.stations, args.services, args.seed)
+    stations = [crs for crs, _ in payloads]
+
+    server = start_stub_server(payloads)
+    ENV.update(RTT_API_URL=f"http://127.0.0.1:{server.server_port}",
+               API_USERNAME=ENV.get("API_USERNAME", "benchmark"),
+               API_PASSWORD=ENV.get("API_PASSWORD", "benchmark"),
+               RTT_RATE_LIMIT="0")
+    ENV.pop("ARCHIVE_LOCATION", None)
+    close_session()
+    reset_circuits()
+
+    print(f"{args.stations} stations, {args.services} services, {args.workers} fetch workers")
+    fetched, seconds, peak = measure(
+        lambda: fetch_train_data(stations, args.workers))
+    report("extract", len(fetched), seconds, peak)
+    server.shutdown()
+
+    transformed, seconds, peak = measure(
+        lambda: transform_train_data(fetched.copy()))
+    report("transform", len(transformed), seconds, peak)
+
+    if not args.load:
+        return
+    if args.reset_schema:
+        reset_schema()
+    with get_connection() as conn:
+        for name in ("load (first)", "load (repeat)"):
+            start = perf_counter()
+            load_data_into_database(transformed, conn, notify=False,
+                                    server_side=args.server_side)
+            report(name, len(transformed), perf_counter() - start, None)
+        tracemalloc.start()
+        load_data_into_database(transformed, conn, notify=False,
+                                server_side=args.server_side)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"load peak memory (repeat run): {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compares vectorised RTT time parsing against the per-cell strptime path.
+
+Run from the rtt-data directory with `python -m benchmarks.bench_time_parsing`."""
+
+from datetime import datetime, time
+from timeit import repeat
+
+import numpy as np
+import pandas as pd
+from pandas import Series
+
+from shared.delays import seconds_to_times
+from transform import parse_rtt_times
+
+ROWS = 100_000
+
+
+def convert_hhmm_to_time(time_string) -> time:
+    """The previous per-cell conversion used by convert_time_columns."""
+    if pd.isna(time_string) or time_string == '':
+        return None
+    try:
+        return datetime.strptime(time_string, '%H%M').time()
+    except ValueError:
+        return None
+
+
+def make_time_strings(rows: int, seed: int = 0) -> Series:
+    """Returns RTT-style HHMM strings with a share of blank and invalid values."""
+    rng = np.random.default_rng(seed)
+    values = Series([f"{h:02}{m:02}" for h, m in zip(
+        rng.integers(0, 24, rows), rng.integers(0, 60, rows))], dtype=object)
+    values[rng.random(rows) < 0.05] = None
+    values[rng.random(rows) < 0.01] = "2460"
+    return values
+
+
+def main() -> None:
+    """Times both paths on the same column and prints the speed-up."""
+    column = make_time_strings(ROWS)
+
+    legacy = min(repeat(lambda: column.apply(convert_hhmm_to_time),
+                        number=1, repeat=3))
+    vectorised = min(repeat(lambda: parse_rtt_times(column),
+                            number=1, repeat=3))
+    vectorised_times = min(repeat(lambda: seconds_to_times(parse_rtt_times(column)),
+                                  number=1, repeat=3))
+
+    assert seconds_to_times(parse_rtt_times(column)).equals(
+        column.apply(convert_hhmm_to_time))
+
+    print(f"Rows: {ROWS}")
+    print(f"strptime per cell:           {legacy * 1000:8.1f} ms")
+    print(f"vectorised to seconds:       {vectorised * 1000:8.1f} ms "
+          f"({legacy / vectorised:.1f}x)")
+    print(f"vectorised to time objects:  {vectorised_times * 1000:8.1f} ms "
+          f"({legacy / vectorised_times:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
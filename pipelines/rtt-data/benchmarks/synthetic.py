@@ -0,0 +1,95 @@
+"""Generates realistic synthetic Realtime Trains `/search/{crs}` payloads.
+
+Services run along a line of stations and appear in the payload of every
+station they call at, with a mix of late running, missing realtimes,
+cancellations, platform changes, overnight running and non-train services."""
+
+from datetime import date
+from string import ascii_uppercase
+
+import numpy as np
+
+OPERATORS = ["Great Western Railway", "CrossCountry", "Elizabeth line",
+             "South Western Railway", "Heathrow Express"]
+NON_TRAIN_TYPES = ["bus", "ship"]
+CANCEL_REASONS = [("TG", "a shortage of train crew"),
+                  ("IB", "a points failure"),
+                  ("XW", "severe weather")]
+
+
+def make_stations(count: int) -> list[tuple[str, str]]:
+    """Returns (crs, name) pairs for count stations, in line order."""
+    return [(ascii_uppercase[i // 676 % 26] + ascii_uppercase[i // 26 % 26] + ascii_uppercase[i % 26],
+             f"Synthetic Station {i:03}")
+            for i in range(count)]
+
+
+def format_time(minutes: int, half_minute: bool = False) -> str:
+    """Returns minutes after midnight as an RTT HHMM string, wrapping past midnight."""
+    minutes %= 24 * 60
+    return f"{minutes // 60:02}{minutes % 60:02}{'H' if half_minute else ''}"
+
+
+def make_service(index: int, stations: list[tuple[str, str]], rng: np.random.Generator,
+                 service_date: date) -> tuple[dict, list[tuple[str, dict]]]:
+    """Returns one service and the (crs, location detail) of every station it calls at."""
+    length = int(rng.integers(2, min(12, len(stations)) + 1))
+    first = int(rng.integers(0, len(stations) - length + 1))
+    calls = stations[first:first + length]
+    if rng.random() < 0.5:
+        calls = calls[::-1]
+
+    # A tenth of services start late in the evening and run past midnight.
+    departure = int(rng.integers(22 * 60, 24 * 60) if rng.random() < 0.1
+                    else rng.integers(5 * 60, 22 * 60))
+    delay = int(rng.choice([0, 0, 0, 1, 2, 5, 12, 35]))
+    cancelled = rng.random() < 0.03
+    cancel_code, cancel_text = CANCEL_REASONS[int(rng.integers(len(CANCEL_REASONS)))]
+
+    service = {
+        "serviceUid": f"S{index:05}",
+        "runDate": service_date.isoformat(),
+        "trainIdentity": f"{rng.integers(1, 10)}{ascii_uppercase[index % 26]}{index % 100:02}",
+        "atocName": OPERATORS[int(rng.integers(len(OPERATORS)))],
+        "serviceType": (NON_TRAIN_TYPES[int(rng.integers(len(NON_TRAIN_TYPES)))]
+                        if rng.random() < 0.02 else "train"),
+    }
+
+    stops = []
+    for crs, _ in calls:
+        delay = max(0, delay + int(rng.integers(-1, 3)))
+        platform_changed = rng.random() < 0.05
+        detail = {
+            "origin": [{"description": calls[0][1]}],
+            "destination": [{"description": calls[-1][1]}],
+            "gbttBookedArrival": format_time(departure - 1),
+            "gbttBookedDeparture": format_time(departure),
+            "platform": str(int(rng.integers(1, 15))) + ("A" if platform_changed else ""),
+            "platformChanged": platform_changed,
+        }
+        if rng.random() > 0.02:
+            detail["realtimeArrival"] = format_time(departure - 1 + delay)
+            detail["realtimeDeparture"] = format_time(departure + delay, rng.random() < 0.01)
+        if cancelled:
+            detail["cancelReasonCode"] = cancel_code
+            detail["cancelReasonLongText"] = cancel_text
+        stops.append((crs, detail))
+        departure += int(rng.integers(3, 16))
+    return service, stops
+
+
+def make_payloads(station_count: int = 40, service_count: int = 3000, seed: int = 0,
+                  service_date: date | None = None) -> list[tuple[str, dict]]:
+    """Returns (crs, payload) pairs for every station, in the shape the RTT search API returns."""
+    rng = np.random.default_rng(seed)
+    service_date = service_date or date.today()
+    stations = make_stations(station_count)
+    payloads = {crs: {"location": {"name": name, "crs": crs}, "services": []}
+                for crs, name in stations}
+
+    for index in range(service_count):
+        service, stops = make_service(index, stations, rng, service_date)
+        for crs, detail in stops:
+            payloads[crs]["services"].append({**service, "locationDetail": detail})
+
+    return list(payloads.items())
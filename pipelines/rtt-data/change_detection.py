@@ -0,0 +1,46 @@
+"""Detects which transformed train rows have changed since the previous run."""
+
+import logging
+
+from pandas import DataFrame
+from pandas.util import hash_pandas_object
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMNS = ["service_uid", "station_crs", "service_date"]
+
+# Kept at module level so the fingerprints survive warm Lambda invocations.
+_previous_fingerprints: dict[tuple, int] = {}
+
+
+def get_row_fingerprints(data: DataFrame) -> list[tuple[tuple, int]]:
+    """Returns a (key, hash) pair for every row, keyed by KEY_COLUMNS."""
+    keys = zip(*(data[column] for column in KEY_COLUMNS))
+    hashes = hash_pandas_object(data, index=False).tolist()
+    return list(zip(keys, hashes))
+
+
+def filter_changed_rows(data: DataFrame) -> tuple[DataFrame, dict[tuple, int]]:
+    """Returns the rows that are new or changed since the last remembered run.
+
+    The fingerprints of the current run are returned alongside, to be passed
+    to remember_fingerprints once the rows have been loaded."""
+    row_fingerprints = get_row_fingerprints(data)
+    changed_mask = [_previous_fingerprints.get(key) != fingerprint
+                    for key, fingerprint in row_fingerprints]
+    changed_data = data.loc[changed_mask]
+    logger.info("%d of %d rows have changed since the last run.",
+                len(changed_data), len(data))
+    return changed_data, dict(row_fingerprints)
+
+
+def remember_fingerprints(fingerprints: dict[tuple, int]) -> None:
+    """Replaces the stored fingerprints with those of a successfully loaded run."""
+    _previous_fingerprints.clear()
+    _previous_fingerprints.update(fingerprints)
+    logger.debug("Remembered %d row fingerprints.", len(fingerprints))
+
+
+def clear_fingerprints() -> None:
+    """Forgets all stored fingerprints so the next run loads every row."""
+    _previous_fingerprints.clear()
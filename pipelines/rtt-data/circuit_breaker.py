@@ -0,0 +1,85 @@
+"""Per-station circuit breaker for Realtime Trains API requests.
+
+A station's circuit opens after CIRCUIT_FAILURE_THRESHOLD consecutive failures
+and the station is skipped for CIRCUIT_COOLDOWN_SECONDS. After the cool-down the
+circuit is half-open: one probe request is let through, which closes the circuit
+if it succeeds and opens it for another cool-down if it fails."""
+
+import logging
+from os import environ as ENV
+from threading import Lock
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN_SECONDS = 300
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Kept at module level so open circuits survive warm Lambda invocations.
+_circuits: dict[str, dict] = {}
+_circuits_lock = Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a request is skipped because the station's circuit is open."""
+
+
+def get_circuit_state(crs: str) -> str:
+    """Returns whether the circuit for a station is closed, open or half-open."""
+    with _circuits_lock:
+        return _get_state(crs)
+
+
+def _get_state(crs: str) -> str:
+    """Returns the circuit state of a station; the caller must hold the lock."""
+    circuit = _circuits.get(crs)
+    if circuit is None or circuit["opened_at"] is None:
+        return CLOSED
+    cooldown = float(ENV.get("CIRCUIT_COOLDOWN_SECONDS", DEFAULT_COOLDOWN_SECONDS))
+    if monotonic() - circuit["opened_at"] < cooldown:
+        return OPEN
+    return HALF_OPEN
+
+
+def allow_request(crs: str) -> bool:
+    """Returns whether a request to a station may be made now.
+
+    In the half-open state only the first caller gets through: its probe
+    restarts the cool-down, so a probe that never reports back simply leaves
+    the circuit open until the next one."""
+    with _circuits_lock:
+        state = _get_state(crs)
+        if state == HALF_OPEN:
+            _circuits[crs]["opened_at"] = monotonic()
+            logger.info("Circuit for %s is half-open, sending a probe request.", crs)
+        return state != OPEN
+
+
+def record_success(crs: str) -> None:
+    """Closes the circuit for a station after a successful request."""
+    with _circuits_lock:
+        circuit = _circuits.pop(crs, None)
+    if circuit is not None and circuit["opened_at"] is not None:
+        logger.info("Circuit for %s closed.", crs)
+
+
+def record_failure(crs: str) -> None:
+    """Counts a failed request, opening the circuit at the failure threshold."""
+    threshold = int(ENV.get("CIRCUIT_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+    with _circuits_lock:
+        circuit = _circuits.setdefault(crs, {"failures": 0, "opened_at": None})
+        circuit["failures"] += 1
+        if circuit["failures"] >= threshold:
+            circuit["opened_at"] = monotonic()
+            logger.warning("Circuit for %s opened after %d consecutive failures.",
+                           crs, circuit["failures"])
+
+
+def reset_circuits() -> None:
+    """Closes every circuit."""
+    with _circuits_lock:
+        _circuits.clear()
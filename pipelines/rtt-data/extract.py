@@ -1,29 +1,135 @@
 """Extracts train data from the Realtime Trains API."""
 from os import environ as ENV
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+from random import uniform
+from time import monotonic, sleep
 import logging
 
 from dotenv import load_dotenv
 import requests
-from pandas import DataFrame, concat
+from requests.adapters import HTTPAdapter
+from pandas import DataFrame
+
+from archive import archive_responses
+from rate_limiter import acquire_token, get_wait_stats
+from circuit_breaker import (allow_request, record_success, record_failure,
+                             CircuitOpenError)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+DEFAULT_API_URL = "https://api.rtt.io/api/v1/json"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_REQUEST_TIMEOUT = 5
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.25
+DEFAULT_BACKOFF_CAP = 2.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the shared Realtime Trains API session, creating it on first use.
+
+    The session is kept at module level so its pooled keep-alive connections
+    are reused across warm Lambda invocations."""
+    global _session  # pylint: disable=global-statement
+    with _session_lock:
+        if _session is None:
+            pool_size = int(ENV.get("RTT_POOL_SIZE", DEFAULT_POOL_SIZE))
+            session = requests.Session()
+            session.auth = (ENV["API_USERNAME"], ENV["API_PASSWORD"])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            logger.info("Created API session with pool size %d.", pool_size)
+            _session = session
+        return _session
+
+
+def close_session() -> None:
+    """Closes the shared API session so the next request opens a new one."""
+    global _session  # pylint: disable=global-statement
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
 
-def fetch_station_json(crs: str) -> dict:
-    """Fetches JSON data from the Realtime Trains API for a given CRS code."""
+
+def get_backoff_delay(attempt: int) -> float:
+    """Returns a full-jitter backoff delay in seconds for a zero-based retry attempt."""
+    base = float(ENV.get("RTT_BACKOFF_BASE", DEFAULT_BACKOFF_BASE))
+    cap = float(ENV.get("RTT_BACKOFF_CAP", DEFAULT_BACKOFF_CAP))
+    return uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error: requests.exceptions.RequestException) -> bool:
+    """Returns whether a failed request is worth retrying."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and \
+            error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout))
+
+
+def fetch_station_json(crs: str, deadline: float | None = None) -> dict:
+    """Fetches JSON data from the Realtime Trains API for a given CRS code.
+
+    Connection errors, timeouts, 429s and 5xx responses are retried up to
+    RTT_MAX_RETRIES times with jittered backoff. Every attempt first takes a
+    rate limit token. No request is started or waited for past the monotonic
+    deadline, if one is given."""
     if not isinstance(crs, str):
         logger.error("Invalid CRS: %s. Expected a string.", crs)
         raise ValueError("The CRS must be a string.")
-    url = f"https://api.rtt.io/api/v1/json/search/{crs}"
+
+    url = f"{ENV.get('RTT_API_URL', DEFAULT_API_URL).rstrip('/')}/search/{crs}"
+    max_retries = int(ENV.get("RTT_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+    request_timeout = float(ENV.get("RTT_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+
+    attempt = 0
+    while True:
+        acquire_token(deadline)
+        timeout = request_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - monotonic())
+            if timeout <= 0:
+                raise TimeoutError(f"Run deadline reached before fetching {crs}.")
+        try:
+            response = get_session().get(url=url, timeout=timeout)
+            response.raise_for_status()
+            logger.info("Successfully connected to '%s'", url)
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            delay = get_backoff_delay(attempt)
+            out_of_time = deadline is not None and monotonic() + delay >= deadline
+            if attempt == max_retries or out_of_time or not is_retryable(e):
+                logger.exception("Request failed for CRS: %s.", crs)
+                raise
+            logger.warning("Request %d for %s failed (%s), retrying in %.2fs.",
+                           attempt + 1, crs, e, delay)
+            sleep(delay)
+            attempt += 1
+
+
+def fetch_station_json_with_breaker(crs: str, deadline: float | None = None) -> dict:
+    """Fetches a station's JSON through its circuit breaker.
+
+    Raises CircuitOpenError without making a request while the station's
+    circuit is open. Only failed requests count towards opening it; running
+    out of run time does not."""
+    if not allow_request(crs):
+        raise CircuitOpenError(f"Circuit open for {crs}, skipping request.")
     try:
-        response = requests.get(url=url, auth=(
-            ENV["API_USERNAME"], ENV["API_PASSWORD"]), timeout=5)
-        logger.info("Successfully connected to '%s'", url)
-        return response.json()
+        data = fetch_station_json(crs, deadline)
     except requests.exceptions.RequestException:
-        logger.exception("Request failed for CRS: %s.", crs)
+        record_failure(crs)
         raise
+    record_success(crs)
+    return data
 
 
 def get_station_name(response: dict) -> str | None:
@@ -46,69 +152,125 @@ def get_trains(response: dict) -> list[dict]:
     return services
 
 
-def extract_train_info(service: dict, name: str, crs: str) -> dict:
-    """Extracts key train information fields from a single service dictionary."""
-    logger.info("Extracting train info for services from %s", crs)
+SERVICE_COLUMNS = [
+    'service_uid', 'train_identity', 'station_name', 'station_crs',
+    'origin_name', 'destination_name', 'scheduled_arr_time', 'actual_arr_time',
+    'scheduled_dep_time', 'actual_dep_time', 'operator_name', 'service_date',
+    'platform', 'platform_changed', 'cancelled', 'cancel_reason', 'service_type'
+]
+
+
+def get_service_record(service: dict, name: str, crs: str) -> tuple:
+    """Returns the key train information fields of a service, ordered as SERVICE_COLUMNS."""
     location_detail = service.get("locationDetail", {})
     origin = location_detail.get("origin", [{}])[0]
     destination = location_detail.get("destination", [{}])[0]
 
-    service_info = {'service_uid': service.get('serviceUid'),
-                    'train_identity': service.get("trainIdentity"),
-                    'station_name': name,
-                    'station_crs': crs,
-                    'origin_name': origin.get("description"),
-                    'destination_name': destination.get("description"),
-                    'scheduled_arr_time': location_detail.get("gbttBookedArrival"),
-                    'actual_arr_time': location_detail.get("realtimeArrival"),
-                    'scheduled_dep_time': location_detail.get("gbttBookedDeparture"),
-                    'actual_dep_time': location_detail.get("realtimeDeparture"),
-                    'operator_name': service.get("atocName"),
-                    'service_date': service.get("runDate"),
-                    'platform': location_detail.get("platform"),
-                    'platform_changed': location_detail.get("platformChanged"),
-                    'cancelled': bool(location_detail.get('cancelReasonCode')),
-                    'cancel_reason': location_detail.get('cancelReasonLongText'),
-                    'service_type': service.get("serviceType")
-                    }
-
-    logger.info("Extracted train info for service '%s'",
-                service_info.get('service_uid'))
-    return service_info
-
-
-def make_train_info_list(train_list: list[dict] | None, name: str, crs: str) -> list[dict]:
-    """Processes a list of train services to extract structured information."""
+    return (service.get('serviceUid'),
+            service.get("trainIdentity"),
+            name,
+            crs,
+            origin.get("description"),
+            destination.get("description"),
+            location_detail.get("gbttBookedArrival"),
+            location_detail.get("realtimeArrival"),
+            location_detail.get("gbttBookedDeparture"),
+            location_detail.get("realtimeDeparture"),
+            service.get("atocName"),
+            service.get("runDate"),
+            location_detail.get("platform"),
+            location_detail.get("platformChanged"),
+            bool(location_detail.get('cancelReasonCode')),
+            location_detail.get('cancelReasonLongText'),
+            service.get("serviceType"))
+
+
+def append_train_info_columns(columns: dict[str, list], train_list: list[dict] | None,
+                              name: str, crs: str, log_rows: bool = False) -> int:
+    """Appends the fields of each service straight onto the per-column lists.
+
+    Returns the number of services appended. Per-service logging is only done
+    when log_rows is set, as it dominates extract time at busy stations."""
     if not train_list:
         logger.warning("No train data found for station: %s (%s)", name, crs)
-        return []
-    return [extract_train_info(train, name, crs) for train in train_list]
+        return 0
+    appenders = [columns[column].append for column in SERVICE_COLUMNS]
+    for service in train_list:
+        record = get_service_record(service, name, crs)
+        for append, value in zip(appenders, record):
+            append(value)
+        if log_rows:
+            logger.debug("Extracted train info for service '%s'", record[0])
+    return len(train_list)
+
+
+def build_service_dataframe(station_responses: list[tuple[str, dict]],
+                            log_rows: bool = False) -> DataFrame:
+    """Builds a single dataframe of services from (crs, API response) pairs."""
+    columns = {column: [] for column in SERVICE_COLUMNS}
+    for crs, response in station_responses:
+        count = append_train_info_columns(columns, get_trains(response),
+                                          get_station_name(response), crs, log_rows)
+        logger.info("Extracted %d services for %s.", count, crs)
+    return DataFrame(columns)
+
+
+def fetch_station_responses(station_list: list[str],
+                            max_workers: int = 1,
+                            deadline: float | None = None) -> tuple[list[tuple[str, dict]],
+                                                                    dict[str, Exception]]:
+    """Fetches the API response for each station, using up to max_workers concurrent requests.
+
+    Every request gives up at the monotonic deadline, if one is given. Returns
+    (crs, response) pairs in the same order as station_list, and a dict of
+    failed stations mapped to the exception raised for each."""
+    workers = max(1, min(max_workers, len(station_list)))
+    logger.debug("Fetching %d stations with %d worker(s).",
+                 len(station_list), workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch_station_json_with_breaker, crs, deadline)
+                   for crs in station_list]
 
+    responses = []
+    failures = {}
+    for crs, future in zip(station_list, futures):
+        error = future.exception()
+        if error is not None:
+            logger.error("Failed to fetch service data for %s: %s", crs, error)
+            failures[crs] = error
+        else:
+            responses.append((crs, future.result()))
+    return responses, failures
 
-def get_service_dataframe(crs: str) -> DataFrame:
-    """Retrieves, processes, and returns train data as a dataframe for a given station CRS."""
-    logger.debug("Retrieving service dataframe for services at %s.", crs)
-    data = fetch_station_json(crs)
-    trains = get_trains(data)
-    name = get_station_name(data)
-    trains_list = make_train_info_list(trains, name, crs)
-    df = DataFrame(trains_list)
-    logger.info("Created dataframe for %s with %d records.", crs, len(df))
-    return df
 
+def fetch_train_data(station_list: list[str], max_workers: int = 1,
+                     log_rows: bool = False, deadline: float | None = None) -> DataFrame:
+    """Returns a dataframe of services from the stations in a given list.
 
-def fetch_train_data(station_list: list[list]) -> DataFrame:
-    """Returns a dataframe of services from the stations in a given list."""
+    Stations that fail are logged and left out, so one bad station does not
+    cost the data of the others. Raises only if every station fails. The raw
+    responses are archived when ARCHIVE_LOCATION is set."""
     logger.debug("Fetching service data for stations: %s", station_list)
-    station_dfs = []
-    for station in station_list:
-        station_dfs.append(get_service_dataframe(station))
-    aggregated_df = concat(station_dfs, ignore_index=True)
-    logger.info("Fetched service data for %d stations.", len(station_list))
+    fetched_at = datetime.now(timezone.utc)
+    responses, failures = fetch_station_responses(
+        station_list, max_workers, deadline)
+    if ENV.get("ARCHIVE_LOCATION"):
+        archive_responses(ENV["ARCHIVE_LOCATION"], responses, fetched_at)
+    if failures and not responses:
+        raise RuntimeError(
+            f"Failed to fetch service data for stations: {', '.join(failures)}"
+        ) from next(iter(failures.values()))
+    if failures:
+        logger.warning("Continuing without stations: %s", ", ".join(failures))
+    aggregated_df = build_service_dataframe(responses, log_rows)
+    logger.info("Fetched service data for %d of %d stations.",
+                len(responses), len(station_list))
+    logger.info("Rate limiter wait metrics: %s", get_wait_stats())
     return aggregated_df
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     load_dotenv()
     stations = ['PAD', 'RDG', 'DID', 'SWI', 'CPM', 'BTH', 'BRI']
     result = fetch_train_data(stations)
@@ -1,46 +1,430 @@
 """Script for loading data into RDS."""
 
-from datetime import datetime, date
+from datetime import date
+from io import StringIO
 import logging
 from os import environ as ENV
+from time import monotonic
 
-from pandas import DataFrame
+import numpy as np
+from pandas import CategoricalDtype, DataFrame, Series, concat
 from dotenv import load_dotenv
-from psycopg2 import connect, DatabaseError
-from psycopg2.extensions import connection as Connection
+from psycopg2 import DatabaseError
+from psycopg2.extensions import connection as Connection, cursor as Cursor
 from psycopg2.extras import RealDictCursor
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_batch, execute_values
 
-from extract import fetch_train_data
-from transform import transform_train_data
-from alerts import send_notification
-
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
+from alerts import queue_notification, flush_notifications, discard_notifications
+from shared.database import get_connection as get_kept_connection
+from shared.delays import delay_minutes, seconds_to_times
+from shared.metrics import record_rows, stage
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_DIMENSION_CACHE_TTL = 900
+
+DIMENSION_QUERIES = {
+    "station": ("SELECT station_id, station_crs, station_name FROM station;",
+                ["station_id", "station_crs", "station_name"]),
+    "operator": ("SELECT operator_id, operator_name FROM operator;",
+                 ["operator_id", "operator_name"]),
+    "route": ("""SELECT route_id, origin_station_id, destination_station_id, operator_id
+                 FROM route;""",
+              ["route_id", "origin_station_id", "destination_station_id", "operator_id"])
+}
+
+# Kept at module level so the lookups survive warm Lambda invocations.
+_dimension_cache: dict[str, tuple[float, DataFrame]] = {}
+dimension_cache_stats = {"hits": 0, "misses": 0}
+# First days of the months whose train_stop partition is known to exist.
+_train_stop_partitions: set[date] = set()
+
+TIME_COLUMNS = [
+    "scheduled_arr_time", "actual_arr_time",
+    "scheduled_dep_time", "actual_dep_time"
+]
+
+TRAIN_STOP_COLUMNS = [
+    "train_service_id", "service_date", "station_id",
+    "scheduled_arr_time", "actual_arr_time",
+    "scheduled_dep_time", "actual_dep_time",
+    "platform", "platform_changed"
+]
+
 
 def get_connection() -> Connection:
-    """Return a database connection."""
-    logger.info("Establishing connection to database...")
-    try:
-        conn = connect(
-            dbname=ENV["DB_NAME"],
-            user=ENV["DB_USER"],
-            password=ENV["DB_PASSWORD"],
-            host=ENV["DB_HOST"],
-            port=ENV["DB_PORT"],
-            cursor_factory=RealDictCursor
+    """Returns the kept database connection, whose cursors return rows as dicts."""
+    return get_kept_connection(RealDictCursor)
+
+
+def fetch_dataframe(conn: Connection, query: str, params: tuple,
+                    columns: list[str]) -> DataFrame:
+    """Runs a query and returns its rows as a dataframe with the given columns."""
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    return DataFrame(rows, columns=columns)
+
+
+def append_rows(data: DataFrame, new_rows: DataFrame) -> DataFrame:
+    """Returns the dataframe with new rows appended below it."""
+    if data.empty:
+        return new_rows.reset_index(drop=True)
+    return concat([data, new_rows], ignore_index=True)
+
+
+def map_names_to_ids(names: Series, name_to_id: dict) -> Series:
+    """Maps a column of names to database IDs, NaN where a name is unknown.
+
+    Categorical columns are looked up once per category and the result is
+    spread back over the rows through the category codes."""
+    if not isinstance(names.dtype, CategoricalDtype):
+        return names.map(name_to_id)
+    category_ids = names.cat.categories.map(name_to_id).to_numpy(
+        dtype="float64", na_value=np.nan)
+    # Missing names have code -1, which picks out the trailing NaN.
+    category_ids = np.append(category_ids, np.nan)
+    return Series(category_ids[names.cat.codes.to_numpy()], index=names.index)
+
+
+def to_database_rows(data: DataFrame) -> list[tuple]:
+    """Returns dataframe rows as tuples psycopg2 can adapt.
+
+    Second-of-day columns become time objects and missing values become None."""
+    data = data.assign(**{col: seconds_to_times(data[col])
+                          for col in TIME_COLUMNS if col in data.columns})
+    data = data.astype(object).where(data.notna(), None)
+    return list(data.itertuples(index=False, name=None))
+
+
+def get_dimension(table: str, conn: Connection) -> DataFrame:
+    """Returns the rows of a station, operator or route table, cached between runs.
+
+    Cached rows are reused until DIMENSION_CACHE_TTL seconds have passed or the
+    table is invalidated after an insert."""
+    ttl = float(ENV.get("DIMENSION_CACHE_TTL", DEFAULT_DIMENSION_CACHE_TTL))
+    cached = _dimension_cache.get(table)
+    if cached is not None and monotonic() - cached[0] < ttl:
+        dimension_cache_stats["hits"] += 1
+        return cached[1]
+
+    dimension_cache_stats["misses"] += 1
+    query, columns = DIMENSION_QUERIES[table]
+    rows = fetch_dataframe(conn, query, (), columns)
+    _dimension_cache[table] = (monotonic(), rows)
+    logger.debug("Cached %d rows from the %s table.", len(rows), table)
+    return rows
+
+
+def add_to_dimension_cache(table: str, rows: list[dict]) -> None:
+    """Adds newly inserted rows, as returned by the database, to a cached table."""
+    cached = _dimension_cache.get(table)
+    if cached is None:
+        return
+    cached_at, cached_rows = cached
+    new_rows = DataFrame(rows, columns=cached_rows.columns)
+    _dimension_cache[table] = (cached_at, append_rows(cached_rows, new_rows))
+    logger.debug("Added %d new rows to the cached %s table.",
+                 len(new_rows), table)
+
+
+def update_dimension_cache(table: str, inserted_rows: list[dict], attempted: int) -> None:
+    """Adds inserted rows to a cached table, or drops the table if some inserts hit a conflict.
+
+    A conflict means another load inserted the row first, so its id is unknown here."""
+    if len(inserted_rows) < attempted:
+        logger.info("%d %s rows already existed; refreshing the cache.",
+                    attempted - len(inserted_rows), table)
+        invalidate_dimension_cache(table)
+    else:
+        add_to_dimension_cache(table, inserted_rows)
+
+
+def invalidate_dimension_cache(*tables: str) -> None:
+    """Drops the cached rows of the given tables, or of every table if none are given."""
+    for table in tables or list(_dimension_cache):
+        _dimension_cache.pop(table, None)
+
+
+def ensure_train_stop_partitions(service_dates, cur: Cursor) -> None:
+    """Creates the monthly train_stop partitions the given service dates need, if missing.
+
+    Months already seen by this process are skipped without a round trip."""
+    months = {service_date.replace(day=1) for service_date in service_dates}
+    missing = sorted(months - _train_stop_partitions)
+    if not missing:
+        return
+    cur.execute("SELECT ensure_train_stop_partition(month) FROM UNNEST(%s::date[]) AS month;",
+                (missing,))
+    _train_stop_partitions.update(missing)
+    logger.debug("Ensured train_stop partitions for %s.", missing)
+
+
+def invalidate_partition_cache() -> None:
+    """Forgets which train_stop partitions exist, e.g. after a rollback or a detach."""
+    _train_stop_partitions.clear()
+
+
+def fetch_batch_train_services(api_data: DataFrame, conn: Connection,
+                               lookups: dict | None = None) -> DataFrame:
+    """Returns the train_service rows matching the batch's (service_uid, service_date) keys.
+
+    When a lookups dict is shared between stages, the rows are only fetched
+    once per load and reused from it afterwards."""
+    if lookups is not None and "train_service" in lookups:
+        return lookups["train_service"]
+    batch_keys = api_data[["service_uid", "service_date"]].drop_duplicates()
+    train_services = fetch_dataframe(
+        conn,
+        """SELECT ts.train_service_id,
+                  ts.service_uid,
+                  ts.train_identity,
+                  ts.service_date,
+                  ts.route_id
+           FROM train_service AS ts
+           JOIN UNNEST(%s::text[], %s::date[]) AS batch (service_uid, service_date)
+               ON ts.service_uid = batch.service_uid
+              AND ts.service_date = batch.service_date;""",
+        (batch_keys["service_uid"].tolist(), batch_keys["service_date"].tolist()),
+        ["train_service_id", "service_uid", "train_identity",
+         "service_date", "route_id"]
+    )
+    if lookups is not None:
+        lookups["train_service"] = train_services
+    return train_services
+
+
+def fetch_batch_train_stops(train_service_ids: list[int], conn: Connection,
+                            service_dates: list[date] | None = None) -> DataFrame:
+    """Returns the train_stop rows belonging to the given train services.
+
+    Passing the services' dates limits the scan to their train_stop partitions."""
+    query = """SELECT train_stop_id,
+                      train_service_id,
+                      service_date,
+                      station_id,
+                      scheduled_dep_time,
+                      actual_dep_time
+               FROM train_stop
+               WHERE train_service_id = ANY(%s)"""
+    params = ([int(train_service_id) for train_service_id in train_service_ids],)
+    if service_dates is not None:
+        query += " AND service_date = ANY(%s::date[])"
+        params += (list(service_dates),)
+    return fetch_dataframe(
+        conn, query + ";", params,
+        ["train_stop_id", "train_service_id", "service_date", "station_id",
+         "scheduled_dep_time", "actual_dep_time"]
+    )
+
+
+def copy_into_temp_table(cur: Cursor, table: str, column_definitions: str,
+                         data: DataFrame) -> None:
+    """Creates a temporary table dropped at commit and streams the dataframe into it with COPY."""
+    cur.execute(f"""
+        DROP TABLE IF EXISTS {table};
+        CREATE TEMPORARY TABLE {table} ({column_definitions}) ON COMMIT DROP;
+    """)
+    buffer = StringIO()
+    data.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {table} FROM STDIN WITH (FORMAT csv, NULL '\\N');", buffer)
+    logger.debug("Copied %d rows into %s.", len(data), table)
+
+
+def merge_train_stops(train_stops: DataFrame, cur: Cursor) -> tuple[int, int]:
+    """Merges train stops into train_stop through a staging table in one statement.
+
+    Times are copied as seconds since midnight and cast to TIME in the merge.
+    Returns the number of inserted and updated rows. Partitioned tables cannot
+    return xmax, so the updated rows are counted as the stops that already existed."""
+    copy_into_temp_table(cur, "train_stop_staging", """
+        train_service_id INT,
+        service_date DATE,
+        station_id SMALLINT,
+        scheduled_arr_time INT,
+        actual_arr_time INT,
+        scheduled_dep_time INT,
+        actual_dep_time INT,
+        platform VARCHAR(3),
+        platform_changed BOOLEAN
+    """, train_stops[TRAIN_STOP_COLUMNS])
+    cur.execute("""
+        WITH existing AS (
+            SELECT COUNT(*) AS updated
+            FROM train_stop AS stop
+            WHERE EXISTS (
+                SELECT 1 FROM train_stop_staging AS staged
+                WHERE staged.train_service_id = stop.train_service_id
+                  AND staged.station_id = stop.station_id
+                  AND staged.service_date = stop.service_date
+            )
+        ), merged AS (
+            INSERT INTO train_stop (
+                train_service_id,
+                service_date,
+                station_id,
+                scheduled_arr_time,
+                actual_arr_time,
+                scheduled_dep_time,
+                actual_dep_time,
+                platform,
+                platform_changed
+            )
+            SELECT DISTINCT ON (train_service_id, station_id)
+                train_service_id,
+                service_date,
+                station_id,
+                (scheduled_arr_time * INTERVAL '1 second')::time,
+                (actual_arr_time * INTERVAL '1 second')::time,
+                (scheduled_dep_time * INTERVAL '1 second')::time,
+                (actual_dep_time * INTERVAL '1 second')::time,
+                platform,
+                platform_changed
+            FROM train_stop_staging
+            ORDER BY train_service_id, station_id
+            ON CONFLICT (train_service_id, station_id, service_date)
+            DO UPDATE SET
+                scheduled_arr_time = EXCLUDED.scheduled_arr_time,
+                actual_arr_time = EXCLUDED.actual_arr_time,
+                scheduled_dep_time = EXCLUDED.scheduled_dep_time,
+                actual_dep_time = EXCLUDED.actual_dep_time,
+                platform = EXCLUDED.platform,
+                platform_changed = EXCLUDED.platform_changed
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM merged) - existing.updated AS inserted,
+               existing.updated
+        FROM existing;
+    """)
+    counts = cur.fetchone()
+    return counts["inserted"], counts["updated"]
+
+
+def insert_new_routes(api_data: DataFrame, cur: Cursor) -> list[dict]:
+    """Inserts the batch's routes missing from route, computing the difference in Postgres.
+
+    Returns the inserted route rows."""
+    copy_into_temp_table(cur, "route_staging", """
+        origin_name VARCHAR(50),
+        destination_name VARCHAR(50),
+        operator_name VARCHAR(50)
+    """, api_data[["origin_name", "destination_name", "operator_name"]].drop_duplicates())
+    cur.execute("""
+        INSERT INTO route (origin_station_id, destination_station_id, operator_id)
+        SELECT DISTINCT origin.station_id, destination.station_id, operator.operator_id
+        FROM route_staging AS staging
+        JOIN station AS origin ON origin.station_name = staging.origin_name
+        JOIN station AS destination ON destination.station_name = staging.destination_name
+        JOIN operator ON operator.operator_name = staging.operator_name
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM route
+            WHERE route.origin_station_id = origin.station_id
+              AND route.destination_station_id = destination.station_id
+              AND route.operator_id = operator.operator_id
         )
-        logger.info("Successfully connected to database.")
-        return conn
+        ON CONFLICT (origin_station_id, destination_station_id, operator_id) DO NOTHING
+        RETURNING route_id, origin_station_id, destination_station_id, operator_id;
+    """)
+    return cur.fetchall()
+
+
+def insert_new_train_services(api_data: DataFrame, cur: Cursor) -> list[dict]:
+    """Inserts the batch's train services missing from train_service, computing the difference in Postgres.
+
+    Services whose route is not in the database are skipped. Returns the
+    inserted train_service rows."""
+    copy_into_temp_table(cur, "train_service_staging", """
+        service_uid VARCHAR(6),
+        train_identity VARCHAR(4),
+        service_date DATE,
+        origin_name VARCHAR(50),
+        destination_name VARCHAR(50),
+        operator_name VARCHAR(50)
+    """, api_data[["service_uid", "train_identity", "service_date",
+                   "origin_name", "destination_name", "operator_name"]].drop_duplicates())
+    cur.execute("""
+        INSERT INTO train_service (service_uid, train_identity, service_date, route_id)
+        SELECT DISTINCT ON (staging.service_uid, staging.service_date)
+            staging.service_uid,
+            staging.train_identity,
+            staging.service_date,
+            route.route_id
+        FROM train_service_staging AS staging
+        JOIN station AS origin ON origin.station_name = staging.origin_name
+        JOIN station AS destination ON destination.station_name = staging.destination_name
+        JOIN operator ON operator.operator_name = staging.operator_name
+        JOIN route ON route.origin_station_id = origin.station_id
+                  AND route.destination_station_id = destination.station_id
+                  AND route.operator_id = operator.operator_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM train_service AS ts
+            WHERE ts.service_uid = staging.service_uid
+              AND ts.service_date = staging.service_date
+        )
+        ORDER BY staging.service_uid, staging.service_date, route.route_id
+        ON CONFLICT (service_uid, service_date) DO NOTHING
+        RETURNING train_service_id, service_uid, train_identity, service_date, route_id;
+    """)
+    return cur.fetchall()
+
+
+def insert_new_cancellations(api_data: DataFrame, cur: Cursor) -> list[dict]:
+    """Upserts the batch's new or changed cancellations, computing the difference in Postgres.
+
+    Each cancellation is matched to the train stop of its service at its
+    station, and a stop's reason is replaced if it changes. Returns the
+    written (train_stop_id, reason) rows."""
+    cancelled = api_data[api_data["cancelled"].fillna(False).astype(bool)]
+    copy_into_temp_table(cur, "cancellation_staging", """
+        service_uid VARCHAR(6),
+        service_date DATE,
+        station_name VARCHAR(50),
+        reason VARCHAR(255)
+    """, cancelled[["service_uid", "service_date", "station_name",
+                    "cancel_reason"]].drop_duplicates())
+    cur.execute("""
+        INSERT INTO cancellation (train_stop_id, service_date, reason)
+        SELECT DISTINCT ON (stop.train_stop_id)
+            stop.train_stop_id, stop.service_date, staging.reason
+        FROM cancellation_staging AS staging
+        JOIN train_service AS ts ON ts.service_uid = staging.service_uid
+                                AND ts.service_date = staging.service_date
+        JOIN station ON station.station_name = staging.station_name
+        JOIN train_stop AS stop ON stop.train_service_id = ts.train_service_id
+                               AND stop.service_date = ts.service_date
+                               AND stop.station_id = station.station_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM cancellation
+            WHERE cancellation.train_stop_id = stop.train_stop_id
+              AND cancellation.reason IS NOT DISTINCT FROM staging.reason
+        )
+        ORDER BY stop.train_stop_id, staging.reason
+        ON CONFLICT (train_stop_id) DO UPDATE SET reason = EXCLUDED.reason
+        RETURNING train_stop_id, reason;
+    """)
+    return cur.fetchall()
+
+
+def run_server_side_insert(insert, api_data: DataFrame, conn: Connection,
+                           commit: bool, table: str) -> list[dict]:
+    """Runs one of the insert_new_* functions, committing or rolling back like the other stages."""
+    try:
+        with conn.cursor() as cur:
+            inserted = insert(api_data, cur)
+        if commit:
+            conn.commit()
     except DatabaseError as e:
-        logger.error("Failed to connect to database: %s", e)
+        conn.rollback()
+        logger.error("Database error: %s", e)
         raise
+    logger.info("Inserted %d new rows into %s.", len(inserted), table)
+    record_rows(len(inserted))
+    return inserted
 
 
 def find_new_routes(api_data_route: DataFrame,
@@ -53,12 +437,12 @@ def find_new_routes(api_data_route: DataFrame,
     operator_name_to_id = dict(zip(
         database_data_operators["operator_name"], database_data_operators["operator_id"]))
 
-    api_data_route["origin_station_id"] = api_data_route["origin_name"].map(
-        station_name_to_id)
-    api_data_route["destination_station_id"] = api_data_route["destination_name"].map(
-        station_name_to_id)
-    api_data_route["operator_id"] = api_data_route["operator_name"].map(
-        operator_name_to_id)
+    api_data_route["origin_station_id"] = map_names_to_ids(
+        api_data_route["origin_name"], station_name_to_id)
+    api_data_route["destination_station_id"] = map_names_to_ids(
+        api_data_route["destination_name"], station_name_to_id)
+    api_data_route["operator_id"] = map_names_to_ids(
+        api_data_route["operator_name"], operator_name_to_id)
 
     api_data_route.dropna(
         subset=["origin_station_id", "destination_station_id", "operator_id"], inplace=True)
@@ -96,12 +480,12 @@ def find_new_train_services(api_data_train_service,
     operator_name_to_id = dict(zip(
         database_data_operators["operator_name"], database_data_operators["operator_id"]))
 
-    api_data_train_service["origin_station_id"] = api_data_train_service["origin_name"].map(
-        station_name_to_id)
-    api_data_train_service["destination_station_id"] = api_data_train_service["destination_name"].map(
-        station_name_to_id)
-    api_data_train_service["operator_id"] = api_data_train_service["operator_name"].map(
-        operator_name_to_id)
+    api_data_train_service["origin_station_id"] = map_names_to_ids(
+        api_data_train_service["origin_name"], station_name_to_id)
+    api_data_train_service["destination_station_id"] = map_names_to_ids(
+        api_data_train_service["destination_name"], station_name_to_id)
+    api_data_train_service["operator_id"] = map_names_to_ids(
+        api_data_train_service["operator_name"], operator_name_to_id)
 
     api_data_train_service.dropna(
         subset=["origin_station_id", "destination_station_id", "operator_id"], inplace=True)
@@ -142,16 +526,18 @@ def find_new_train_services(api_data_train_service,
 def map_api_train_stop_data(api_data_train_stop: DataFrame,
                             database_data_train_services: DataFrame,
                             database_data_stations: DataFrame):
-    """Mapping train_service_id and station_id to API train stop data."""
-    service_uid_to_id = dict(zip(
-        database_data_train_services["service_uid"], database_data_train_services["train_service_id"]))
+    """Mapping train_service_id and station_id to API train stop data.
+
+    Services are matched on (service_uid, service_date), so a stop always
+    lands in the partition of its own service's date."""
     station_name_to_id = dict(
         zip(database_data_stations["station_name"], database_data_stations["station_id"]))
 
-    api_data_train_stop["train_service_id"] = api_data_train_stop["service_uid"].map(
-        service_uid_to_id)
-    api_data_train_stop["station_id"] = api_data_train_stop["station_name"].map(
-        station_name_to_id)
+    api_data_train_stop = api_data_train_stop.merge(
+        database_data_train_services[["service_uid", "service_date", "train_service_id"]],
+        on=["service_uid", "service_date"], how="left")
+    api_data_train_stop["station_id"] = map_names_to_ids(
+        api_data_train_stop["station_name"], station_name_to_id)
 
     api_data_train_stop.dropna(
         subset=["train_service_id", "station_id"], inplace=True)
@@ -165,7 +551,7 @@ def map_api_train_stop_data(api_data_train_stop: DataFrame,
         int)
 
     api_data_train_stop = api_data_train_stop[[
-        "train_service_id", "station_id",
+        "train_service_id", "service_date", "station_id",
         "scheduled_arr_time", "actual_arr_time",
         "scheduled_dep_time", "actual_dep_time",
         "platform", "platform_changed", "station_name",
@@ -175,54 +561,48 @@ def map_api_train_stop_data(api_data_train_stop: DataFrame,
     return api_data_train_stop
 
 
-def find_new_cancellations(api_data_cancellation,
-                           database_data_cancellation,
-                           database_data_train_services,
-                           database_data_train_stop):
-    """Finds new cancellations to add to db."""
-    service_uid_to_id = dict(zip(
-        database_data_train_services["service_uid"], database_data_train_services["train_service_id"]))
+def map_api_cancellation_data(api_data_cancellation,
+                              database_data_train_services,
+                              database_data_train_stop,
+                              database_data_stations) -> DataFrame:
+    """Maps the batch's cancellations to train_stop_id, one row per train stop.
 
-    api_data_cancellation["train_service_id"] = api_data_cancellation["service_uid"].map(
-        service_uid_to_id)
+    Each cancellation is matched to the stop of its service, on
+    (service_uid, service_date), at its station, as insert_new_cancellations
+    does in Postgres. If a stop has more than one reason, the first in sort
+    order is kept, matching its DISTINCT ON."""
+    station_name_to_id = dict(
+        zip(database_data_stations["station_name"], database_data_stations["station_id"]))
 
-    api_data_cancellation.dropna(
-        subset=["train_service_id"], inplace=True)
+    api_data_cancellation = api_data_cancellation.merge(
+        database_data_train_services[["service_uid", "service_date", "train_service_id"]],
+        on=["service_uid", "service_date"], how="inner")
+    api_data_cancellation["station_id"] = map_names_to_ids(
+        api_data_cancellation["station_name"], station_name_to_id)
+    api_data_cancellation = api_data_cancellation.dropna(subset=["station_id"]).astype(
+        {"station_id": int})
 
     api_data_cancellation = api_data_cancellation.merge(
         database_data_train_stop,
-        on="train_service_id",
+        on=["train_service_id", "service_date", "station_id"],
         how="inner"
     )
 
-    api_data_cancellation.drop(
-        columns=["service_uid", "station_name",
-                 "origin_name", "destination_name",
-                 "cancelled", "train_service_id", "station_id"], inplace=True)
-
     api_data_cancellation = api_data_cancellation[[
-        "train_stop_id", "cancel_reason"]]
-    api_data_cancellation.rename(
-        columns={"cancel_reason": "reason"}, inplace=True)
-
-    database_data_cancellation = set(
-        database_data_cancellation.itertuples(index=False, name=None))
-    api_data_cancellation = set(
-        api_data_cancellation.itertuples(index=False, name=None))
-    new_cancellation = api_data_cancellation - database_data_cancellation
+        "train_stop_id", "service_date", "cancel_reason"]]
+    api_data_cancellation = api_data_cancellation.rename(
+        columns={"cancel_reason": "reason"})
 
-    return new_cancellation
+    return api_data_cancellation.sort_values(["train_stop_id", "reason"]).drop_duplicates(
+        subset="train_stop_id", keep="first")
 
 
-def update_station(api_data: DataFrame, conn: Connection):
+def update_station(api_data: DataFrame, conn: Connection, commit: bool = True):
     """Updates database's station table."""
     api_data_stations = api_data[[
         "station_crs", "station_name"]].drop_duplicates()
 
-    with conn.cursor() as cur:
-        cur.execute("SELECT station_crs, station_name FROM station;")
-        rows = cur.fetchall()
-        database_data_stations = DataFrame(rows)
+    database_data_stations = get_dimension("station", conn)
 
     new_stations = api_data_stations[~api_data_stations["station_crs"].isin(
         database_data_stations["station_crs"])]
@@ -230,18 +610,24 @@ def update_station(api_data: DataFrame, conn: Connection):
     if not new_stations.empty:
         logger.info("Updating station table with %s new stations.",
                     len(new_stations))
+        record_rows(len(new_stations))
         new_station_tuples = list(
             new_stations.itertuples(index=False, name=None))
         try:
             with conn.cursor() as cur:
-                execute_batch(
+                inserted_stations = execute_values(
                     cur,
                     """
-                    INSERT INTO station (station_crs, station_name) VALUES (%s, %s);
+                    INSERT INTO station (station_crs, station_name) VALUES %s
+                    ON CONFLICT (station_crs) DO NOTHING
+                    RETURNING station_id, station_crs, station_name;
                     """,
-                    new_station_tuples
+                    new_station_tuples,
+                    fetch=True
                 )
-            conn.commit()
+            if commit:
+                conn.commit()
+            update_dimension_cache("station", inserted_stations, len(new_station_tuples))
             logger.info("Station table has been updated.")
         except DatabaseError as e:
             conn.rollback()
@@ -252,15 +638,12 @@ def update_station(api_data: DataFrame, conn: Connection):
         logger.info("No new stations to add.")
 
 
-def update_operator(api_data: DataFrame, conn: Connection):
+def update_operator(api_data: DataFrame, conn: Connection, commit: bool = True):
     """Updates database's operator table."""
     api_data_operators = api_data[[
         "operator_name"]].drop_duplicates()
 
-    with conn.cursor() as cur:
-        cur.execute("SELECT operator_name FROM operator;")
-        rows = cur.fetchall()
-        database_data_operators = DataFrame(rows)
+    database_data_operators = get_dimension("operator", conn)
 
     new_operators = api_data_operators[~api_data_operators["operator_name"].isin(
         database_data_operators["operator_name"])]
@@ -268,18 +651,24 @@ def update_operator(api_data: DataFrame, conn: Connection):
     if not new_operators.empty:
         logger.info("Updating operator table with %s new operators.",
                     len(new_operators))
+        record_rows(len(new_operators))
         new_operator_tuples = list(
             new_operators.itertuples(index=False, name=None))
         try:
             with conn.cursor() as cur:
-                execute_batch(
+                inserted_operators = execute_values(
                     cur,
                     """
-                    INSERT INTO operator (operator_name) VALUES (%s);
+                    INSERT INTO operator (operator_name) VALUES %s
+                    ON CONFLICT (operator_name) DO NOTHING
+                    RETURNING operator_id, operator_name;
                     """,
-                    new_operator_tuples
+                    new_operator_tuples,
+                    fetch=True
                 )
-            conn.commit()
+            if commit:
+                conn.commit()
+            update_dimension_cache("operator", inserted_operators, len(new_operator_tuples))
             logger.info("Operator table has been updated.")
         except DatabaseError as e:
             conn.rollback()
@@ -290,25 +679,24 @@ def update_operator(api_data: DataFrame, conn: Connection):
         logger.info("No new operators to add.")
 
 
-def update_route(api_data: DataFrame, conn: Connection):
-    """Updates database's route table."""
-    api_data_route = api_data[[
-        "origin_name", "destination_name", "operator_name"]].drop_duplicates()
+def update_route(api_data: DataFrame, conn: Connection, commit: bool = True,
+                 server_side: bool = False):
+    """Updates database's route table.
 
-    with conn.cursor() as cur:
-        cur.execute(
-            "SELECT origin_station_id, destination_station_id, operator_id FROM route;")
-        rows = cur.fetchall()
-        database_data_route = DataFrame(rows)
+    With server_side the new routes are found by Postgres rather than by
+    comparing against the cached route table."""
+    if server_side:
+        add_to_dimension_cache("route", run_server_side_insert(
+            insert_new_routes, api_data, conn, commit, "route"))
+        return
 
-        cur.execute(
-            "SELECT station_id, station_crs, station_name FROM station;")
-        rows = cur.fetchall()
-        database_data_stations = DataFrame(rows)
+    api_data_route = api_data[[
+        "origin_name", "destination_name", "operator_name"]].drop_duplicates()
 
-        cur.execute("SELECT operator_id, operator_name FROM operator;")
-        rows = cur.fetchall()
-        database_data_operators = DataFrame(rows)
+    database_data_route = get_dimension("route", conn)[[
+        "origin_station_id", "destination_station_id", "operator_id"]]
+    database_data_stations = get_dimension("station", conn)
+    database_data_operators = get_dimension("operator", conn)
 
     new_routes = find_new_routes(
         api_data_route, database_data_route, database_data_stations, database_data_operators)
@@ -316,20 +704,28 @@ def update_route(api_data: DataFrame, conn: Connection):
     if new_routes:
         logger.info("Updating route table with %s new routes.",
                     len(new_routes))
+        record_rows(len(new_routes))
         new_route_tuples = list(new_routes)
         try:
             with conn.cursor() as cur:
-                execute_batch(
+                inserted_routes = execute_values(
                     cur,
                     """
                     INSERT INTO route (origin_station_id,
                                        destination_station_id,
-                                       operator_id) 
-                    VALUES (%s, %s, %s);
+                                       operator_id)
+                    VALUES %s
+                    ON CONFLICT (origin_station_id, destination_station_id, operator_id)
+                    DO NOTHING
+                    RETURNING route_id, origin_station_id,
+                              destination_station_id, operator_id;
                     """,
-                    new_route_tuples
+                    new_route_tuples,
+                    fetch=True
                 )
-            conn.commit()
+            if commit:
+                conn.commit()
+            update_dimension_cache("route", inserted_routes, len(new_route_tuples))
             logger.info("Route table has been updated.")
         except DatabaseError as e:
             conn.rollback()
@@ -340,37 +736,30 @@ def update_route(api_data: DataFrame, conn: Connection):
         logger.info("No new routes to add.")
 
 
-def update_train_service(api_data: DataFrame, conn: Connection):
-    """Updates database's train_service table."""
+def update_train_service(api_data: DataFrame, conn: Connection, commit: bool = True,
+                         lookups: dict | None = None, server_side: bool = False):
+    """Updates database's train_service table.
+
+    With server_side the new services are found by Postgres, and the batch's
+    services are left for the next stage to fetch once they all exist."""
+    if server_side:
+        run_server_side_insert(insert_new_train_services, api_data, conn, commit,
+                               "train_service")
+        if lookups is not None:
+            lookups.pop("train_service", None)
+        return
+
     api_data_train_service = api_data[[
         "service_uid", "train_identity",  "service_date",
         "origin_name", "destination_name", "operator_name"
     ]].drop_duplicates()
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """SELECT service_uid,
-                      train_identity,
-                      service_date,
-                      route_id
-               FROM train_service;"""
-        )
-        rows = cur.fetchall()
-        database_data_train_service = DataFrame(rows)
-
-        cur.execute(
-            "SELECT station_id, station_crs, station_name FROM station;")
-        rows = cur.fetchall()
-        database_data_stations = DataFrame(rows)
-
-        cur.execute("SELECT operator_id, operator_name FROM operator;")
-        rows = cur.fetchall()
-        database_data_operators = DataFrame(rows)
+    database_data_train_service = fetch_batch_train_services(
+        api_data, conn, lookups)
 
-        cur.execute(
-            "SELECT route_id, origin_station_id, destination_station_id, operator_id FROM route;")
-        rows = cur.fetchall()
-        database_data_routes = DataFrame(rows)
+    database_data_stations = get_dimension("station", conn)
+    database_data_operators = get_dimension("operator", conn)
+    database_data_routes = get_dimension("route", conn)
 
     new_train_service = find_new_train_services(api_data_train_service,
                                                 database_data_train_service,
@@ -383,20 +772,35 @@ def update_train_service(api_data: DataFrame, conn: Connection):
             new_train_service.itertuples(index=False, name=None))
         logger.info("Updating train_service table with %s new train services.",
                     len(new_train_service_tuples))
+        record_rows(len(new_train_service_tuples))
         try:
             with conn.cursor() as cur:
-                execute_batch(
+                inserted_train_services = execute_values(
                     cur,
                     """
                     INSERT INTO train_service (service_uid,
                                        train_identity,
                                        service_date,
-                                       route_id) 
-                    VALUES (%s, %s, %s, %s);
+                                       route_id)
+                    VALUES %s
+                    ON CONFLICT (service_uid, service_date) DO NOTHING
+                    RETURNING train_service_id, service_uid, train_identity,
+                              service_date, route_id;
                     """,
-                    new_train_service_tuples
+                    new_train_service_tuples,
+                    fetch=True
                 )
-            conn.commit()
+            if commit:
+                conn.commit()
+            if len(inserted_train_services) < len(new_train_service_tuples):
+                # Another load inserted some of them, so refetch rather than guess.
+                if lookups is not None:
+                    lookups.pop("train_service", None)
+            elif lookups is not None:
+                lookups["train_service"] = append_rows(
+                    database_data_train_service,
+                    DataFrame(inserted_train_services,
+                              columns=database_data_train_service.columns))
             logger.info("Train service table has been updated.")
         except DatabaseError as e:
             conn.rollback()
@@ -406,31 +810,30 @@ def update_train_service(api_data: DataFrame, conn: Connection):
         logger.info("No new train services to add.")
 
 
-def update_train_stop(api_data: DataFrame, conn: Connection):
-    """Updates database's train_stop table."""
+def update_train_stop(api_data: DataFrame, conn: Connection,
+                      bulk_copy: bool = True, commit: bool = True,
+                      lookups: dict | None = None,
+                      notify: bool = True) -> tuple[int | None, int | None]:
+    """Updates database's train_stop table.
+
+    With bulk_copy the batch is merged through a COPY-loaded staging table and
+    the (inserted, updated) row counts are returned; otherwise rows are upserted
+    with execute_batch and the counts are None. When notify is set, delay
+    alerts are queued, to be sent by load_data_into_database once the load
+    has committed."""
     api_data_train_stop = api_data[[
-        "service_uid", "station_name", "scheduled_arr_time",
+        "service_uid", "service_date", "station_name", "scheduled_arr_time",
         "actual_arr_time", "scheduled_dep_time", "actual_dep_time",
         "platform", "platform_changed", "origin_name", "destination_name"
     ]].drop_duplicates()
 
-    with conn.cursor() as cur:
-        cur.execute("""SELECT 
-                        train_service_id,
-                        station_id,
-                        scheduled_dep_time,
-                        actual_dep_time
-                    FROM train_stop;""")
-        rows = cur.fetchall()
-        database_data_train_stop_departures = DataFrame(rows)
-
-        cur.execute("SELECT train_service_id, service_uid FROM train_service;")
-        rows = cur.fetchall()
-        database_data_train_services = DataFrame(rows)
-
-        cur.execute("SELECT station_id, station_name FROM station;")
-        rows = cur.fetchall()
-        database_data_stations = DataFrame(rows)
+    database_data_train_services = fetch_batch_train_services(
+        api_data, conn, lookups)
+    database_data_train_stop_departures = fetch_batch_train_stops(
+        database_data_train_services["train_service_id"], conn,
+        database_data_train_services["service_date"].unique()).drop(
+            columns=["train_stop_id"])
+    database_data_stations = get_dimension("station", conn)
 
     api_data_train_stop = map_api_train_stop_data(api_data_train_stop,
                                                   database_data_train_services,
@@ -438,25 +841,17 @@ def update_train_stop(api_data: DataFrame, conn: Connection):
 
     intersecting_data = api_data_train_stop.merge(
         database_data_train_stop_departures,
-        on=["train_service_id", "station_id"],
+        on=["train_service_id", "service_date", "station_id"],
         suffixes=("_api", "_db")
     )
 
-    intersecting_data["delay_new"] = intersecting_data.apply(
-        lambda row: (
-            datetime.combine(date.today(), row["actual_dep_time_api"]) -
-            datetime.combine(date.today(), row["scheduled_dep_time_api"])
-        ).total_seconds() // 60,
-        axis=1
-    )
+    intersecting_data["delay_new"] = delay_minutes(
+        intersecting_data["scheduled_dep_time_api"],
+        intersecting_data["actual_dep_time_api"])
 
-    intersecting_data["delay_old"] = intersecting_data.apply(
-        lambda row: (
-            datetime.combine(date.today(), row["actual_dep_time_db"]) -
-            datetime.combine(date.today(), row["scheduled_dep_time_db"])
-        ).total_seconds() // 60,
-        axis=1
-    )
+    intersecting_data["delay_old"] = delay_minutes(
+        intersecting_data["scheduled_dep_time_db"],
+        intersecting_data["actual_dep_time_db"])
 
     new_delays = intersecting_data[
         (intersecting_data["delay_new"] > 0) & (
@@ -465,8 +860,14 @@ def update_train_stop(api_data: DataFrame, conn: Connection):
         )
     ]
 
-    if not new_delays.empty:
-        send_notification(new_delays)
+    if not notify:
+        logger.info("Skipping notifications for %d delays.", len(new_delays))
+    elif not new_delays.empty:
+        with stage("alerts"):
+            queue_notification(new_delays.assign(
+                scheduled_dep_time_api=seconds_to_times(new_delays["scheduled_dep_time_api"]),
+                actual_dep_time_api=seconds_to_times(new_delays["actual_dep_time_api"])))
+            record_rows(len(new_delays))
     else:
         logger.info("No new or increased delays to notify.")
 
@@ -475,106 +876,173 @@ def update_train_stop(api_data: DataFrame, conn: Connection):
 
     try:
         with conn.cursor() as cur:
-            execute_batch(cur, """
-                INSERT INTO train_stop (
-                    train_service_id,
-                    station_id,
-                    scheduled_arr_time,
-                    actual_arr_time,
-                    scheduled_dep_time,
-                    actual_dep_time,
-                    platform,
-                    platform_changed
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (train_service_id, station_id)
-                DO UPDATE SET
-                    scheduled_arr_time = EXCLUDED.scheduled_arr_time,
-                    actual_arr_time = EXCLUDED.actual_arr_time,
-                    scheduled_dep_time = EXCLUDED.scheduled_dep_time,
-                    actual_dep_time = EXCLUDED.actual_dep_time,
-                    platform = EXCLUDED.platform,
-                    platform_changed = EXCLUDED.platform_changed;
-            """, list(api_data_train_stop.itertuples(index=False, name=None)))
-
-        conn.commit()
-        logger.info("Upserted %d rows in train_stop.",
-                    len(api_data_train_stop))
+            ensure_train_stop_partitions(api_data_train_stop["service_date"].unique(), cur)
+            if bulk_copy:
+                inserted, updated = merge_train_stops(api_data_train_stop, cur)
+            else:
+                execute_batch(cur, """
+                    INSERT INTO train_stop (
+                        train_service_id,
+                        service_date,
+                        station_id,
+                        scheduled_arr_time,
+                        actual_arr_time,
+                        scheduled_dep_time,
+                        actual_dep_time,
+                        platform,
+                        platform_changed
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (train_service_id, station_id, service_date)
+                    DO UPDATE SET
+                        scheduled_arr_time = EXCLUDED.scheduled_arr_time,
+                        actual_arr_time = EXCLUDED.actual_arr_time,
+                        scheduled_dep_time = EXCLUDED.scheduled_dep_time,
+                        actual_dep_time = EXCLUDED.actual_dep_time,
+                        platform = EXCLUDED.platform,
+                        platform_changed = EXCLUDED.platform_changed;
+                """, to_database_rows(api_data_train_stop[TRAIN_STOP_COLUMNS]))
+                inserted, updated = None, None
+
+        if commit:
+            conn.commit()
+        logger.info("Upserted %d rows in train_stop (%s inserted, %s updated).",
+                    len(api_data_train_stop), inserted, updated)
+        record_rows(len(api_data_train_stop))
+        return inserted, updated
     except DatabaseError as e:
         conn.rollback()
+        invalidate_partition_cache()
         logger.error("Database error during train_stop update: %s", e)
         raise
 
 
-def update_cancellation(api_data: DataFrame, conn: Connection):
-    """Updates database's cancellation table."""
-    api_data_cancellation = api_data[[
-        "service_uid", "station_name", "origin_name", "destination_name", "cancelled", "cancel_reason"
-    ]].drop_duplicates()
+def update_cancellation(api_data: DataFrame, conn: Connection, commit: bool = True,
+                        lookups: dict | None = None, server_side: bool = False):
+    """Updates database's cancellation table.
 
-    api_data_cancellation = api_data_cancellation[api_data_cancellation["cancelled"] == True]
+    Each cancellation is matched to the stop of its service at its station,
+    and upserted on train_stop_id, replacing the stop's reason if it changes,
+    so existing cancellations need not be read first. With server_side
+    Postgres finds the same rows."""
+    if server_side:
+        run_server_side_insert(insert_new_cancellations, api_data, conn, commit,
+                               "cancellation")
+        return
 
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT train_stop_id,
-                   reason
-            FROM cancellation;
-        """)
-        rows = cur.fetchall()
-        database_data_cancellation = DataFrame(rows)
+    api_data_cancellation = api_data[[
+        "service_uid", "service_date", "station_name", "origin_name", "destination_name",
+        "cancelled", "cancel_reason"
+    ]].drop_duplicates()
 
-        cur.execute("SELECT train_service_id, service_uid FROM train_service;")
-        rows = cur.fetchall()
-        database_data_train_services = DataFrame(rows)
+    api_data_cancellation = api_data_cancellation[
+        api_data_cancellation["cancelled"].fillna(False).astype(bool)]
 
-        cur.execute("""
-            SELECT train_stop_id, train_service_id, station_id
-            FROM train_stop;
-        """)
-        rows = cur.fetchall()
-        database_data_train_stop = DataFrame(rows)
+    database_data_train_services = fetch_batch_train_services(
+        api_data_cancellation, conn, lookups)
+    database_data_train_stop = fetch_batch_train_stops(
+        database_data_train_services["train_service_id"], conn,
+        database_data_train_services["service_date"].unique())[[
+            "train_stop_id", "train_service_id", "service_date", "station_id"]]
+    database_data_stations = get_dimension("station", conn)
 
-    new_cancellation = find_new_cancellations(api_data_cancellation,
-                                              database_data_cancellation,
+    cancellations = map_api_cancellation_data(api_data_cancellation,
                                               database_data_train_services,
-                                              database_data_train_stop)
+                                              database_data_train_stop,
+                                              database_data_stations)
 
-    if new_cancellation:
-        new_cancellation_tuples = list(new_cancellation)
-        logger.info("Updating cancellation table with %s new cancellations.",
-                    len(new_cancellation_tuples))
+    if not cancellations.empty:
+        cancellation_tuples = list(cancellations.itertuples(index=False, name=None))
         try:
             with conn.cursor() as cur:
-                execute_batch(
+                written = execute_values(
                     cur,
                     """
-                    INSERT INTO cancellation (train_stop_id, reason) 
-                    VALUES (%s, %s);
+                    INSERT INTO cancellation (train_stop_id, service_date, reason) VALUES %s
+                    ON CONFLICT (train_stop_id) DO UPDATE SET reason = EXCLUDED.reason
+                    WHERE cancellation.reason IS DISTINCT FROM EXCLUDED.reason
+                    RETURNING train_stop_id;
                     """,
-                    new_cancellation_tuples
+                    cancellation_tuples,
+                    fetch=True
                 )
-            conn.commit()
-            logger.info("Cancellation table has been updated.")
+            if commit:
+                conn.commit()
+            logger.info("Cancellation table has %s new or changed cancellations.",
+                        len(written))
+            record_rows(len(written))
         except DatabaseError as e:
             conn.rollback()
             logger.error("Database error: %s", e)
             raise
     else:
-        logger.info("No new cancellations to add.")
+        logger.info("No cancellations to add.")
 
 
 def load_data_into_database(api_data: DataFrame,
-                            conn: Connection) -> None:
-    """Load data into the database. """
-    update_station(api_data, conn)
-    update_operator(api_data, conn)
-    update_route(api_data, conn)
-    update_train_service(api_data, conn)
-    update_train_stop(api_data, conn)
-    update_cancellation(api_data, conn)
+                            conn: Connection,
+                            single_transaction: bool = True,
+                            notify: bool = True,
+                            server_side: bool | None = None) -> None:
+    """Load data into the database.
+
+    With single_transaction every stage runs in one transaction that is
+    committed once at the end, sharing its lookups between stages, so a
+    failure leaves nothing behind. Otherwise each stage commits on its own.
+    Delay alerts are published in the background once the train stops are
+    committed, and dropped if the load fails first.
+    notify=False loads without sending delay alerts, e.g. when replaying.
+    server_side, which defaults to the SERVER_SIDE_DIFF setting, has Postgres
+    work out the new routes, train services and cancellations."""
+    if server_side is None:
+        server_side = ENV.get("SERVER_SIDE_DIFF", "false").lower() == "true"
+    commit_each_stage = not single_transaction
+    lookups = {}
+    try:
+        with stage("update_station"):
+            update_station(api_data, conn, commit_each_stage)
+        with stage("update_operator"):
+            update_operator(api_data, conn, commit_each_stage)
+        with stage("update_route"):
+            update_route(api_data, conn, commit_each_stage, server_side=server_side)
+        with stage("update_train_service"):
+            update_train_service(api_data, conn, commit_each_stage, lookups,
+                                 server_side=server_side)
+        with stage("update_train_stop"):
+            update_train_stop(api_data, conn, commit=commit_each_stage, lookups=lookups,
+                              notify=notify)
+        if commit_each_stage:
+            flush_notifications()
+        with stage("update_cancellation"):
+            update_cancellation(api_data, conn, commit_each_stage, lookups,
+                                server_side=server_side)
+        if single_transaction:
+            with stage("commit"):
+                conn.commit()
+            logger.info("Committed load of %d rows.", len(api_data))
+            flush_notifications()
+    except Exception:
+        discard_notifications()
+        if single_transaction:
+            conn.rollback()
+            invalidate_dimension_cache()
+            invalidate_partition_cache()
+            logger.error("Load rolled back.")
+        raise
+    logger.info("Dimension cache hits: %d, misses: %d.",
+                dimension_cache_stats["hits"], dimension_cache_stats["misses"])
 
 
 if __name__ == "__main__":
+    # pylint: disable=import-outside-toplevel
+    from extract import fetch_train_data
+    from transform import transform_train_data
+
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
     with get_connection() as db_connection:
         logger.info("Connection established.")
@@ -1,34 +1,97 @@
 """Main file that contains the ETL and lambda handler."""
 
 import logging
+from datetime import datetime
 from os import environ as ENV
+from sys import argv
+from time import monotonic
 
 from dotenv import load_dotenv
 
-from extract import fetch_train_data
+from extract import fetch_train_data, build_service_dataframe
+from archive import iter_archived_runs
+from shared.metrics import stage, record_rows, reset_metrics, emit_metrics, configure_metrics
 from transform import transform_train_data
 from load import get_connection, load_data_into_database
-from alerts import send_notification
+from alerts import wait_for_notifications
+from change_detection import filter_changed_rows, remember_fingerprints
 
 logger = logging.getLogger()
 logger.setLevel("DEBUG")
+configure_metrics("rtt")
 
+DEFAULT_LOAD_RESERVE_MS = 60000
 
-def run(stations: list[str]) -> None:
+
+def get_fetch_deadline(context) -> float | None:
+    """Returns the monotonic time by which fetching must finish, or None outside Lambda.
+
+    LOAD_RESERVE_MS of the remaining invocation time is kept back for the
+    transform and load."""
+    if context is None:
+        return None
+    reserve_ms = int(ENV.get("LOAD_RESERVE_MS", DEFAULT_LOAD_RESERVE_MS))
+    budget_ms = context.get_remaining_time_in_millis() - reserve_ms
+    logger.info("Fetch budget is %d ms.", budget_ms)
+    return monotonic() + budget_ms / 1000
+
+
+def run(stations: list[str], deadline: float | None = None) -> None:
     """Run ETL."""
     with get_connection() as db_connection:
-        fetched_data = fetch_train_data(stations)
-        transformed_fetched_data = transform_train_data(fetched_data)
-        load_data_into_database(transformed_fetched_data, db_connection)
+        with stage("extract"):
+            fetched_data = fetch_train_data(
+                stations, int(ENV.get("FETCH_WORKERS", 1)),
+                ENV.get("LOG_SERVICE_ROWS", "false").lower() == "true", deadline)
+            record_rows(len(fetched_data))
+        with stage("transform"):
+            transformed_fetched_data = transform_train_data(fetched_data)
+            record_rows(len(transformed_fetched_data))
+        if ENV.get("DELTA_LOAD", "true").lower() == "true":
+            changed_data, fingerprints = filter_changed_rows(
+                transformed_fetched_data)
+        else:
+            changed_data, fingerprints = transformed_fetched_data, None
+
+        if changed_data.empty:
+            logger.info("No changed rows to load.")
+        else:
+            with stage("load"):
+                load_data_into_database(changed_data, db_connection)
+                record_rows(len(changed_data))
+        if fingerprints is not None:
+            remember_fingerprints(fingerprints)
+
+
+def replay(location: str, start: datetime | None = None,
+           end: datetime | None = None) -> int:
+    """Replays archived API responses through transform and load as fast as possible.
+
+    Each fetch minute in the archive is loaded as one run, oldest first,
+    without sending delay alerts. Returns the number of runs replayed."""
+    replayed = 0
+    with get_connection() as db_connection:
+        for minute, station_responses in iter_archived_runs(location, start, end):
+            logger.info("Replaying %d responses fetched at %s.",
+                        len(station_responses), minute)
+            transformed_data = transform_train_data(
+                build_service_dataframe(station_responses))
+            if not transformed_data.empty:
+                load_data_into_database(transformed_data, db_connection,
+                                        notify=False)
+            replayed += 1
+    logger.info("Replayed %d runs from %s.", replayed, location)
+    return replayed
 
 
 def lambda_handler(event=None, context=None) -> dict:
     """AWS Lambda handler that runs the ETL pipeline."""
     load_dotenv()
     stations = ENV["STATIONS"].split(",")
+    reset_metrics()
     try:
         logger.info("Lambda triggered, running ETL.")
-        run(stations)
+        run(stations, get_fetch_deadline(context))
         return {
             "statusCode": 200,
             "body": "ETL completed."
@@ -39,8 +102,21 @@ def lambda_handler(event=None, context=None) -> dict:
             "statusCode": 500,
             "body": f"ETL failed: {str(e)}"
         }
+    finally:
+        with stage("alerts_publish"):
+            wait_for_notifications()
+        emit_metrics()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
-    run(ENV["STATIONS"].split(","))
+    if len(argv) == 3 and argv[1] == "replay":
+        replay(argv[2])
+    else:
+        run(ENV["STATIONS"].split(","))
+        wait_for_notifications()
@@ -0,0 +1,89 @@
+"""Client-side token bucket keeping Realtime Trains API requests within quota.
+
+The bucket refills at RTT_RATE_LIMIT tokens per second up to RTT_RATE_BURST.
+Callers reserve a token under a lock and then wait outside it, so the bucket
+can be shared by threads and coroutines alike and waiters are served in the
+order they reserved."""
+
+import logging
+from os import environ as ENV
+from threading import Lock
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT = 10.0
+DEFAULT_RATE_BURST = 10
+
+# Kept at module level so the bucket is shared by every request in the process.
+_bucket = {"tokens": None, "updated_at": None}
+_bucket_lock = Lock()
+wait_stats = {"requests": 0, "waited": 0,
+              "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+def reserve_token() -> float:
+    """Takes a token from the bucket and returns how many seconds to wait before using it.
+
+    The bucket may go into debt, which is what queues later callers behind
+    earlier ones. A RTT_RATE_LIMIT of 0 turns limiting off."""
+    rate = float(ENV.get("RTT_RATE_LIMIT", DEFAULT_RATE_LIMIT))
+    burst = float(ENV.get("RTT_RATE_BURST", DEFAULT_RATE_BURST))
+    with _bucket_lock:
+        wait = 0.0
+        if rate > 0:
+            now = monotonic()
+            if _bucket["tokens"] is None:
+                _bucket["tokens"] = burst
+            else:
+                refill = (now - _bucket["updated_at"]) * rate
+                _bucket["tokens"] = min(burst, _bucket["tokens"] + refill)
+            _bucket["updated_at"] = now
+            _bucket["tokens"] -= 1
+            wait = max(0.0, -_bucket["tokens"] / rate)
+
+        wait_stats["requests"] += 1
+        if wait > 0:
+            wait_stats["waited"] += 1
+            wait_stats["total_wait_seconds"] += wait
+            wait_stats["max_wait_seconds"] = max(wait_stats["max_wait_seconds"], wait)
+    return wait
+
+
+def check_deadline(wait: float, deadline: float | None) -> None:
+    """Raises TimeoutError if waiting for a token would run past the deadline."""
+    if deadline is not None and monotonic() + wait >= deadline:
+        raise TimeoutError(f"Waiting {wait:.2f}s for a rate limit token would pass the deadline.")
+
+
+def acquire_token(deadline: float | None = None) -> None:
+    """Blocks the calling thread until a token is available."""
+    wait = reserve_token()
+    check_deadline(wait, deadline)
+    if wait > 0:
+        logger.debug("Waiting %.3fs for a rate limit token.", wait)
+        sleep(wait)
+
+
+async def acquire_token_async(deadline: float | None = None) -> None:
+    """Suspends the calling coroutine until a token is available."""
+    import asyncio  # pylint: disable=import-outside-toplevel
+    wait = reserve_token()
+    check_deadline(wait, deadline)
+    if wait > 0:
+        logger.debug("Waiting %.3fs for a rate limit token.", wait)
+        await asyncio.sleep(wait)
+
+
+def get_wait_stats() -> dict:
+    """Returns a copy of the token wait metrics."""
+    with _bucket_lock:
+        return dict(wait_stats)
+
+
+def reset_rate_limiter() -> None:
+    """Refills the bucket and clears the wait metrics."""
+    with _bucket_lock:
+        _bucket.update(tokens=None, updated_at=None)
+        wait_stats.update(requests=0, waited=0,
+                          total_wait_seconds=0.0, max_wait_seconds=0.0)
@@ -6,7 +6,13 @@ import pandas as pd
 from pandas import DataFrame
 from datetime import time
 from unittest.mock import patch, MagicMock
-from alerts import filter_by_route, send_notification
+
+import pytest
+
+import alerts
+from alerts import (filter_by_route, send_notification, build_alerts, publish_alerts,
+                    queue_notification, flush_notifications, discard_notifications,
+                    wait_for_notifications, get_topic_arn)
 
 
 def test_filter_by_route():
@@ -30,3 +36,88 @@ def test_filter_by_route():
 
     result = filter_by_route(test_df, "Edinburgh", "Bristol Temple Meads")
     assert len(result) == 1
+
+
+@pytest.fixture(autouse=True)
+def sns_client():
+    client = MagicMock()
+    client.create_topic.return_value = {"TopicArn": "arn:topic"}
+    get_topic_arn.cache_clear()
+    discard_notifications()
+    with patch("alerts.get_sns_client", return_value=client):
+        yield client
+    wait_for_notifications()
+    get_topic_arn.cache_clear()
+
+
+def make_delays(count=1):
+    return DataFrame([{
+        "origin_name": "London Paddington", "destination_name": "Bristol Temple Meads",
+        "station_name": "Reading", "scheduled_dep_time_api": time(12, 0),
+        "actual_dep_time_api": time(12, 5), "delay_new": 5, "platform": "1"
+    }] * count)
+
+
+def make_alert(number):
+    return {"topic_name": "c17-trains-delays-PAD-BRI", "subject": "Delays",
+            "message": f"alert {number}"}
+
+
+def test_build_alerts_makes_one_alert_per_delayed_route():
+    result = build_alerts(make_delays(2))
+
+    assert len(result) == 1
+    assert result[0]["topic_name"] == "c17-trains-delays-PAD-BRI"
+    assert result[0]["message"].count("Departing From: Reading") == 2
+
+
+def test_publish_alerts_batches_up_to_ten_per_call(sns_client):
+    sns_client.publish_batch.side_effect = lambda **kwargs: {
+        "Successful": kwargs["PublishBatchRequestEntries"], "Failed": []}
+
+    published = publish_alerts("c17-trains-delays-PAD-BRI", [make_alert(i) for i in range(12)])
+
+    assert published == 12
+    batch_sizes = [len(call.kwargs["PublishBatchRequestEntries"])
+                   for call in sns_client.publish_batch.call_args_list]
+    assert batch_sizes == [10, 2]
+    sns_client.create_topic.assert_called_once()
+
+
+def test_queued_alerts_are_only_published_once_flushed(sns_client):
+    assert queue_notification(make_delays()) == 1
+    sns_client.publish.assert_not_called()
+
+    assert flush_notifications() == 1
+    assert wait_for_notifications() == 1
+    sns_client.publish.assert_called_once()
+    assert sns_client.publish.call_args.kwargs["TopicArn"] == "arn:topic"
+
+
+def test_topic_arn_is_looked_up_once_across_flushes(sns_client):
+    for _ in range(2):
+        queue_notification(make_delays())
+        flush_notifications()
+        wait_for_notifications()
+
+    assert sns_client.publish.call_count == 2
+    sns_client.create_topic.assert_called_once()
+
+
+def test_discarded_alerts_are_never_published(sns_client):
+    queue_notification(make_delays())
+    discard_notifications()
+
+    assert flush_notifications() == 0
+    sns_client.publish.assert_not_called()
+
+
+def test_wait_for_notifications_logs_rather_than_raises_failures(sns_client, caplog):
+    sns_client.publish.side_effect = RuntimeError("SNS is down")
+    queue_notification(make_delays())
+    flush_notifications()
+
+    with caplog.at_level(logging.ERROR):
+        assert wait_for_notifications() == 0
+    assert "SNS is down" in caplog.text
+    assert alerts._in_flight == []
@@ -0,0 +1,75 @@
+"""Unit testing for the functions in archive.py."""
+# pylint: skip-file
+
+import gzip
+import json
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+
+from archive import (get_archive_key, parse_archive_key, archive_response,
+                     archive_responses, list_archive_keys, read_archived_response,
+                     iter_archived_runs)
+
+FETCHED_AT = datetime(2024, 5, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+
+def test_get_archive_key_uses_crs_and_utc_timestamp():
+    assert get_archive_key("PAD", FETCHED_AT) == "PAD/20240501T123015Z.json.gz"
+
+
+def test_parse_archive_key_round_trips():
+    assert parse_archive_key("PAD/20240501T123015Z.json.gz") == ("PAD", FETCHED_AT)
+
+
+def test_local_archive_round_trips(tmp_path):
+    key = archive_response(str(tmp_path), "PAD", {"services": []}, FETCHED_AT)
+    assert list_archive_keys(str(tmp_path)) == [key]
+    assert read_archived_response(str(tmp_path), key) == {"services": []}
+
+
+def test_s3_archive_writes_compressed_json_under_prefix():
+    client = MagicMock()
+    with patch("archive.get_s3_client", return_value=client):
+        archive_response("s3://bucket/raw", "PAD", {"services": []}, FETCHED_AT)
+    kwargs = client.put_object.call_args.kwargs
+    assert kwargs["Bucket"] == "bucket"
+    assert kwargs["Key"] == "raw/PAD/20240501T123015Z.json.gz"
+    assert json.loads(gzip.decompress(kwargs["Body"])) == {"services": []}
+
+
+def test_s3_archive_lists_keys_relative_to_prefix():
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {"Contents": [{"Key": "raw/PAD/20240501T123015Z.json.gz"}]}, {}]
+    with patch("archive.get_s3_client", return_value=client):
+        assert list_archive_keys("s3://bucket/raw") == ["PAD/20240501T123015Z.json.gz"]
+
+
+def test_archive_responses_logs_failures_without_raising():
+    with patch("archive.archive_response", side_effect=OSError("disk full")), \
+            patch("archive.logger") as mock_logger:
+        archive_responses("/tmp/archive", [("PAD", {})], FETCHED_AT)
+    mock_logger.exception.assert_called_once()
+
+
+def test_iter_archived_runs_groups_by_minute_in_order(tmp_path):
+    location = str(tmp_path)
+    archive_response(location, "RDG", {"n": 3}, datetime(2024, 5, 1, 12, 31, 2, tzinfo=timezone.utc))
+    archive_response(location, "PAD", {"n": 1}, datetime(2024, 5, 1, 12, 30, 1, tzinfo=timezone.utc))
+    archive_response(location, "RDG", {"n": 2}, datetime(2024, 5, 1, 12, 30, 4, tzinfo=timezone.utc))
+
+    runs = list(iter_archived_runs(location))
+
+    assert [minute.minute for minute, _ in runs] == [30, 31]
+    assert runs[0][1] == [("PAD", {"n": 1}), ("RDG", {"n": 2})]
+    assert runs[1][1] == [("RDG", {"n": 3})]
+
+
+def test_iter_archived_runs_filters_by_time(tmp_path):
+    location = str(tmp_path)
+    archive_response(location, "PAD", {}, datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc))
+    archive_response(location, "PAD", {}, datetime(2024, 5, 2, 12, 30, tzinfo=timezone.utc))
+
+    runs = list(iter_archived_runs(location, start=datetime(2024, 5, 2, tzinfo=timezone.utc)))
+
+    assert [minute.day for minute, _ in runs] == [2]
@@ -0,0 +1,51 @@
+"""Unit testing for the functions in change_detection.py."""
+# pylint: skip-file
+
+import pytest
+
+from change_detection import (filter_changed_rows, remember_fingerprints,
+                              clear_fingerprints, get_row_fingerprints)
+
+
+@pytest.fixture(autouse=True)
+def empty_fingerprint_store():
+    clear_fingerprints()
+    yield
+    clear_fingerprints()
+
+
+def test_get_row_fingerprints_keys_by_service_station_and_date(test_data):
+    fingerprints = get_row_fingerprints(test_data)
+    assert [key for key, _ in fingerprints] == [
+        ("abc123", "PAD", "2024-05-01")]
+
+
+def test_filter_changed_rows_returns_everything_on_first_run(test_data):
+    changed, fingerprints = filter_changed_rows(test_data)
+    assert len(changed) == 1
+    assert list(fingerprints) == [("abc123", "PAD", "2024-05-01")]
+
+
+def test_filter_changed_rows_skips_unchanged_rows(test_data):
+    _, fingerprints = filter_changed_rows(test_data)
+    remember_fingerprints(fingerprints)
+
+    changed, _ = filter_changed_rows(test_data.copy())
+    assert changed.empty
+    assert list(changed.columns) == list(test_data.columns)
+
+
+def test_filter_changed_rows_returns_changed_rows(test_data):
+    _, fingerprints = filter_changed_rows(test_data)
+    remember_fingerprints(fingerprints)
+
+    delayed = test_data.copy()
+    delayed.loc[0, "actual_dep_time"] = "1310"
+    changed, _ = filter_changed_rows(delayed)
+    assert changed["actual_dep_time"].tolist() == ["1310"]
+
+
+def test_rows_are_reloaded_if_fingerprints_are_not_remembered(test_data):
+    filter_changed_rows(test_data)
+    changed, _ = filter_changed_rows(test_data)
+    assert len(changed) == 1
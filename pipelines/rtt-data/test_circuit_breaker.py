@@ -0,0 +1,72 @@
+"""Unit testing for the functions in circuit_breaker.py."""
+# pylint: skip-file
+
+from unittest.mock import patch
+
+import pytest
+
+from circuit_breaker import (allow_request, record_success, record_failure,
+                             get_circuit_state, reset_circuits,
+                             CLOSED, OPEN, HALF_OPEN)
+
+BREAKER_ENV = {"CIRCUIT_FAILURE_THRESHOLD": "2", "CIRCUIT_COOLDOWN_SECONDS": "60"}
+
+
+@pytest.fixture(autouse=True)
+def closed_circuits():
+    reset_circuits()
+    with patch.dict("os.environ", BREAKER_ENV):
+        yield
+    reset_circuits()
+
+
+def open_circuit(crs, now=1000.0):
+    with patch("circuit_breaker.monotonic", return_value=now):
+        record_failure(crs)
+        record_failure(crs)
+
+
+def test_circuit_stays_closed_below_threshold():
+    record_failure("PAD")
+    assert get_circuit_state("PAD") == CLOSED
+    assert allow_request("PAD")
+
+
+def test_circuit_opens_at_threshold_and_skips_requests():
+    open_circuit("PAD")
+    with patch("circuit_breaker.monotonic", return_value=1030.0):
+        assert get_circuit_state("PAD") == OPEN
+        assert not allow_request("PAD")
+    assert get_circuit_state("RDG") == CLOSED
+
+
+def test_success_resets_failure_count():
+    record_failure("PAD")
+    record_success("PAD")
+    record_failure("PAD")
+    assert get_circuit_state("PAD") == CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    open_circuit("PAD")
+    with patch("circuit_breaker.monotonic", return_value=1061.0):
+        assert get_circuit_state("PAD") == HALF_OPEN
+        assert allow_request("PAD")
+        assert not allow_request("PAD")
+
+
+def test_successful_probe_closes_circuit():
+    open_circuit("PAD")
+    with patch("circuit_breaker.monotonic", return_value=1061.0):
+        allow_request("PAD")
+        record_success("PAD")
+        assert get_circuit_state("PAD") == CLOSED
+
+
+def test_failed_probe_reopens_circuit():
+    open_circuit("PAD")
+    with patch("circuit_breaker.monotonic", return_value=1061.0):
+        allow_request("PAD")
+        record_failure("PAD")
+    with patch("circuit_breaker.monotonic", return_value=1100.0):
+        assert get_circuit_state("PAD") == OPEN
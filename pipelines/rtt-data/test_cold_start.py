@@ -0,0 +1,36 @@
+"""Cold-start import checks for the Lambda entry point, using benchmarks/bench_cold_start.py."""
+# pylint: skip-file
+
+from benchmarks.bench_cold_start import (DEFERRED_MODULES, get_imported_modules,
+                                         parse_import_times, run_importtime)
+
+SAMPLE_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        900 |     pandas.core
+import time:       400 |       1300 |   pandas
+import time:        50 |        50 |   pandas
+import time:       200 |       1500 | main
+"""
+
+
+def test_parse_import_times_keeps_first_top_level_entry():
+    assert parse_import_times(SAMPLE_OUTPUT) == {"_io": 120, "pandas": 1300, "main": 1500}
+
+
+def test_get_imported_modules_includes_submodules():
+    assert get_imported_modules(SAMPLE_OUTPUT) == {"_io", "pandas.core", "pandas", "main"}
+
+
+def test_main_import_defers_optional_dependencies():
+    """Test that importing the handler does not load packages only some runs need."""
+    output = run_importtime("main")
+    imported = get_imported_modules(output)
+    assert "main" in parse_import_times(output)
+    assert not imported & set(DEFERRED_MODULES)
+
+
+def test_load_import_does_not_pull_in_other_stages():
+    """Test that load.py no longer imports extract and transform at module level."""
+    imported = get_imported_modules(run_importtime("load"))
+    assert "extract" not in imported
+    assert "transform" not in imported
@@ -1,7 +1,163 @@
 """Unit testing for the functions in extract.py."""
-from unittest.mock import patch
-
-from extract import get_station_name, get_trains, extract_train_info, make_train_info_list
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+from circuit_breaker import CircuitOpenError, get_circuit_state, reset_circuits
+from rate_limiter import reset_rate_limiter
+
+from extract import (get_station_name, get_trains, get_service_record,
+                     fetch_station_responses, fetch_train_data, get_session, close_session,
+                     fetch_station_json, append_train_info_columns, build_service_dataframe,
+                     get_backoff_delay, fetch_station_json_with_breaker,
+                     SERVICE_COLUMNS)
+
+API_ENV = {"API_USERNAME": "user", "API_PASSWORD": "password"}
+
+
+@pytest.fixture(autouse=True)
+def full_rate_limit_bucket():
+    reset_rate_limiter()
+    yield
+    reset_rate_limiter()
+
+### Testing get_session() ###
+
+
+def test_get_session_is_reused_between_calls():
+    """Tests that the same pooled session is returned on every call."""
+    close_session()
+    with patch.dict("os.environ", API_ENV):
+        first = get_session()
+        second = get_session()
+    assert first is second
+    assert first.auth == ("user", "password")
+    close_session()
+
+
+def test_get_session_uses_configured_pool_size():
+    """Tests that RTT_POOL_SIZE sets the connection pool size."""
+    close_session()
+    with patch.dict("os.environ", {**API_ENV, "RTT_POOL_SIZE": "3"}):
+        session = get_session()
+    assert session.get_adapter("https://api.rtt.io")._pool_maxsize == 3
+    close_session()
+
+
+def test_fetch_station_json_uses_shared_session():
+    """Tests that fetch_station_json requests through the shared session."""
+    with patch('extract.get_session') as mock_get_session:
+        mock_get_session.return_value.get.return_value.json.return_value = {
+            'services': []}
+        assert fetch_station_json('PAD') == {'services': []}
+    mock_get_session.return_value.get.assert_called_once_with(
+        url="https://api.rtt.io/api/v1/json/search/PAD", timeout=5)
+
+
+def make_response(status_code: int, payload: dict | None = None) -> MagicMock:
+    """Returns a mock API response with the given status code."""
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = payload
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=response)
+    return response
+
+
+def test_fetch_station_json_retries_server_errors():
+    """Tests that a 503 is retried after a backoff and the later response returned."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.sleep') as mock_sleep:
+        mock_get_session.return_value.get.side_effect = [
+            make_response(503), make_response(200, {'services': []})]
+        assert fetch_station_json('PAD') == {'services': []}
+    assert mock_get_session.return_value.get.call_count == 2
+    mock_sleep.assert_called_once()
+
+
+def test_fetch_station_json_does_not_retry_client_errors():
+    """Tests that a 404 is raised straight away."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.sleep') as mock_sleep, \
+            pytest.raises(requests.exceptions.HTTPError):
+        mock_get_session.return_value.get.return_value = make_response(404)
+        fetch_station_json('PAD')
+    mock_sleep.assert_not_called()
+
+
+def test_fetch_station_json_gives_up_after_max_retries():
+    """Tests that RTT_MAX_RETRIES bounds the number of attempts."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.sleep'), \
+            patch.dict("os.environ", {"RTT_MAX_RETRIES": "3"}), \
+            pytest.raises(requests.exceptions.ConnectionError):
+        mock_get_session.return_value.get.side_effect = requests.exceptions.ConnectionError
+        fetch_station_json('PAD')
+    assert mock_get_session.return_value.get.call_count == 4
+
+
+def test_fetch_station_json_stops_at_deadline():
+    """Tests that no request is made once the deadline has passed."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.acquire_token'), \
+            patch('extract.monotonic', return_value=100.0), \
+            pytest.raises(TimeoutError):
+        fetch_station_json('PAD', deadline=99.0)
+    mock_get_session.return_value.get.assert_not_called()
+
+
+def test_fetch_station_json_caps_timeout_at_deadline():
+    """Tests that the request timeout never runs past the deadline."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.acquire_token'), \
+            patch('extract.monotonic', return_value=100.0):
+        mock_get_session.return_value.get.return_value = make_response(200, {})
+        fetch_station_json('PAD', deadline=101.5)
+    assert mock_get_session.return_value.get.call_args.kwargs["timeout"] == 1.5
+
+
+def test_fetch_station_json_with_breaker_skips_open_station():
+    """Tests that an open circuit skips the request."""
+    with patch('extract.allow_request', return_value=False), \
+            patch('extract.fetch_station_json') as mock_fetch, \
+            pytest.raises(CircuitOpenError):
+        fetch_station_json_with_breaker('PAD')
+    mock_fetch.assert_not_called()
+
+
+def test_fetch_station_json_with_breaker_counts_request_failures():
+    """Tests that failed requests open the circuit but deadline timeouts do not."""
+    reset_circuits()
+    with patch.dict("os.environ", {"CIRCUIT_FAILURE_THRESHOLD": "1"}):
+        with patch('extract.fetch_station_json', side_effect=TimeoutError), \
+                pytest.raises(TimeoutError):
+            fetch_station_json_with_breaker('PAD')
+        assert get_circuit_state('PAD') == "closed"
+        with patch('extract.fetch_station_json',
+                   side_effect=requests.exceptions.ConnectionError), \
+                pytest.raises(requests.exceptions.ConnectionError):
+            fetch_station_json_with_breaker('PAD')
+        assert get_circuit_state('PAD') == "open"
+    reset_circuits()
+
+
+def test_fetch_station_json_takes_a_rate_limit_token_per_attempt():
+    """Tests that every attempt, including retries, goes through the rate limiter."""
+    with patch('extract.get_session') as mock_get_session, \
+            patch('extract.sleep'), \
+            patch('extract.acquire_token') as mock_acquire:
+        mock_get_session.return_value.get.side_effect = [
+            make_response(429), make_response(200, {})]
+        fetch_station_json('PAD', deadline=None)
+    assert mock_acquire.call_count == 2
+
+
+def test_get_backoff_delay_is_capped():
+    """Tests that the jittered delay stays within the cap."""
+    with patch.dict("os.environ", {"RTT_BACKOFF_BASE": "1", "RTT_BACKOFF_CAP": "2"}):
+        delays = [get_backoff_delay(10) for _ in range(50)]
+    assert all(0 <= delay <= 2 for delay in delays)
 
 ### Testing get_station_name() ###
 
@@ -72,11 +228,11 @@ def test_logs_info_when_no_services_in_response(mock_logger):
     get_trains(response)
     mock_logger.debug.assert_called_once_with("No services to retrieve.")
 
-### Testing extract_train_info() ###
+### Testing get_service_record() ###
 
 
-def test_extract_train_info_with_valid_service():
-    """Tests that extract_train_info correctly processes response data."""
+def test_get_service_record_with_valid_service():
+    """Tests that get_service_record correctly processes response data."""
     service = {
         'serviceUid': '123',
         'trainIdentity': '234',
@@ -116,12 +272,12 @@ def test_extract_train_info_with_valid_service():
         'cancel_reason': None,
         'service_type': 'train'
     }
-    result = extract_train_info(service, name, crs)
-    assert result == expected
+    result = get_service_record(service, name, crs)
+    assert dict(zip(SERVICE_COLUMNS, result)) == expected
 
 
-def test_extract_train_info_with_cancelled_service():
-    """Tests that extract_train_info correctly processes cancellation data."""
+def test_get_service_record_with_cancelled_service():
+    """Tests that get_service_record correctly processes cancellation data."""
     service = {
         'serviceUid': '123',
         'trainIdentity': '234',
@@ -163,47 +319,131 @@ def test_extract_train_info_with_cancelled_service():
         'cancel_reason': 'cancelled',
         'service_type': 'train'
     }
-    result = extract_train_info(service, name, crs)
-    assert result == expected
+    result = get_service_record(service, name, crs)
+    assert dict(zip(SERVICE_COLUMNS, result)) == expected
 
+### Testing append_train_info_columns() ###
 
-@patch('extract.logger')
-def test_logs_info_when_extracting_train_info_initial(mock_logger):
-    """Tests that the initial info log is correctly called."""
-    service = {'serviceUid': '123'}
-    name = 'station1'
-    crs = 'ABC'
-    extract_train_info(service, name, crs)
-    mock_logger.info.assert_any_call(
-        "Extracting train info for services from %s", "ABC")
+
+def test_append_train_info_columns_matches_get_service_record():
+    """Tests that each column gets its field from the service's record."""
+    services = [{'serviceUid': '123', 'runDate': '2024-05-01',
+                 'locationDetail': {'platform': '1', 'cancelReasonCode': 'abc'}},
+                {'serviceUid': '456', 'serviceType': 'train'}]
+    columns = {column: [] for column in SERVICE_COLUMNS}
+
+    count = append_train_info_columns(columns, services, 'station', 'ABC')
+
+    assert count == 2
+    for i, service in enumerate(services):
+        expected = get_service_record(service, 'station', 'ABC')
+        assert tuple(values[i] for values in columns.values()) == expected
+
+
+def test_append_train_info_columns_returns_zero_without_services():
+    """Tests that nothing is appended when a station has no services."""
+    columns = {column: [] for column in SERVICE_COLUMNS}
+    assert append_train_info_columns(columns, None, 'station', 'ABC') == 0
+    assert all(values == [] for values in columns.values())
 
 
 @patch('extract.logger')
-def test_logs_info_when_extracting_train_info(mock_logger):
-    """Tests that the info log is correctly called."""
-    service = {'serviceUid': '123'}
-    name = 'station1'
-    crs = 'ABC'
-    extract_train_info(service, name, crs)
-    mock_logger.info.assert_any_call(
-        "Extracted train info for service '%s'", '123')
+def test_append_train_info_columns_only_logs_rows_when_asked(mock_logger):
+    """Tests that per-service logging is opt-in."""
+    columns = {column: [] for column in SERVICE_COLUMNS}
+    append_train_info_columns(columns, [{'serviceUid': '123'}], 'station', 'ABC')
+    mock_logger.debug.assert_not_called()
+
+    append_train_info_columns(columns, [{'serviceUid': '456'}], 'station', 'ABC',
+                              log_rows=True)
+    mock_logger.debug.assert_called_once_with(
+        "Extracted train info for service '%s'", '456')
+
+### Testing build_service_dataframe() ###
+
+
+def test_build_service_dataframe_combines_stations():
+    """Tests that one dataframe is built across all station responses."""
+    responses = [
+        ('PAD', {'location': {'name': 'London Paddington'},
+                 'services': [{'serviceUid': '1'}, {'serviceUid': '2'}]}),
+        ('RDG', {'location': {'name': 'Reading'}, 'services': None}),
+        ('BRI', {'location': {'name': 'Bristol Temple Meads'},
+                 'services': [{'serviceUid': '3'}]}),
+    ]
+    result = build_service_dataframe(responses)
+
+    assert list(result.columns) == SERVICE_COLUMNS
+    assert result['service_uid'].tolist() == ['1', '2', '3']
+    assert result['station_crs'].tolist() == ['PAD', 'PAD', 'BRI']
+
+
+def test_build_service_dataframe_keeps_columns_when_empty():
+    """Tests that an empty result still has every column."""
+    result = build_service_dataframe([('PAD', {})])
+    assert result.empty
+    assert list(result.columns) == SERVICE_COLUMNS
+
+### Testing fetch_station_responses() ###
+
+
+def fake_station_json(crs, deadline=None):
+    """Returns a minimal API response for a station, failing for 'BAD'."""
+    if crs == 'BAD':
+        raise ValueError("bad station")
+    return {'location': {'name': crs}, 'services': [{'serviceUid': crs}]}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_fetch_station_responses_keeps_station_order(workers):
+    """Tests that responses are returned in the order the stations were given."""
+    stations = ['PAD', 'RDG', 'DID', 'SWI', 'BTH']
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json):
+        responses, failures = fetch_station_responses(stations, workers)
+
+    assert [crs for crs, _ in responses] == stations
+    assert [response['location']['name'] for _, response in responses] == stations
+    assert failures == {}
+
+
+def test_fetch_station_responses_reports_failures_per_station():
+    """Tests that a failing station is reported without losing the others."""
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json):
+        responses, failures = fetch_station_responses(
+            ['PAD', 'BAD', 'RDG'], 3)
+
+    assert [crs for crs, _ in responses] == ['PAD', 'RDG']
+    assert list(failures) == ['BAD']
+    assert isinstance(failures['BAD'], ValueError)
+
+
+def test_fetch_train_data_returns_partial_results_when_a_station_fails():
+    """Tests that fetch_train_data keeps the stations that succeeded."""
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json):
+        result = fetch_train_data(['PAD', 'BAD', 'RDG'], 2)
+    assert result['service_uid'].tolist() == ['PAD', 'RDG']
+
 
-### Testing make_train_info_list() ###
+def test_fetch_train_data_raises_when_every_station_fails():
+    """Tests that fetch_train_data raises naming the failed stations."""
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json), \
+            pytest.raises(RuntimeError, match="BAD"):
+        fetch_train_data(['BAD'], 2)
 
 
-def test_make_train_info_list():
-    """Tests that make_train_info_list returns correct data."""
-    train_list = [{'serviceUid': '123'}, {'serviceUid': '456'}]
-    name = 'station1'
-    crs = 'st1'
+def test_fetch_train_data_returns_one_row_per_service():
+    """Tests that fetch_train_data builds one dataframe for all stations."""
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json):
+        result = fetch_train_data(['PAD', 'RDG'], 2)
+    assert result['service_uid'].tolist() == ['PAD', 'RDG']
 
-    with patch('extract.extract_train_info') as mock_extract_train_info:
-        mock_extract_train_info.side_effect = [{'serviceUid': '123', 'station_name': 'Station A'},
-                                               {'serviceUid': '456',
-                                                   'station_name': 'Station A'}
-                                               ]
-        result = make_train_info_list(train_list, name, crs)
 
-        assert len(result) == 2
-        assert result[0]['serviceUid'] == '123'
-        assert result[1]['serviceUid'] == '456'
+def test_fetch_train_data_archives_responses_when_configured():
+    """Tests that the fetched responses are archived when ARCHIVE_LOCATION is set."""
+    with patch('extract.fetch_station_json_with_breaker', side_effect=fake_station_json), \
+            patch('extract.archive_responses') as mock_archive, \
+            patch.dict("os.environ", {"ARCHIVE_LOCATION": "s3://bucket/raw"}):
+        fetch_train_data(['PAD', 'BAD'], 2)
+    location, responses, _ = mock_archive.call_args.args
+    assert location == "s3://bucket/raw"
+    assert [crs for crs, _ in responses] == ['PAD']
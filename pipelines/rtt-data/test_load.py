@@ -1,20 +1,484 @@
 """Test for load script that loads data to the RDS."""
 # pylint: skip-file
 
-from unittest.mock import patch
-
-from load import (get_connection)
-
-
-def test_get_db_connection_called_once():
-    """Test that connect is called once when get_connection is invoked."""
-    with patch("load.connect") as mock_connect, \
-            patch.dict("os.environ", {
-                "DB_USER": "USER",
-                "DB_PASSWORD": "PASSWORD",
-                "DB_HOST": "HOST",
-                "DB_PORT": "PORT",
-                "DB_NAME": "NAME"
-            }):
-        get_connection()
-        mock_connect.assert_called_once()
+from datetime import date, time
+from unittest.mock import patch, MagicMock
+
+import pytest
+from pandas import DataFrame, Series
+from psycopg2 import DatabaseError
+from psycopg2.extras import RealDictCursor
+
+import load
+from load import (get_connection, fetch_batch_train_services, fetch_batch_train_stops,
+                  update_cancellation, copy_into_temp_table, merge_train_stops,
+                  get_dimension, invalidate_dimension_cache, dimension_cache_stats,
+                  update_station, load_data_into_database, add_to_dimension_cache,
+                  map_names_to_ids, to_database_rows, insert_new_routes,
+                  insert_new_train_services, insert_new_cancellations, update_route,
+                  update_train_service, ensure_train_stop_partitions,
+                  invalidate_partition_cache)
+
+
+STATIONS = DataFrame({"station_id": [1, 2],
+                      "station_name": ["London Paddington", "Bristol Temple Meads"]})
+
+
+def test_get_connection_returns_rows_as_dicts():
+    """Test that the load's connection is the kept one, with dict rows."""
+    with patch("load.get_kept_connection") as mock_get_connection:
+        assert get_connection() is mock_get_connection.return_value
+    mock_get_connection.assert_called_once_with(RealDictCursor)
+
+
+def make_mock_connection(rows=None):
+    """Returns a mock connection whose cursor returns the given rows."""
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = rows or []
+    return conn, cursor
+
+
+def test_fetch_batch_train_services_filters_by_batch_keys():
+    """Test that train_service is only queried for the batch's service keys."""
+    conn, cursor = make_mock_connection()
+    batch = DataFrame({"service_uid": ["A1", "A1", "B2"],
+                       "service_date": [date(2025, 6, 1), date(2025, 6, 1), date(2025, 6, 2)]})
+
+    fetch_batch_train_services(batch, conn)
+
+    query, params = cursor.execute.call_args.args
+    assert "UNNEST" in query
+    assert params == (["A1", "B2"], [date(2025, 6, 1), date(2025, 6, 2)])
+
+
+def test_fetch_batch_train_services_keeps_columns_when_empty():
+    """Test that an empty lookup still has the columns the loaders use."""
+    conn, _ = make_mock_connection()
+    batch = DataFrame({"service_uid": [], "service_date": []})
+
+    result = fetch_batch_train_services(batch, conn)
+
+    assert result.empty
+    assert {"train_service_id", "service_uid",
+            "service_date"} <= set(result.columns)
+
+
+def test_fetch_batch_train_stops_filters_by_train_service_ids():
+    """Test that train_stop is only queried for the given train services."""
+    rows = [{"train_stop_id": 1, "train_service_id": 5, "station_id": 2,
+             "scheduled_dep_time": None, "actual_dep_time": None}]
+    conn, cursor = make_mock_connection(rows)
+
+    result = fetch_batch_train_stops(Series([5, 6]), conn)
+
+    query, params = cursor.execute.call_args.args
+    assert "ANY(%s)" in query
+    assert params == ([5, 6],)
+    assert result["train_stop_id"].tolist() == [1]
+
+
+def test_fetch_batch_train_stops_prunes_by_service_date():
+    """Test that passing service dates bounds the query to their partitions."""
+    conn, cursor = make_mock_connection([])
+
+    fetch_batch_train_stops(Series([5]), conn, [date(2025, 6, 14)])
+
+    query, params = cursor.execute.call_args.args
+    assert "service_date = ANY(%s::date[])" in query
+    assert params == ([5], [date(2025, 6, 14)])
+
+
+def test_ensure_train_stop_partitions_only_creates_unseen_months():
+    """Test that each month's partition is ensured once per process."""
+    cursor = MagicMock()
+    invalidate_partition_cache()
+
+    ensure_train_stop_partitions([date(2025, 6, 14), date(2025, 6, 30), date(2025, 7, 1)], cursor)
+    ensure_train_stop_partitions([date(2025, 6, 2)], cursor)
+
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.args[1] == ([date(2025, 6, 1), date(2025, 7, 1)],)
+
+
+def test_invalidate_partition_cache_ensures_months_again():
+    """Test that a rollback makes the next load check its partitions again."""
+    cursor = MagicMock()
+    invalidate_partition_cache()
+    ensure_train_stop_partitions([date(2025, 6, 14)], cursor)
+
+    invalidate_partition_cache()
+    ensure_train_stop_partitions([date(2025, 6, 14)], cursor)
+
+    assert cursor.execute.call_count == 2
+
+
+def test_update_cancellation_upserts_without_reading_cancellations():
+    """Test that cancellations are upserted on train_stop_id, one row per stop."""
+    api_data = DataFrame([{
+        "service_uid": "A1", "service_date": date(2025, 6, 14),
+        "station_name": "London Paddington",
+        "origin_name": "London Paddington", "destination_name": "Bristol Temple Meads",
+        "cancelled": True, "cancel_reason": reason
+    } for reason in ("a problem", "a different problem")])
+    services = DataFrame({"train_service_id": [5], "service_uid": ["A1"],
+                          "service_date": [date(2025, 6, 14)]})
+    stops = DataFrame({"train_stop_id": [9], "train_service_id": [5],
+                       "service_date": [date(2025, 6, 14)], "station_id": [1]})
+
+    with patch("load.fetch_batch_train_services", return_value=services), \
+            patch("load.fetch_batch_train_stops", return_value=stops), \
+            patch("load.get_dimension", return_value=STATIONS), \
+            patch("load.execute_values", return_value=[{"train_stop_id": 9}]) as mock_values:
+        update_cancellation(api_data, MagicMock())
+
+    sql, rows = mock_values.call_args.args[1:3]
+    assert "ON CONFLICT (train_stop_id) DO UPDATE" in sql
+    assert rows == [(9, date(2025, 6, 14), "a different problem")]
+
+
+def test_update_cancellation_only_cancels_the_stop_at_its_station():
+    """Test that a cancellation at one station leaves the service's other stops alone."""
+    api_data = DataFrame([{
+        "service_uid": "A1", "service_date": date(2025, 6, 14), "station_name": station,
+        "origin_name": "London Paddington", "destination_name": "Bristol Temple Meads",
+        "cancelled": cancelled, "cancel_reason": "a problem" if cancelled else None
+    } for station, cancelled in (("London Paddington", False), ("Bristol Temple Meads", True))])
+    services = DataFrame({"train_service_id": [5], "service_uid": ["A1"],
+                          "service_date": [date(2025, 6, 14)]})
+    stops = DataFrame({"train_stop_id": [9, 10], "train_service_id": [5, 5],
+                       "service_date": [date(2025, 6, 14)] * 2, "station_id": [1, 2]})
+
+    with patch("load.fetch_batch_train_services", return_value=services), \
+            patch("load.fetch_batch_train_stops", return_value=stops), \
+            patch("load.get_dimension", return_value=STATIONS), \
+            patch("load.execute_values", return_value=[{"train_stop_id": 10}]) as mock_values:
+        update_cancellation(api_data, MagicMock())
+
+    assert mock_values.call_args.args[2] == [(10, date(2025, 6, 14), "a problem")]
+
+
+def test_update_cancellation_matches_services_on_uid_and_date():
+    """Test that a service_uid running on two days only cancels the stops of the cancelled day."""
+    api_data = DataFrame([{
+        "service_uid": "A1", "service_date": date(2025, 6, 15),
+        "station_name": "London Paddington",
+        "origin_name": "London Paddington", "destination_name": "Bristol Temple Meads",
+        "cancelled": True, "cancel_reason": "a problem"
+    }])
+    conn, cursor = make_mock_connection()
+    cursor.fetchall.side_effect = [
+        [{"train_service_id": 5, "service_uid": "A1", "train_identity": "1A01",
+          "service_date": date(2025, 6, 14), "route_id": 1},
+         {"train_service_id": 6, "service_uid": "A1", "train_identity": "1A01",
+          "service_date": date(2025, 6, 15), "route_id": 1}],
+        [{"train_stop_id": 10, "train_service_id": 6, "service_date": date(2025, 6, 15),
+          "station_id": 1, "scheduled_dep_time": None, "actual_dep_time": None}]
+    ]
+
+    with patch("load.get_dimension", return_value=STATIONS), \
+            patch("load.execute_values", return_value=[{"train_stop_id": 10}]) as mock_values:
+        update_cancellation(api_data, conn)
+
+    services_params = cursor.execute.call_args_list[0].args[1]
+    assert services_params == (["A1"], [date(2025, 6, 15)])
+    assert mock_values.call_args.args[2] == [(10, date(2025, 6, 15), "a problem")]
+
+
+def test_copy_into_temp_table_streams_csv_with_nulls():
+    """Test that rows are copied as CSV with missing values sent as NULL."""
+    cursor = MagicMock()
+    data = DataFrame({"train_service_id": [1, 2],
+                      "actual_dep_time": [time(12, 30), None],
+                      "platform": ["1", "2"]})
+
+    copy_into_temp_table(cursor, "staging", "a INT, b TIME, c TEXT", data)
+
+    assert "CREATE TEMPORARY TABLE staging" in cursor.execute.call_args.args[0]
+    copy_sql, buffer = cursor.copy_expert.call_args.args
+    assert copy_sql.startswith("COPY staging FROM STDIN")
+    assert buffer.read() == "1,12:30:00,1\n2,\\N,2\n"
+
+
+def test_merge_train_stops_returns_inserted_and_updated_counts():
+    """Test that the merge reports how many rows were inserted and updated."""
+    cursor = MagicMock()
+    cursor.fetchone.return_value = {"inserted": 3, "updated": 2}
+    train_stops = DataFrame([{
+        "train_service_id": 1, "service_date": date(2025, 6, 14), "station_id": 2,
+        "scheduled_arr_time": time(12, 0), "actual_arr_time": time(12, 1),
+        "scheduled_dep_time": time(12, 2), "actual_dep_time": time(12, 3),
+        "platform": "1", "platform_changed": False
+    }])
+
+    assert merge_train_stops(train_stops, cursor) == (3, 2)
+    assert ("ON CONFLICT (train_service_id, station_id, service_date)"
+            in cursor.execute.call_args.args[0])
+
+
+SERVER_SIDE_BATCH = DataFrame([{
+    "service_uid": "A1", "train_identity": "1A01", "service_date": date(2025, 6, 14),
+    "station_name": "London Paddington", "origin_name": "London Paddington",
+    "destination_name": "Bristol Temple Meads", "operator_name": "GWR",
+    "cancelled": True, "cancel_reason": "a problem"
+}, {
+    "service_uid": "A2", "train_identity": "1A02", "service_date": date(2025, 6, 14),
+    "station_name": "London Paddington", "origin_name": "London Paddington",
+    "destination_name": "Bristol Temple Meads", "operator_name": "GWR",
+    "cancelled": False, "cancel_reason": None
+}])
+
+
+def test_insert_new_routes_stages_distinct_routes():
+    """Test that each route is staged once and Postgres skips existing ones."""
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [{"route_id": 1}]
+
+    assert insert_new_routes(SERVER_SIDE_BATCH, cursor) == [{"route_id": 1}]
+    buffer = cursor.copy_expert.call_args.args[1]
+    assert buffer.read() == "London Paddington,Bristol Temple Meads,GWR\n"
+    assert "WHERE NOT EXISTS" in cursor.execute.call_args.args[0]
+
+
+def test_insert_new_train_services_skips_conflicts():
+    """Test that services are inserted with both an anti-join and ON CONFLICT DO NOTHING."""
+    cursor = MagicMock()
+
+    insert_new_train_services(SERVER_SIDE_BATCH, cursor)
+
+    sql = cursor.execute.call_args.args[0]
+    assert "WHERE NOT EXISTS" in sql
+    assert "ON CONFLICT (service_uid, service_date) DO NOTHING" in sql
+    assert len(cursor.copy_expert.call_args.args[1].readlines()) == 2
+
+
+def test_insert_new_cancellations_only_stages_cancelled_stops():
+    """Test that only cancelled rows are staged, keyed by service, date and station."""
+    cursor = MagicMock()
+
+    insert_new_cancellations(SERVER_SIDE_BATCH, cursor)
+
+    buffer = cursor.copy_expert.call_args.args[1]
+    assert buffer.read() == "A1,2025-06-14,London Paddington,a problem\n"
+    assert "stop.station_id = station.station_id" in cursor.execute.call_args.args[0]
+
+
+def test_update_route_server_side_adds_inserted_routes_to_cache():
+    """Test that routes inserted by Postgres are added to the cached route table."""
+    inserted = [{"route_id": 2, "origin_station_id": 1,
+                 "destination_station_id": 2, "operator_id": 1}]
+    load._dimension_cache["route"] = (0, DataFrame(columns=list(inserted[0])))
+    conn = MagicMock()
+    with patch("load.insert_new_routes", return_value=inserted), \
+            patch("load.get_dimension") as mock_get_dimension:
+        update_route(SERVER_SIDE_BATCH, conn, server_side=True)
+
+    mock_get_dimension.assert_not_called()
+    conn.commit.assert_called_once()
+    assert load._dimension_cache["route"][1]["route_id"].tolist() == [2]
+    invalidate_dimension_cache()
+
+
+def test_update_train_service_server_side_clears_service_lookup():
+    """Test that the next stage refetches the batch's services after a server-side insert."""
+    lookups = {"train_service": DataFrame()}
+    with patch("load.insert_new_train_services", return_value=[]) as mock_insert:
+        update_train_service(SERVER_SIDE_BATCH, MagicMock(), False, lookups, server_side=True)
+
+    mock_insert.assert_called_once()
+    assert lookups == {}
+
+
+def test_get_dimension_caches_rows_between_calls():
+    """Test that a dimension table is only queried once while cached."""
+    invalidate_dimension_cache()
+    conn, cursor = make_mock_connection(
+        [{"operator_id": 1, "operator_name": "GWR"}])
+    hits, misses = dimension_cache_stats["hits"], dimension_cache_stats["misses"]
+
+    first = get_dimension("operator", conn)
+    second = get_dimension("operator", conn)
+
+    assert cursor.execute.call_count == 1
+    assert first is second
+    assert dimension_cache_stats["hits"] == hits + 1
+    assert dimension_cache_stats["misses"] == misses + 1
+    invalidate_dimension_cache()
+
+
+def test_get_dimension_requeries_after_invalidation():
+    """Test that invalidating a table makes the next lookup query it again."""
+    invalidate_dimension_cache()
+    conn, cursor = make_mock_connection()
+
+    get_dimension("station", conn)
+    invalidate_dimension_cache("station")
+    get_dimension("station", conn)
+
+    assert cursor.execute.call_count == 2
+    invalidate_dimension_cache()
+
+
+def test_get_dimension_requeries_after_ttl():
+    """Test that cached rows expire after DIMENSION_CACHE_TTL seconds."""
+    invalidate_dimension_cache()
+    conn, cursor = make_mock_connection()
+
+    with patch.dict("os.environ", {"DIMENSION_CACHE_TTL": "0"}):
+        get_dimension("route", conn)
+        get_dimension("route", conn)
+
+    assert cursor.execute.call_count == 2
+    invalidate_dimension_cache()
+
+
+def test_update_station_only_inserts_new_stations():
+    """Test that update_station skips existing stations and caches the returned IDs."""
+    invalidate_dimension_cache()
+    conn, _ = make_mock_connection(
+        [{"station_id": 1, "station_crs": "PAD", "station_name": "London Paddington"}])
+    api_data = DataFrame({"station_crs": ["PAD", "RDG"],
+                          "station_name": ["London Paddington", "Reading"]})
+
+    with patch("load.execute_values") as mock_execute_values:
+        mock_execute_values.return_value = [
+            {"station_id": 2, "station_crs": "RDG", "station_name": "Reading"}]
+        update_station(api_data, conn)
+
+    assert mock_execute_values.call_args.args[2] == [("RDG", "Reading")]
+    assert "RETURNING" in mock_execute_values.call_args.args[1]
+    conn.commit.assert_called_once()
+    assert get_dimension("station", conn)["station_id"].tolist() == [1, 2]
+    invalidate_dimension_cache()
+
+
+def test_update_station_refreshes_cache_after_conflict():
+    """Test that a station inserted by another load drops the cached table."""
+    invalidate_dimension_cache()
+    conn, _ = make_mock_connection(
+        [{"station_id": 1, "station_crs": "PAD", "station_name": "London Paddington"}])
+    api_data = DataFrame({"station_crs": ["RDG"], "station_name": ["Reading"]})
+
+    with patch("load.execute_values", return_value=[]) as mock_execute_values:
+        update_station(api_data, conn)
+
+    assert "ON CONFLICT (station_crs) DO NOTHING" in mock_execute_values.call_args.args[1]
+    assert "station" not in load._dimension_cache
+
+
+def test_add_to_dimension_cache_ignores_uncached_tables():
+    """Test that returned rows are not cached for a table that was never read."""
+    invalidate_dimension_cache()
+    add_to_dimension_cache("operator", [{"operator_id": 1, "operator_name": "GWR"}])
+    assert "operator" not in load._dimension_cache
+
+
+def test_map_names_to_ids_uses_category_codes():
+    """Test that categorical names map to IDs, with unknown and missing names as NaN."""
+    names = Series(["Reading", "Bath Spa", None, "Reading"], dtype="category")
+    result = map_names_to_ids(names, {"Reading": 1, "Bath Spa": 2})
+    assert result.tolist()[:2] == [1.0, 2.0]
+    assert result.isna().tolist() == [False, False, True, False]
+    assert result.iloc[3] == 1.0
+
+
+def test_map_names_to_ids_matches_plain_map():
+    """Test that object columns give the same result as Series.map."""
+    names = Series(["Reading", "Swindon"])
+    result = map_names_to_ids(names, {"Reading": 1})
+    assert result.equals(names.map({"Reading": 1}))
+
+
+def test_to_database_rows_converts_seconds_and_missing_values():
+    """Test that second-of-day columns become times and <NA> becomes None."""
+    data = DataFrame({
+        "train_service_id": [1],
+        "scheduled_dep_time": Series([45030], dtype="Int32"),
+        "actual_dep_time": Series([None], dtype="Int32"),
+        "platform_changed": Series([False], dtype="boolean"),
+    })
+    assert to_database_rows(data) == [(1, time(12, 30, 30), None, False)]
+
+
+STAGES = ["update_station", "update_operator", "update_route",
+          "update_train_service", "update_train_stop", "update_cancellation"]
+
+
+def test_load_data_into_database_commits_once_in_single_transaction():
+    """Test that every stage runs without committing and the load commits once."""
+    conn = MagicMock()
+    stages = {stage: MagicMock() for stage in STAGES}
+    with patch.multiple("load", **stages):
+        load_data_into_database(DataFrame(), conn)
+
+    conn.commit.assert_called_once()
+    assert stages["update_station"].call_args.args[2] is False
+    assert stages["update_train_stop"].call_args.kwargs["commit"] is False
+    assert (stages["update_train_service"].call_args.args[3]
+            is stages["update_cancellation"].call_args.args[3])
+
+
+def test_load_data_into_database_rolls_back_everything_on_failure():
+    """Test that a failing stage rolls back the whole load and clears cached lookups."""
+    conn = MagicMock()
+    load._dimension_cache["station"] = (0, DataFrame())
+    stages = {stage: MagicMock() for stage in STAGES}
+    stages["update_train_stop"].side_effect = DatabaseError("failed")
+
+    with patch.multiple("load", **stages), pytest.raises(DatabaseError):
+        load_data_into_database(DataFrame(), conn)
+
+    conn.commit.assert_not_called()
+    conn.rollback.assert_called_once()
+    stages["update_cancellation"].assert_not_called()
+    assert load._dimension_cache == {}
+
+
+def test_load_data_into_database_flushes_alerts_after_commit():
+    """Test that queued delay alerts are only handed off once the load has committed."""
+    conn = MagicMock()
+    events = MagicMock()
+    conn.commit = events.commit
+    stages = {stage: MagicMock() for stage in STAGES}
+    with patch.multiple("load", **stages), \
+            patch("load.flush_notifications", events.flush):
+        load_data_into_database(DataFrame(), conn)
+
+    assert [name for name, _, _ in events.mock_calls] == ["commit", "flush"]
+
+
+def test_load_data_into_database_discards_alerts_on_failure():
+    """Test that the alerts of a rolled back load are never sent."""
+    stages = {stage: MagicMock() for stage in STAGES}
+    stages["update_cancellation"].side_effect = DatabaseError("failed")
+
+    with patch.multiple("load", **stages), \
+            patch("load.flush_notifications") as mock_flush, \
+            patch("load.discard_notifications") as mock_discard, \
+            pytest.raises(DatabaseError):
+        load_data_into_database(DataFrame(), MagicMock())
+
+    mock_flush.assert_not_called()
+    mock_discard.assert_called_once()
+
+
+def test_load_data_into_database_reads_server_side_setting():
+    """Test that SERVER_SIDE_DIFF turns on the server-side diff for the diffed stages."""
+    stages = {stage: MagicMock() for stage in STAGES}
+    with patch.multiple("load", **stages), \
+            patch.dict("os.environ", {"SERVER_SIDE_DIFF": "true"}):
+        load_data_into_database(DataFrame(), MagicMock())
+
+    for name in ("update_route", "update_train_service", "update_cancellation"):
+        assert stages[name].call_args.kwargs["server_side"] is True
+
+
+def test_load_data_into_database_can_commit_each_stage():
+    """Test that stages commit on their own when single_transaction is off."""
+    conn = MagicMock()
+    stages = {stage: MagicMock() for stage in STAGES}
+    with patch.multiple("load", **stages):
+        load_data_into_database(DataFrame(), conn, single_transaction=False)
+
+    conn.commit.assert_not_called()
+    assert stages["update_station"].call_args.args[2] is True
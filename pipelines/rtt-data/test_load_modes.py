@@ -0,0 +1,87 @@
+"""Checks that the Python and server-side load paths write the same rows.
+
+These run the whole load against a real Postgres, so they are skipped unless
+TEST_DB_HOST, TEST_DB_PORT, TEST_DB_NAME, TEST_DB_USER and TEST_DB_PASSWORD
+point at a throwaway database. Every table in it is dropped and recreated."""
+# pylint: skip-file
+
+from os import environ as ENV
+from pathlib import Path
+
+import pytest
+from psycopg2 import connect
+from psycopg2.extras import RealDictCursor
+
+from extract import build_service_dataframe
+from transform import transform_train_data
+from load import load_data_into_database, invalidate_dimension_cache, invalidate_partition_cache
+
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / "architecture" / "database" / "schema.sql"
+
+pytestmark = pytest.mark.skipif("TEST_DB_HOST" not in ENV,
+                                reason="needs a throwaway Postgres in TEST_DB_*")
+
+
+def make_service(uid, departure, station_cancel_reason=None):
+    location_detail = {
+        "gbttBookedDeparture": departure, "realtimeDeparture": departure,
+        "gbttBookedArrival": departure, "realtimeArrival": departure,
+        "platform": "1", "platformChanged": False,
+        "origin": [{"description": "London Paddington"}],
+        "destination": [{"description": "Bristol Temple Meads"}]
+    }
+    if station_cancel_reason:
+        location_detail["cancelReasonCode"] = "X"
+        location_detail["cancelReasonLongText"] = station_cancel_reason
+    return {"serviceUid": uid, "trainIdentity": "1A01", "atocName": "GWR",
+            "runDate": "2025-06-14", "serviceType": "train", "locationDetail": location_detail}
+
+
+def make_batch(reason):
+    """Returns a transformed batch with A1 cancelled at Reading only."""
+    return transform_train_data(build_service_dataframe([
+        ("PAD", {"location": {"name": "London Paddington"},
+                 "services": [make_service("A1", "1200"), make_service("A2", "1230")]}),
+        ("RDG", {"location": {"name": "Reading"},
+                 "services": [make_service("A1", "1225", reason), make_service("A2", "1255")]}),
+        ("BRI", {"location": {"name": "Bristol Temple Meads"},
+                 "services": [make_service("A1", "1345")]})
+    ]))
+
+
+@pytest.fixture
+def conn():
+    conn = connect(host=ENV["TEST_DB_HOST"], port=ENV.get("TEST_DB_PORT", "5432"),
+                   dbname=ENV["TEST_DB_NAME"], user=ENV["TEST_DB_USER"],
+                   password=ENV.get("TEST_DB_PASSWORD", ""), cursor_factory=RealDictCursor)
+    yield conn
+    conn.close()
+    invalidate_dimension_cache()
+    invalidate_partition_cache()
+
+
+def load_and_read_cancellations(conn, server_side: bool) -> list[tuple]:
+    """Loads two batches into an empty schema and returns the cancellation rows."""
+    with conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_PATH.read_text())
+    invalidate_dimension_cache()
+    invalidate_partition_cache()
+    for reason in ("a problem", "a different problem"):
+        load_data_into_database(make_batch(reason), conn, notify=False, server_side=server_side)
+    with conn.cursor() as cur:
+        cur.execute("""SELECT ts.service_uid, cancellation.service_date,
+                              station.station_name, cancellation.reason
+                       FROM cancellation
+                       JOIN train_stop AS stop ON stop.train_stop_id = cancellation.train_stop_id
+                       JOIN train_service AS ts ON ts.train_service_id = stop.train_service_id
+                       JOIN station ON station.station_id = stop.station_id
+                       ORDER BY 1, 2, 3;""")
+        return [tuple(row.values()) for row in cur.fetchall()]
+
+
+def test_both_modes_write_the_same_cancellations(conn):
+    python_rows = load_and_read_cancellations(conn, server_side=False)
+    server_side_rows = load_and_read_cancellations(conn, server_side=True)
+
+    assert python_rows == server_side_rows
+    assert [row[2:] for row in python_rows] == [("Reading", "a different problem")]
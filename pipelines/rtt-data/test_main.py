@@ -0,0 +1,37 @@
+"""Unit testing for the functions in main.py."""
+# pylint: skip-file
+
+from unittest.mock import patch, MagicMock
+
+from main import get_fetch_deadline, replay
+
+
+def test_get_fetch_deadline_is_none_outside_lambda():
+    """Test that local runs have no fetch deadline."""
+    assert get_fetch_deadline(None) is None
+
+
+def test_get_fetch_deadline_keeps_load_reserve():
+    """Test that the reserve is taken off the remaining Lambda time."""
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = 240000
+    with patch("main.monotonic", return_value=1000.0), \
+            patch.dict("os.environ", {"LOAD_RESERVE_MS": "40000"}):
+        assert get_fetch_deadline(context) == 1200.0
+
+
+def test_replay_loads_each_archived_run_without_alerts():
+    """Test that every archived minute is transformed and loaded without notifications."""
+    runs = [("12:30", [("PAD", {})]), ("12:31", [("RDG", {})])]
+    transformed = MagicMock(empty=False)
+    with patch("main.iter_archived_runs", return_value=iter(runs)), \
+            patch("main.get_connection") as mock_connection, \
+            patch("main.build_service_dataframe") as mock_build, \
+            patch("main.transform_train_data", return_value=transformed), \
+            patch("main.load_data_into_database") as mock_load:
+        assert replay("/tmp/archive") == 2
+
+    assert mock_build.call_args_list[1].args == ([("RDG", {})],)
+    conn = mock_connection.return_value.__enter__.return_value
+    mock_load.assert_called_with(transformed, conn, notify=False)
+    assert mock_load.call_count == 2
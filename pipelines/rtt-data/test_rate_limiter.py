@@ -0,0 +1,97 @@
+"""Unit testing for the functions in rate_limiter.py."""
+# pylint: skip-file
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from rate_limiter import (reserve_token, acquire_token, acquire_token_async,
+                          get_wait_stats, reset_rate_limiter)
+
+LIMIT_ENV = {"RTT_RATE_LIMIT": "2", "RTT_RATE_BURST": "2"}
+
+
+@pytest.fixture(autouse=True)
+def full_bucket():
+    reset_rate_limiter()
+    with patch.dict("os.environ", LIMIT_ENV):
+        yield
+    reset_rate_limiter()
+
+
+def test_burst_is_served_without_waiting():
+    with patch("rate_limiter.monotonic", return_value=100.0):
+        assert [reserve_token() for _ in range(2)] == [0.0, 0.0]
+
+
+def test_waiters_queue_behind_each_other():
+    with patch("rate_limiter.monotonic", return_value=100.0):
+        waits = [reserve_token() for _ in range(4)]
+    assert waits == [0.0, 0.0, 0.5, 1.0]
+
+
+def test_bucket_refills_over_time():
+    with patch("rate_limiter.monotonic", return_value=100.0):
+        reserve_token()
+        reserve_token()
+    with patch("rate_limiter.monotonic", return_value=100.5):
+        assert reserve_token() == 0.0
+
+
+def test_zero_rate_disables_limiting():
+    with patch.dict("os.environ", {"RTT_RATE_LIMIT": "0"}):
+        assert all(reserve_token() == 0.0 for _ in range(50))
+
+
+def test_wait_stats_record_waiting_requests():
+    with patch("rate_limiter.monotonic", return_value=100.0):
+        for _ in range(4):
+            reserve_token()
+    stats = get_wait_stats()
+    assert stats["requests"] == 4
+    assert stats["waited"] == 2
+    assert stats["total_wait_seconds"] == 1.5
+    assert stats["max_wait_seconds"] == 1.0
+
+
+def test_acquire_token_sleeps_for_the_reserved_wait():
+    with patch("rate_limiter.monotonic", return_value=100.0), \
+            patch("rate_limiter.sleep") as mock_sleep:
+        for _ in range(3):
+            acquire_token()
+    mock_sleep.assert_called_once_with(0.5)
+
+
+def test_acquire_token_raises_when_wait_passes_deadline():
+    with patch("rate_limiter.monotonic", return_value=100.0), \
+            patch("rate_limiter.sleep") as mock_sleep:
+        reserve_token()
+        reserve_token()
+        with pytest.raises(TimeoutError):
+            acquire_token(deadline=100.2)
+    mock_sleep.assert_not_called()
+
+
+def test_acquire_token_async_waits_with_asyncio_sleep():
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    async def acquire_all():
+        await asyncio.gather(*(acquire_token_async() for _ in range(3)))
+
+    with patch("rate_limiter.monotonic", return_value=100.0), \
+            patch("asyncio.sleep", side_effect=fake_sleep):
+        asyncio.run(acquire_all())
+    assert sleeps == [0.5]
+
+
+def test_tokens_are_not_handed_out_twice_across_threads():
+    with patch.dict("os.environ", {"RTT_RATE_LIMIT": "1", "RTT_RATE_BURST": "1"}), \
+            patch("rate_limiter.monotonic", return_value=100.0):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            waits = sorted(executor.map(lambda _: reserve_token(), range(20)))
+    assert waits == [float(n) for n in range(20)]
@@ -0,0 +1,37 @@
+"""Unit testing for the synthetic payload generator in benchmarks/synthetic.py."""
+# pylint: skip-file
+
+from datetime import date
+
+from benchmarks.synthetic import make_payloads, format_time
+from extract import build_service_dataframe
+from transform import transform_train_data
+
+
+def test_format_time_wraps_past_midnight():
+    assert format_time(24 * 60 + 5) == "0005"
+    assert format_time(12 * 60 + 30, half_minute=True) == "1230H"
+
+
+def test_make_payloads_is_repeatable():
+    assert make_payloads(5, 50, seed=3) == make_payloads(5, 50, seed=3)
+
+
+def test_make_payloads_covers_edge_cases():
+    payloads = make_payloads(20, 1000, seed=0, service_date=date(2024, 5, 1))
+    data = build_service_dataframe(payloads)
+
+    assert [crs for crs, _ in payloads] == sorted(set(data["station_crs"]))
+    assert data["cancelled"].any()
+    assert data["platform_changed"].any()
+    assert (data["service_type"] != "train").any()
+    assert data["actual_dep_time"].isna().any()
+    assert (data["scheduled_dep_time"] < "0100").any()
+    assert data.groupby("service_uid")["station_crs"].nunique().max() > 1
+
+
+def test_make_payloads_survive_transform():
+    data = build_service_dataframe(make_payloads(10, 200, seed=1))
+    transformed = transform_train_data(data)
+    assert 0 < len(transformed) <= len(data)
+    assert transformed["scheduled_dep_time"].notna().all()
@@ -1,7 +1,7 @@
 # pylint: skip-file
 """Unit testing for the functions in transform.py."""
 
-from datetime import date, time
+from datetime import date
 import pandas as pd
 import pytest
 from pandas import DataFrame
@@ -12,9 +12,12 @@ from transform import (
     filter_trains,
     drop_rows_with_missing_critical_data,
     convert_time_columns,
+    parse_rtt_times,
     convert_date_column,
     convert_platform_changed_to_bool,
     convert_cancelled_to_bool,
+    convert_to_categories,
+    CATEGORY_COLUMNS,
     transform_train_data
 )
 
@@ -42,8 +45,43 @@ def test_drop_rows_with_missing_critical_data_removes_incomplete_rows(test_data)
 
 def test_convert_time_columns(test_data):
     test_df = convert_time_columns(test_data.copy())
-    assert test_df["scheduled_arr_time"].iloc[0].hour == 12
-    assert test_df["actual_arr_time"].iloc[0].minute == 45
+    assert test_df["scheduled_arr_time"].iloc[0] == 12 * 3600 + 30 * 60
+    assert test_df["actual_arr_time"].iloc[0] % 3600 == 45 * 60
+    assert str(test_df["scheduled_arr_time"].dtype) == "Int32"
+
+
+@pytest.mark.parametrize("input_value,expected", [
+    ("1230", 45000),
+    ("0000", 0),
+    ("2359", 86340),
+    ("123045", 45045),
+    ("1230H", 45030),
+    (" 0001 ", 60),
+])
+def test_parse_rtt_times_valid_values(input_value, expected):
+    result = parse_rtt_times(pd.Series([input_value]))
+    assert result.iloc[0] == expected
+
+
+@pytest.mark.parametrize("input_value", [
+    "2400", "1260", "123060", "123045H", "12a0", "123", "", None, np.nan
+])
+def test_parse_rtt_times_masks_invalid_values(input_value):
+    result = parse_rtt_times(pd.Series([input_value], dtype=object))
+    assert result.isna().iloc[0]
+
+
+def test_parse_rtt_times_keeps_index_and_uses_integer_seconds():
+    result = parse_rtt_times(pd.Series(["1230", None], index=[4, 9]))
+    assert result.index.tolist() == [4, 9]
+    assert str(result.dtype) == "Int32"
+
+
+def test_convert_time_columns_sets_invalid_times_to_na(test_data):
+    test_df = test_data.copy()
+    test_df.loc[0, "actual_dep_time"] = "2460"
+    test_df = convert_time_columns(test_df)
+    assert test_df["actual_dep_time"].iloc[0] is pd.NA
 
 
 def test_convert_date_column(test_data):
@@ -83,10 +121,34 @@ def test_convert_platform_changed_to_bool(input_value, expected):
     assert result["platform_changed"].iloc[0] == expected
 
 
+def test_convert_cancelled_to_bool_keeps_unknown_values_missing():
+    test_df = DataFrame({"cancelled": ["maybe", True]})
+    result = convert_cancelled_to_bool(test_df)
+    assert str(result["cancelled"].dtype) == "boolean"
+    assert result["cancelled"].isna().tolist() == [True, False]
+
+
+def test_convert_to_categories(test_data):
+    result = convert_to_categories(test_data.copy())
+    for col in CATEGORY_COLUMNS:
+        assert isinstance(result[col].dtype, pd.CategoricalDtype)
+    assert result["station_crs"].iloc[0] == test_data["station_crs"].iloc[0]
+
+
 def test_transform_train_data_success(test_data):
     result = transform_train_data(test_data.copy())
 
     assert "service_type" not in result.columns
-    assert isinstance(result["scheduled_arr_time"].iloc[0], time)
-    assert isinstance(result["actual_dep_time"].iloc[0], time)
+    assert str(result["scheduled_arr_time"].dtype) == "Int32"
+    assert str(result["actual_dep_time"].dtype) == "Int32"
+    assert str(result["cancelled"].dtype) == "boolean"
+    assert isinstance(result["station_name"].dtype, pd.CategoricalDtype)
     assert isinstance(result["service_date"].iloc[0], date)
+
+
+def test_transform_train_data_drops_unreadable_booleans(test_data):
+    test_df = test_data.copy()
+    test_df["platform_changed"] = test_df["platform_changed"].astype(object)
+    test_df.loc[0, "platform_changed"] = "maybe"
+    result = transform_train_data(test_df)
+    assert len(result) == len(test_data) - 1
@@ -1,20 +1,11 @@
 """Script to clean the raw train data."""
 import logging
 
-from datetime import datetime, time
-
 from dotenv import load_dotenv
 
+import numpy as np
 import pandas as pd
-from pandas import DataFrame
-
-from extract import fetch_train_data
-
-logging.basicConfig(
-    level="DEBUG",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
+from pandas import DataFrame, Series
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +18,17 @@ REQUIRED_COLUMNS = [
     "service_type"
 ]
 
+TIME_COLUMNS = [
+    "scheduled_arr_time", "actual_arr_time",
+    "scheduled_dep_time", "actual_dep_time"
+]
+
+# Low-cardinality text repeated on every row, stored once per distinct value.
+CATEGORY_COLUMNS = [
+    "station_name", "station_crs", "operator_name",
+    "origin_name", "destination_name", "platform"
+]
+
 CRITICAL_COLUMNS = [
     "service_uid", "train_identity", "station_name", "station_crs",
     "origin_name", "destination_name", "operator_name", "service_date",
@@ -62,25 +64,39 @@ def drop_rows_with_missing_critical_data(data: DataFrame) -> DataFrame:
     return valid_data
 
 
+def parse_rtt_times(times: Series) -> Series:
+    """Parses RTT time strings into whole seconds since midnight.
+
+    Handles `HHMM`, `HHMMSS` and half-minute `HHMMH` values in bulk, parsing
+    each distinct value once. Missing or invalid values are masked as <NA>
+    rather than raising."""
+    codes, uniques = pd.factorize(times)
+    text = Series(uniques, dtype="string").str.strip()
+    half_minute = text.str.endswith("H").fillna(False).to_numpy(dtype=bool)
+    digits = text.str.removesuffix("H")
+    is_digits = digits.str.fullmatch(r"\d{4}|\d{6}").fillna(False).to_numpy(dtype=bool)
+    has_seconds = (digits.str.len() == 6).fillna(False).to_numpy(dtype=bool)
+
+    number = pd.to_numeric(digits.where(is_digits), errors="coerce").to_numpy(
+        dtype="float64", na_value=np.nan)
+    hours = np.where(has_seconds, number // 10000, number // 100)
+    minutes = np.where(has_seconds, number // 100 % 100, number % 100)
+    seconds = np.where(has_seconds, number % 100, 0) + np.where(half_minute, 30, 0)
+
+    valid = is_digits & (hours < 24) & (minutes < 60) & (seconds < 60) & \
+        ~(has_seconds & half_minute)
+    unique_seconds = np.where(valid, hours * 3600 + minutes * 60 + seconds, np.nan)
+    # Missing values get code -1, which picks out the trailing NaN.
+    unique_seconds = np.append(unique_seconds, np.nan)
+    return Series(unique_seconds[codes], index=times.index).astype("Int32")
+
+
 def convert_time_columns(data: DataFrame) -> DataFrame:
-    """Returning a dataframe with correct time column formats."""
-    time_columns = [
-        'scheduled_arr_time', 'actual_arr_time',
-        'scheduled_dep_time', 'actual_dep_time'
-    ]
-
-    def convert_hhmm_to_time(time_string) -> time:
-        if pd.isna(time_string) or time_string == '':
-            return None
-        try:
-            return datetime.strptime(time_string, '%H%M').time()
-        except ValueError:
-            return None
-
-    for col in time_columns:
+    """Returning a dataframe with time columns as Int32 seconds since midnight."""
+    for col in TIME_COLUMNS:
         logger.debug("Changing %s column to have correct time format.", col)
         if col in data.columns:
-            data[col] = data[col].apply(convert_hhmm_to_time)
+            data[col] = parse_rtt_times(data[col])
     logger.info("All time format changes applied.")
     return data
 
@@ -99,7 +115,7 @@ def convert_platform_changed_to_bool(data: DataFrame) -> DataFrame:
     logger.debug("Changing all platform_changed rows to boolean data type.")
     data["platform_changed"] = data["platform_changed"].astype(str).str.lower().map(
         {"true": True, "1": True, "false": False, "0": False}
-    ).astype(bool)
+    ).astype("boolean")
     logger.info("Changes to platform_changed have been applied.")
     return data
 
@@ -109,22 +125,33 @@ def convert_cancelled_to_bool(data: DataFrame) -> DataFrame:
     logger.debug("Changing all cancelled rows to boolean data type.")
     data["cancelled"] = data["cancelled"].astype(str).str.lower().map(
         {"true": True, "1": True, "false": False, "0": False}
-    ).astype(bool)
+    ).astype("boolean")
     logger.info("Changes to cancelled have been applied.")
     return data
 
 
+def convert_to_categories(data: DataFrame) -> DataFrame:
+    """Returning a dataframe with the repeated text columns stored as categoricals."""
+    logger.debug("Changing %s to categorical data type.", CATEGORY_COLUMNS)
+    for col in CATEGORY_COLUMNS:
+        data[col] = data[col].astype("category")
+    logger.info("Changes to categorical columns have been applied.")
+    return data
+
+
 def transform_train_data(data: DataFrame) -> DataFrame:
     """Returns fully transformed data for load stage of ETL."""
     try:
         logger.info("Starting transform.")
         check_all_required_columns_present(data)
         data = filter_trains(data)
-        data = drop_rows_with_missing_critical_data(data)
         data = convert_time_columns(data)
         data = convert_date_column(data)
         data = convert_platform_changed_to_bool(data)
         data = convert_cancelled_to_bool(data)
+        # Run after the conversions so unreadable dates and booleans are dropped too.
+        data = drop_rows_with_missing_critical_data(data)
+        data = convert_to_categories(data)
         logger.info("Data has been transformed successfully.")
         logger.info("Final row count after transformation: %s", len(data))
         return data
@@ -134,6 +161,13 @@ def transform_train_data(data: DataFrame) -> DataFrame:
 
 
 if __name__ == "__main__":
+    from extract import fetch_train_data  # pylint: disable=import-outside-toplevel
+
+    logging.basicConfig(
+        level="DEBUG",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S"
+    )
     load_dotenv()
     stations = ['PAD', 'RDG', 'DID', 'SWI', 'CPM', 'BTH', 'BRI']
     result = fetch_train_data(stations)
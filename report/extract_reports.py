@@ -7,13 +7,9 @@ from psycopg2 import connect, OperationalError
 from psycopg2.extras import RealDictCursor
 from psycopg2.extensions import connection as Connection
 
-logger = logging.getLogger(__name__)
+from shared.metrics import counting_cursor
 
-logging.basicConfig(
-    level="WARNING",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
+logger = logging.getLogger(__name__)
 
 
 def get_db_connection() -> Connection:
@@ -26,7 +22,7 @@ def get_db_connection() -> Connection:
             host=ENV["DB_HOST"],
             port=ENV["DB_PORT"],
             database=ENV["DB_NAME"],
-            cursor_factory=RealDictCursor
+            cursor_factory=counting_cursor(RealDictCursor)
         )
         logging.info("Successfully retrieved database connection.")
     except OperationalError:
@@ -86,9 +82,9 @@ def get_days_data_per_station(station_crs: str, conn: Connection) -> list[dict]:
             JOIN station AS s
             USING (station_id)
             JOIN train_service
-            USING (train_service_id)
+            USING (train_service_id, service_date)
             LEFT JOIN cancellation
-            USING (train_stop_id)
+            USING (train_stop_id, service_date)
             WHERE s.station_id = %s
             AND service_date = current_date - 1;
             """
@@ -11,12 +11,6 @@ from report import generate_pdf
 
 logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level="WARNING",
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S"
-)
-
 
 def get_s3_client() -> client:
     """Returns an S3 client using boto3."""
@@ -15,15 +15,18 @@ from extract_reports import get_db_connection, get_days_data_per_station
 from transform_summary import get_station_summary
 from report import generate_pdf, get_email_message_as_string
 from load_reports import load_new_report, get_s3_client
+from shared.metrics import (stage, record_rows, reset_metrics, emit_metrics,
+                            counting_cursor, configure_metrics)
 
 logger = logging.getLogger()
 logger.setLevel("DEBUG")
+configure_metrics("reports")
 
 
 def get_station_name_crs_tuples(conn: Connection) -> list[tuple]:
     """Retrieves name and crs for each station in the database as list of tuples."""
 
-    with conn.cursor(cursor_factory=DictCursor) as curs:
+    with conn.cursor(cursor_factory=counting_cursor(DictCursor)) as curs:
         curs.execute("SELECT station_name, station_crs FROM station;")
         station_names = curs.fetchall()
 
@@ -86,30 +89,40 @@ def run_full_email_pipeline() -> None:
         stations = get_station_name_crs_tuples(conn)
 
         for station in stations:
-            data = get_days_data_per_station(station[1], conn)
+            with stage("extract"):
+                data = get_days_data_per_station(station[1], conn)
+                record_rows(len(data or []))
             if data:
-                transformed_data = get_station_summary(DataFrame(data))
+                with stage("transform"):
+                    transformed_data = get_station_summary(DataFrame(data))
 
-                report = generate_pdf(station[0], transformed_data)
-                load_new_report(s3_client, station[0], transformed_data)
-                msg = get_email_message_as_string(station[0], report)
+                with stage("pdf"):
+                    report = generate_pdf(station[0], transformed_data)
+                with stage("load"):
+                    load_new_report(s3_client, station[0], transformed_data)
 
-                topic_arn = get_sns_topic_arn_by_station(
-                    sns_client, station[1])
-                emails = get_subscriber_emails_from_topic(
-                    sns_client, topic_arn)
+                with stage("email"):
+                    msg = get_email_message_as_string(station[0], report)
+                    topic_arn = get_sns_topic_arn_by_station(
+                        sns_client, station[1])
+                    emails = get_subscriber_emails_from_topic(
+                        sns_client, topic_arn)
 
-                if emails:
-                    sent_status = send_report_emails(ses_client, emails, msg)
-                    logging.info("%s", sent_status)
+                    if emails:
+                        sent_status = send_report_emails(ses_client, emails, msg)
+                        record_rows(len(emails))
+                        logging.info("%s", sent_status)
 
 
 def lambda_handler(event, context) -> None:
     """AWS Lambda handler that runs the ETL pipeline for summary reports."""
     load_dotenv()
+    reset_metrics()
 
     try:
         run_full_email_pipeline()
         logging.info("Email pipeline successfully run.")
     except Exception as e:
         logging.info(f"Error running email pipeline: {str(e)}")
+    finally:
+        emit_metrics()
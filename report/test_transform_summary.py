@@ -1,5 +1,6 @@
 """Tests for transform script to create PDF summary report."""
 
+import datetime as dt
 from datetime import timedelta as td
 
 import pandas as pd
@@ -11,20 +12,26 @@ from transform_summary import (get_pct_trains_dep_delayed_five_mins,
                                get_avg_dep_delay_delayed_trains,
                                get_avg_arr_delay_delayed_trains,
                                convert_timedelta_to_str,
-                               convert_train_times_to_date_times)
+                               get_delays)
 
 
-# convert_train_times_to_date_times() tests
+# get_delays() tests
 
-def test_convert_train_times_to_date_times_null_cols(past_day_data_null_time_columns):
+def test_get_delays_null_cols(past_day_data_null_time_columns):
     """Tests that null values in a column do not raise an error and are left as na."""
 
-    res = convert_train_times_to_date_times(past_day_data_null_time_columns)
+    assert get_delays(past_day_data_null_time_columns, "arr").isna().tolist() == [True, False]
+    assert get_delays(past_day_data_null_time_columns, "dep").isna().tolist() == [False, True]
 
-    assert res["scheduled_arr_time"].isna().sum() == 1
-    assert res["actual_arr_time"].isna().sum() == 1
-    assert res["scheduled_dep_time"].isna().sum() == 1
-    assert res["actual_dep_time"].isna().sum() == 1
+
+def test_get_delays_past_midnight():
+    """Tests that a train due before midnight and leaving after it is counted as late."""
+
+    data = pd.DataFrame([{"scheduled_dep_time": dt.time(23, 58),
+                          "actual_dep_time": dt.time(0, 4)}])
+
+    assert get_delays(data, "dep").tolist() == [360.0]
+    assert get_pct_trains_dep_delayed_five_mins(data) == 100
 
 # convert_timedelta_to_str() tests
 
@@ -2,24 +2,19 @@
 
 import datetime as dt
 
-from pandas import DataFrame
-import pandas as pd
+from pandas import DataFrame, Series
 
+from shared.delays import delay_seconds
 
-def convert_train_times_to_date_times(data: DataFrame) -> DataFrame:
-    """Convert time columns to datetime objects to allow maths operations."""
-    train_date = data.loc[0, "service_date"]
+FIVE_MINUTES = 5 * 60
 
-    time_columns = ["scheduled_arr_time", "actual_arr_time",
-                    "scheduled_dep_time", "actual_dep_time"]
 
-    for column in time_columns:
-        data[column] = data[column].apply(
-            lambda t: (dt.datetime.combine(train_date, t.time()if isinstance(
-                t, dt.datetime) else t) if pd.notna(t) else pd.NaT)
-        )
+def get_delays(data: DataFrame, event: str) -> Series:
+    """Returns each train's departure ("dep") or arrival ("arr") delay in seconds.
 
-    return data
+    Delays are NaN where a time is missing. They come from the shared delay
+    engine, so a train that runs past midnight is late rather than a day early."""
+    return delay_seconds(data[f"scheduled_{event}_time"], data[f"actual_{event}_time"])
 
 
 def convert_timedelta_to_str(td: dt.timedelta) -> str:
@@ -40,21 +35,15 @@ def convert_timedelta_to_str(td: dt.timedelta) -> str:
 def get_pct_trains_dep_delayed_five_mins(data: DataFrame) -> float:
     """Gets the percentage of trains with departure delayed by five or more minutes."""
 
-    data = convert_train_times_to_date_times(data)
-
-    delayed_trains = len(data[data["actual_dep_time"] >=
-                         data["scheduled_dep_time"]+dt.timedelta(minutes=5)])
+    delayed_trains = int((get_delays(data, "dep") >= FIVE_MINUTES).sum())
 
     return delayed_trains/len(data) * 100
 
 
 def get_pct_trains_arr_delayed_five_mins(data: DataFrame) -> float:
-    """Gets the percentage of trains with departure delayed by five or more minutes."""
-
-    data = convert_train_times_to_date_times(data)
+    """Gets the percentage of trains with arrival delayed by five or more minutes."""
 
-    delayed_trains = len(data[data["actual_arr_time"] >=
-                              data["scheduled_arr_time"]+dt.timedelta(minutes=5)])
+    delayed_trains = int((get_delays(data, "arr") >= FIVE_MINUTES).sum())
 
     return delayed_trains/len(data) * 100
 
@@ -70,14 +59,10 @@ def get_pct_trains_cancelled(data: DataFrame) -> float:
 def get_avg_dep_delay_all_trains(data: DataFrame) -> str:
     """Gets the average departure delay of all trains as %H:%M:%S string."""
 
-    data = convert_train_times_to_date_times(data)
+    delays = get_delays(data, "dep")
+    total_delays = delays[delays > 0].sum()
 
-    data['dep_delay'] = data["actual_dep_time"] - data["scheduled_dep_time"]
-    delayed_trains = data[data['dep_delay'] > dt.timedelta(0, 0)]
-
-    total_delays = sum(delayed_trains['dep_delay'], dt.timedelta())
-
-    avg_delay = total_delays/len(data)
+    avg_delay = dt.timedelta(seconds=total_delays/len(data))
 
     return convert_timedelta_to_str(avg_delay)
 
@@ -85,14 +70,10 @@ def get_avg_dep_delay_all_trains(data: DataFrame) -> str:
 def get_avg_arr_delay_all_trains(data: DataFrame) -> str:
     """Gets the average arrival delay of all trains as %H:%M:%S string."""
 
-    data = convert_train_times_to_date_times(data)
-
-    data['arr_delay'] = data["actual_arr_time"] - data["scheduled_arr_time"]
-    delayed_trains = data[data['arr_delay'] > dt.timedelta(0, 0)]
+    delays = get_delays(data, "arr")
+    total_delays = delays[delays > 0].sum()
 
-    total_delays = sum(delayed_trains['arr_delay'], dt.timedelta())
-
-    avg_delay = total_delays/len(data)
+    avg_delay = dt.timedelta(seconds=total_delays/len(data))
 
     return convert_timedelta_to_str(avg_delay)
 
@@ -100,15 +81,11 @@ def get_avg_arr_delay_all_trains(data: DataFrame) -> str:
 def get_avg_dep_delay_delayed_trains(data: DataFrame) -> str:
     """Gets the average departure delay of trains delayed at least one minute as %H:%M:%S string."""
 
-    data = convert_train_times_to_date_times(data)
-
-    data['dep_delay'] = data["actual_dep_time"] - data["scheduled_dep_time"]
-    delayed_trains = data[data['dep_delay'] > dt.timedelta(0, 0)]
-
-    total_delays = sum(delayed_trains['dep_delay'], dt.timedelta())
+    delays = get_delays(data, "dep")
+    delayed_trains = delays[delays > 0]
 
     if len(delayed_trains):
-        avg_delay = total_delays/len(delayed_trains)
+        avg_delay = dt.timedelta(seconds=delayed_trains.mean())
         return convert_timedelta_to_str(avg_delay)
 
     return "00:00:00"
@@ -117,15 +94,11 @@ def get_avg_dep_delay_delayed_trains(data: DataFrame) -> str:
 def get_avg_arr_delay_delayed_trains(data: DataFrame) -> str:
     """Gets the average arrival delay of trains delayed at least one minute as %H:%M:%S string."""
 
-    data = convert_train_times_to_date_times(data)
-
-    data['arr_delay'] = data["actual_arr_time"] - data["scheduled_arr_time"]
-    delayed_trains = data[data['arr_delay'] > dt.timedelta(0, 0)]
-
-    total_delays = sum(delayed_trains['arr_delay'], dt.timedelta())
+    delays = get_delays(data, "arr")
+    delayed_trains = delays[delays > 0]
 
     if len(delayed_trains):
-        avg_delay = total_delays/len(delayed_trains)
+        avg_delay = dt.timedelta(seconds=delayed_trains.mean())
         return convert_timedelta_to_str(avg_delay)
 
     return "00:00:00"
@@ -0,0 +1,29 @@
+"""The Parquet schema of archived train stops.
+
+The archive pipeline writes its files with this schema, and the dashboard
+reads them back with it, so an archive with no files yet still has columns."""
+
+import pyarrow as pa
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("train_stop_id", pa.int64()),
+    ("service_uid", pa.string()),
+    ("train_identity", pa.string()),
+    ("service_date", pa.date32()),
+    ("station_name", pa.string()),
+    ("station_crs", pa.string()),
+    ("origin_name", pa.string()),
+    ("destination_name", pa.string()),
+    ("operator_name", pa.string()),
+    ("scheduled_arr_time", pa.time64("us")),
+    ("actual_arr_time", pa.time64("us")),
+    ("scheduled_dep_time", pa.time64("us")),
+    ("actual_dep_time", pa.time64("us")),
+    ("platform", pa.string()),
+    ("platform_changed", pa.bool_()),
+    ("cancelled", pa.bool_()),
+    ("cancel_reason", pa.string())
+])
+
+# Each month's files sit under service_month=YYYY-MM, read back as a string column.
+MONTH_PARTITION_SCHEMA = pa.schema([("service_month", pa.string())])
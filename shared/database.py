@@ -0,0 +1,90 @@
+"""The database connection each pipeline's Lambda keeps between invocations.
+
+The connection lives at module level so warm invocations skip the TLS
+handshake and authentication, and is health checked before each reuse. It
+connects through DB_PROXY_HOST when that is set, and otherwise to DB_HOST.
+Every cursor counts its statements as database round trips in the stage
+metrics."""
+
+import logging
+from os import environ as ENV
+
+from psycopg2 import connect, DatabaseError
+from psycopg2.extensions import (connection as Connection, cursor as Cursor,
+                                  TRANSACTION_STATUS_IDLE)
+
+from shared.metrics import counting_cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5
+
+_connection: dict[str, Connection | None] = {"conn": None}
+
+
+def connect_to_database(cursor_class: type = Cursor) -> Connection:
+    """Opens a new database connection, whose cursors derive from cursor_class."""
+    logger.info("Establishing connection to database...")
+    try:
+        conn = connect(
+            dbname=ENV["DB_NAME"],
+            user=ENV["DB_USER"],
+            password=ENV["DB_PASSWORD"],
+            host=ENV.get("DB_PROXY_HOST") or ENV["DB_HOST"],
+            port=ENV["DB_PORT"],
+            connect_timeout=int(ENV.get("DB_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+            cursor_factory=counting_cursor(cursor_class)
+        )
+        logger.info("Successfully connected to database.")
+        return conn
+    except DatabaseError as e:
+        logger.error("Failed to connect to database: %s", e)
+        raise
+
+
+def is_connection_healthy(conn: Connection) -> bool:
+    """Returns whether a kept connection can be used for another run.
+
+    Any transaction left open is rolled back. Outside proxy mode a SELECT 1
+    confirms the server is still there; a pgbouncer or RDS Proxy endpoint
+    keeps its own server connections healthy, so only the client side is checked."""
+    if conn.closed:
+        return False
+    try:
+        if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        if not ENV.get("DB_PROXY_HOST"):
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        return True
+    except DatabaseError as e:
+        logger.warning("Kept database connection failed its health check: %s", e)
+        return False
+
+
+def get_connection(cursor_class: type = Cursor) -> Connection:
+    """Returns the kept database connection, reconnecting if it is missing or unhealthy.
+
+    cursor_class is only used when a new connection is opened. Using the
+    connection as a context manager commits or rolls back the run's
+    transaction but leaves the connection open."""
+    conn = _connection["conn"]
+    if conn is not None and is_connection_healthy(conn):
+        logger.debug("Reusing database connection.")
+        return conn
+    close_connection()
+    conn = connect_to_database(cursor_class)
+    _connection["conn"] = conn
+    return conn
+
+
+def close_connection() -> None:
+    """Closes the kept database connection, if there is one."""
+    conn = _connection["conn"]
+    _connection["conn"] = None
+    if conn is not None and not conn.closed:
+        try:
+            conn.close()
+        except DatabaseError as e:
+            logger.debug("Ignoring error while closing connection: %s", e)
@@ -0,0 +1,134 @@
+"""Stage timings, row counts and database round trips for each pipeline's Lambda.
+
+Every Lambda image ships this one module; its entry point names the pipeline
+with configure_metrics, which becomes the Pipeline dimension. Each run's metrics
+are printed as CloudWatch Embedded Metric Format (EMF) lines, which CloudWatch
+turns into metrics straight from the Lambda logs. METRICS_SINK chooses between
+`emf` and `none`; it defaults to `emf` inside Lambda and `none` elsewhere, so
+local runs and tests emit nothing."""
+
+import json
+import logging
+from contextlib import contextmanager
+from functools import cache
+from os import environ as ENV
+from time import perf_counter, time
+
+from psycopg2.extensions import cursor as Cursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PIPELINE = "unknown"
+DEFAULT_NAMESPACE = "c17-trains"
+
+_settings = {"pipeline": DEFAULT_PIPELINE}
+_stages: dict[str, dict] = {}
+_active_stages: list[str] = []
+
+
+def configure_metrics(pipeline: str) -> None:
+    """Sets the pipeline name that every stage's metrics are reported under."""
+    _settings["pipeline"] = pipeline
+
+
+def reset_metrics() -> None:
+    """Forgets the metrics of the previous run."""
+    _stages.clear()
+    _active_stages.clear()
+
+
+def get_stage_metrics() -> dict[str, dict]:
+    """Returns a copy of the metrics recorded for each stage."""
+    return {name: dict(values) for name, values in _stages.items()}
+
+
+def _get_stage(name: str) -> dict:
+    """Returns the metrics of a stage, creating them on first use."""
+    return _stages.setdefault(name, {"duration_ms": 0.0, "rows": 0, "db_round_trips": 0})
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block of work as the named stage.
+
+    Stages can be nested, with the outer stage's figures including the inner
+    one's, and entering a stage again adds to its totals."""
+    _get_stage(name)
+    _active_stages.append(name)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        _stages[name]["duration_ms"] += (perf_counter() - start) * 1000
+        _active_stages.pop()
+
+
+def record_rows(count: int, name: str | None = None) -> None:
+    """Adds to the row count of the named stage, or of the innermost running stage."""
+    if name is None:
+        if not _active_stages:
+            return
+        name = _active_stages[-1]
+    _get_stage(name)["rows"] += count
+
+
+def record_db_round_trip() -> None:
+    """Counts one database round trip against every running stage."""
+    for name in set(_active_stages):
+        _stages[name]["db_round_trips"] += 1
+
+
+@cache
+def counting_cursor(base: type = Cursor) -> type:
+    """Returns a cursor class, derived from base, that counts each statement it sends."""
+    class CountingCursor(base):  # pylint: disable=too-few-public-methods
+        """Cursor that records a database round trip per statement."""
+
+        def execute(self, query, vars=None):  # pylint: disable=redefined-builtin
+            record_db_round_trip()
+            return super().execute(query, vars)
+
+        def copy_expert(self, sql, file, size=8192):
+            record_db_round_trip()
+            return super().copy_expert(sql, file, size)
+
+    CountingCursor.__name__ = f"Counting{base.__name__}"
+    return CountingCursor
+
+
+def get_sink() -> str:
+    """Returns the configured metrics sink."""
+    default = "emf" if "AWS_LAMBDA_FUNCTION_NAME" in ENV else "none"
+    return ENV.get("METRICS_SINK", default).lower()
+
+
+def build_emf_record(name: str, values: dict) -> dict:
+    """Returns the EMF record of one stage."""
+    return {
+        "_aws": {
+            "Timestamp": int(time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": ENV.get("METRICS_NAMESPACE", DEFAULT_NAMESPACE),
+                "Dimensions": [["Pipeline", "Stage"]],
+                "Metrics": [
+                    {"Name": "Duration", "Unit": "Milliseconds"},
+                    {"Name": "Rows", "Unit": "Count"},
+                    {"Name": "DbRoundTrips", "Unit": "Count"}
+                ]
+            }]
+        },
+        "Pipeline": _settings["pipeline"],
+        "Stage": name,
+        "Duration": round(values["duration_ms"], 3),
+        "Rows": values["rows"],
+        "DbRoundTrips": values["db_round_trips"]
+    }
+
+
+def emit_metrics() -> None:
+    """Writes one EMF line per stage to stdout, or only logs them with the none sink."""
+    if get_sink() != "emf":
+        logger.debug("Stage metrics: %s", _stages)
+        return
+    for name, values in _stages.items():
+        print(json.dumps(build_emf_record(name, values)), flush=True)
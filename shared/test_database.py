@@ -0,0 +1,102 @@
+"""Unit testing for the functions in shared/database.py."""
+# pylint: skip-file
+
+from unittest.mock import patch, MagicMock
+
+import pytest
+from psycopg2 import DatabaseError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+from psycopg2.extras import RealDictCursor
+
+from shared import database
+from shared.database import get_connection, close_connection
+
+
+DB_ENV = {
+    "DB_USER": "USER",
+    "DB_PASSWORD": "PASSWORD",
+    "DB_HOST": "HOST",
+    "DB_PORT": "PORT",
+    "DB_NAME": "NAME"
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_kept_connection():
+    """Makes every test start without a kept connection."""
+    database._connection["conn"] = None
+    yield
+    database._connection["conn"] = None
+
+
+def make_kept_connection():
+    """Returns a mock connection that reports itself open and idle."""
+    conn = MagicMock(closed=0)
+    conn.info.transaction_status = TRANSACTION_STATUS_IDLE
+    return conn
+
+
+def test_get_connection_connects_once_with_counting_cursors():
+    """Test that a new connection counts round trips on cursors of the given class."""
+    with patch("shared.database.connect") as mock_connect, \
+            patch.dict("os.environ", DB_ENV):
+        get_connection(RealDictCursor)
+    mock_connect.assert_called_once()
+    assert issubclass(mock_connect.call_args.kwargs["cursor_factory"], RealDictCursor)
+
+
+def test_get_connection_reuses_healthy_connection():
+    """Test that a warm invocation reuses the connection after a SELECT 1."""
+    kept = make_kept_connection()
+    with patch("shared.database.connect", return_value=kept) as mock_connect, \
+            patch.dict("os.environ", DB_ENV):
+        assert get_connection() is kept
+        assert get_connection() is kept
+    mock_connect.assert_called_once()
+    cursor = kept.cursor.return_value.__enter__.return_value
+    cursor.execute.assert_called_once_with("SELECT 1;")
+
+
+def test_get_connection_reconnects_after_failed_health_check():
+    """Test that a connection the server dropped is closed and replaced."""
+    stale, fresh = make_kept_connection(), make_kept_connection()
+    stale.cursor.return_value.__enter__.return_value.execute.side_effect = \
+        DatabaseError("server closed the connection unexpectedly")
+    database._connection["conn"] = stale
+    with patch("shared.database.connect", return_value=fresh) as mock_connect, \
+            patch.dict("os.environ", DB_ENV):
+        assert get_connection() is fresh
+    stale.close.assert_called_once()
+    mock_connect.assert_called_once()
+
+
+def test_get_connection_rolls_back_leftover_transaction():
+    """Test that a transaction left open by a failed run is rolled back before reuse."""
+    kept = make_kept_connection()
+    kept.info.transaction_status = TRANSACTION_STATUS_INERROR
+    database._connection["conn"] = kept
+    with patch("shared.database.connect") as mock_connect, \
+            patch.dict("os.environ", DB_ENV):
+        assert get_connection() is kept
+    kept.rollback.assert_called()
+    mock_connect.assert_not_called()
+
+
+def test_get_connection_proxy_mode_skips_select():
+    """Test that proxy mode connects to DB_PROXY_HOST and skips the SELECT 1."""
+    kept = make_kept_connection()
+    with patch("shared.database.connect", return_value=kept) as mock_connect, \
+            patch.dict("os.environ", {**DB_ENV, "DB_PROXY_HOST": "PROXY"}):
+        get_connection()
+        get_connection()
+    assert mock_connect.call_args.kwargs["host"] == "PROXY"
+    kept.cursor.assert_not_called()
+
+
+def test_close_connection_forgets_connection():
+    """Test that closing drops the kept connection so the next call reconnects."""
+    kept = make_kept_connection()
+    database._connection["conn"] = kept
+    close_connection()
+    kept.close.assert_called_once()
+    assert database._connection["conn"] is None
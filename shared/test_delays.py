@@ -0,0 +1,57 @@
+"""Unit testing for the functions in shared/delays.py."""
+# pylint: skip-file
+
+from datetime import time
+
+import numpy as np
+import pandas as pd
+from pandas import Series
+
+from shared.delays import times_to_seconds, seconds_to_times, delay_seconds, delay_minutes
+
+
+def test_seconds_to_times():
+    result = seconds_to_times(Series([45030, None], dtype="Int32"))
+    assert result.tolist() == [time(12, 30, 30), None]
+
+
+def test_times_to_seconds_converts_time_objects():
+    times = Series([time(0, 0), time(12, 30), None, time(12, 30, 30)])
+    result = times_to_seconds(times)
+    assert result.tolist()[:2] == [0.0, 45000.0]
+    assert np.isnan(result[2])
+    assert result[3] == 45030.0
+
+
+def test_times_to_seconds_accepts_numeric_and_timedelta_columns():
+    assert times_to_seconds(Series([60, None], dtype="Int32")).tolist()[0] == 60.0
+    assert times_to_seconds(pd.to_timedelta(Series(["00:01:30"]))).tolist() == [90.0]
+
+
+def test_times_to_seconds_keeps_index():
+    times = Series([time(1, 0)], index=[7])
+    assert times_to_seconds(times).index.tolist() == [7]
+
+
+def test_delay_seconds_for_late_and_early_trains():
+    scheduled = Series([time(12, 0), time(12, 0)])
+    actual = Series([time(12, 5), time(11, 58)])
+    assert delay_seconds(scheduled, actual).tolist() == [300.0, -120.0]
+
+
+def test_delay_seconds_handles_trains_running_past_midnight():
+    scheduled = Series([time(23, 58), time(0, 2)])
+    actual = Series([time(0, 3), time(23, 59)])
+    assert delay_seconds(scheduled, actual).tolist() == [300.0, -180.0]
+
+
+def test_delay_minutes_rounds_down_and_keeps_missing_times():
+    scheduled = Series([time(12, 0), time(12, 0), None])
+    actual = Series([time(12, 1, 30), time(11, 59, 30), time(12, 0)])
+    result = delay_minutes(scheduled, actual)
+    assert result.tolist()[:2] == [1.0, -1.0]
+    assert np.isnan(result[2])
+
+
+def test_delay_minutes_of_empty_columns():
+    assert delay_minutes(Series([], dtype=object), Series([], dtype=object)).empty
@@ -0,0 +1,107 @@
+"""Unit testing for the functions in shared/metrics.py."""
+# pylint: skip-file
+
+import json
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from shared.metrics import (stage, record_rows, record_db_round_trip, reset_metrics,
+                            get_stage_metrics, counting_cursor, emit_metrics, build_emf_record,
+                            configure_metrics, DEFAULT_PIPELINE)
+
+
+@pytest.fixture(autouse=True)
+def no_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+    configure_metrics(DEFAULT_PIPELINE)
+
+
+def test_stage_records_duration_rows_and_round_trips():
+    with patch("shared.metrics.perf_counter", side_effect=[10.0, 10.25]):
+        with stage("extract"):
+            record_rows(5)
+            record_db_round_trip()
+    assert get_stage_metrics() == {
+        "extract": {"duration_ms": 250.0, "rows": 5, "db_round_trips": 1}}
+
+
+def test_nested_stages_count_round_trips_in_both():
+    with stage("load"):
+        with stage("update_station"):
+            record_db_round_trip()
+        record_db_round_trip()
+    metrics = get_stage_metrics()
+    assert metrics["load"]["db_round_trips"] == 2
+    assert metrics["update_station"]["db_round_trips"] == 1
+
+
+def test_reentering_a_stage_adds_to_its_totals():
+    for _ in range(2):
+        with stage("alerts"):
+            record_rows(1)
+    assert get_stage_metrics()["alerts"]["rows"] == 2
+
+
+def test_record_rows_outside_a_stage_is_ignored():
+    record_rows(3)
+    assert get_stage_metrics() == {}
+
+
+def test_stage_still_records_when_the_block_raises():
+    with pytest.raises(ValueError):
+        with stage("transform"):
+            raise ValueError
+    assert "transform" in get_stage_metrics()
+
+
+def test_counting_cursor_counts_each_execute():
+    class FakeCursor:
+        def execute(self, query, vars=None):
+            return query
+
+    cursor = counting_cursor(FakeCursor)()
+    with stage("update_route"):
+        cursor.execute("SELECT 1;")
+        cursor.execute("SELECT 2;")
+    assert get_stage_metrics()["update_route"]["db_round_trips"] == 2
+    assert counting_cursor(FakeCursor) is type(cursor)
+
+
+def test_build_emf_record_declares_metrics_and_dimensions():
+    configure_metrics("rtt")
+    record = build_emf_record("extract", {"duration_ms": 1.5, "rows": 2, "db_round_trips": 0})
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Pipeline", "Stage"]]
+    assert [metric["Name"] for metric in directive["Metrics"]] == [
+        "Duration", "Rows", "DbRoundTrips"]
+    assert (record["Pipeline"], record["Stage"], record["Duration"]) == ("rtt", "extract", 1.5)
+
+
+def test_emit_metrics_prints_one_line_per_stage(capsys):
+    with stage("extract"), stage("transform"):
+        pass
+    with patch.dict("os.environ", {"METRICS_SINK": "emf"}):
+        emit_metrics()
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["Stage"] for line in lines] == ["extract", "transform"]
+
+
+def test_emit_metrics_is_silent_outside_lambda(capsys):
+    with stage("extract"):
+        pass
+    with patch.dict("os.environ", {}, clear=True):
+        emit_metrics()
+    assert capsys.readouterr().out == ""
+
+
+def test_emit_metrics_reports_the_configured_pipeline(capsys):
+    configure_metrics("incidents")
+    with stage("extract"):
+        pass
+    with patch.dict("os.environ", {"METRICS_SINK": "emf"}):
+        emit_metrics()
+    record = json.loads(capsys.readouterr().out)
+    assert (record["Pipeline"], record["Stage"]) == ("incidents", "extract")
@@ -22,6 +22,12 @@ resource "aws_ecr_repository" "reports_lambda_image_repo" {
   name = "c17-trains-ecr-reports"
 }
 
+# ECR Repository for archive pipeline lambda image
+
+resource "aws_ecr_repository" "archive_pipeline_lambda_image_repo" {
+  name = "c17-trains-ecr-archive-pipeline"
+}
+
 # ECR Repository for dashboard image
 
 resource "aws_ecr_repository" "dashboard_td_image_repo" {
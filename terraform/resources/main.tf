@@ -29,6 +29,10 @@ resource "aws_s3_bucket" "s3_bucket" {
   force_destroy = true
 }
 
+resource "aws_s3_bucket" "archive_s3_bucket" {
+  bucket = "c17-trains-bucket-archive"
+}
+
 # ECR
 
 # ECR Repository and image for RTT pipeline lambda
@@ -64,6 +68,17 @@ data "aws_ecr_image" "reports_lambda_image_version" {
   image_tag       = "latest"
 }
 
+# ECR Repository and image for archive pipeline lambda
+
+data "aws_ecr_repository" "archive_pipeline_lambda_image_repo" {
+  name = "c17-trains-ecr-archive-pipeline"
+}
+
+data "aws_ecr_image" "archive_pipeline_lambda_image_version" {
+  repository_name = data.aws_ecr_repository.archive_pipeline_lambda_image_repo.name
+  image_tag       = "latest"
+}
+
 # ECR Repository and image for dashboard task definition
 
 data "aws_ecr_repository" "dashboard_td_image_repo" {
@@ -255,6 +270,10 @@ resource "aws_ecs_task_definition" "dashboard_td" {
         {
           name  = "BUCKET_NAME"
           value = aws_s3_bucket.s3_bucket.bucket
+        },
+        {
+          name  = "ARCHIVE_LOCATION"
+          value = "s3://${aws_s3_bucket.archive_s3_bucket.bucket}/train_stop"
         }
       ]
     }
@@ -355,6 +374,35 @@ data "aws_iam_policy_document" "reports_lambda_role_permissions_policy_doc" {
   }
 }
 
+data "aws_iam_policy_document" "archive_lambda_role_permissions_policy_doc" {
+  statement {
+    effect = "Allow"
+    actions = [
+      "logs:CreateLogGroup",
+      "logs:CreateLogStream",
+      "logs:PutLogEvents"
+    ]
+    resources = ["arn:aws:logs:${var.REGION}:${var.ACCOUNT_ID}:*"]
+  }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "s3:PutObject",
+      "s3:GetObject"
+    ]
+    resources = ["arn:aws:s3:::${aws_s3_bucket.archive_s3_bucket.bucket}/*"]
+  }
+
+  statement {
+    effect = "Allow"
+    actions = [
+      "s3:ListBucket"
+    ]
+    resources = ["arn:aws:s3:::${aws_s3_bucket.archive_s3_bucket.bucket}"]
+  }
+}
+
 resource "aws_iam_role" "pipeline_lambda_role" {
   name               = "c17-trains-pipeline-lambda-role"
   assume_role_policy = data.aws_iam_policy_document.lambda_role_trust_policy_doc.json
@@ -385,6 +433,21 @@ resource "aws_iam_role_policy_attachment" "reports_lambda_role_policy_connection
   policy_arn = aws_iam_policy.reports_lambda_role_permissions_policy.arn
 }
 
+resource "aws_iam_role" "archive_lambda_role" {
+  name               = "c17-trains-archive-lambda-role"
+  assume_role_policy = data.aws_iam_policy_document.lambda_role_trust_policy_doc.json
+}
+
+resource "aws_iam_policy" "archive_lambda_role_permissions_policy" {
+  name   = "c17-trains-archive-lambda-permissions-policy"
+  policy = data.aws_iam_policy_document.archive_lambda_role_permissions_policy_doc.json
+}
+
+resource "aws_iam_role_policy_attachment" "archive_lambda_role_policy_connection" {
+  role       = aws_iam_role.archive_lambda_role.name
+  policy_arn = aws_iam_policy.archive_lambda_role_permissions_policy.arn
+}
+
 # RTT Pipeline Lambda
 
 resource "aws_lambda_function" "rtt_pipeline_lambda" {
@@ -464,6 +527,30 @@ resource "aws_lambda_function" "reports_lambda" {
   }
 }
 
+# Archive Pipeline Lambda
+
+resource "aws_lambda_function" "archive_pipeline_lambda" {
+  function_name = "c17-trains-lambda-archive-pipeline"
+  description   = "Archives old train stops to Parquet in S3. Triggered by an EventBridge."
+  role          = aws_iam_role.archive_lambda_role.arn
+  package_type  = "Image"
+  image_uri     = data.aws_ecr_image.archive_pipeline_lambda_image_version.image_uri
+  timeout       = 900
+  memory_size   = 1024
+  depends_on    = [aws_iam_role_policy_attachment.archive_lambda_role_policy_connection]
+
+  environment {
+    variables = {
+      DB_HOST          = var.DB_HOST
+      DB_NAME          = var.DB_NAME
+      DB_USER          = var.DB_USER
+      DB_PASSWORD      = var.DB_PASSWORD
+      DB_PORT          = var.DB_PORT
+      ARCHIVE_LOCATION = "s3://${aws_s3_bucket.archive_s3_bucket.bucket}/train_stop"
+    }
+  }
+}
+
 # EVENTBRIDGE
 
 # Scheduler permissions
@@ -498,7 +585,8 @@ resource "aws_iam_role_policy" "eventbridge_invoke_lambda_policy" {
         Resource = [
           aws_lambda_function.rtt_pipeline_lambda.arn,
           aws_lambda_function.incidents_pipeline_lambda.arn,
-          aws_lambda_function.reports_lambda.arn
+          aws_lambda_function.reports_lambda.arn,
+          aws_lambda_function.archive_pipeline_lambda.arn
         ]
       }
     ]
@@ -557,4 +645,22 @@ resource "aws_scheduler_schedule" "reports_lambda_schedule" {
     arn      = aws_lambda_function.reports_lambda.arn
     role_arn = aws_iam_role.scheduler_role.arn
   }
+}
+
+# Scheduler for archive pipeline lambda
+
+resource "aws_scheduler_schedule" "archive_pipeline_lambda_schedule" {
+  name       = "c17-trains-schedule-archive-pipeline"
+  group_name = "default"
+
+  flexible_time_window {
+    mode = "OFF"
+  }
+
+  schedule_expression = "cron(30 3 * * ? *)"
+
+  target {
+    arn      = aws_lambda_function.archive_pipeline_lambda.arn
+    role_arn = aws_iam_role.scheduler_role.arn
+  }
 }
\ No newline at end of file